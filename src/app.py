@@ -2,6 +2,7 @@
 The main file yielding the application instance
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -9,6 +10,8 @@ from loguru import logger as _LOG
 
 from db.database import initialize_database
 from db.models.exchange_rate import Asset
+from exchange_rate.hub import exchange_rate_hub
+from exchange_rate.registry import asset_registry
 from exchange_rate.routers import router as exchange_rate_router
 
 
@@ -20,8 +23,13 @@ async def lifespan(app: FastAPI):
     _LOG.info("On server initalization")
     await initialize_database()
     await Asset.initialize_assets(raise_exception=False)
+    await asset_registry.load()
+    await exchange_rate_hub.warm_up(asset_registry.assets)
+    registry_refresh_task = asyncio.create_task(asset_registry.run_refresh())
     yield
     _LOG.info("On server teardown")
+    registry_refresh_task.cancel()
+    await exchange_rate_hub.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -5,75 +5,131 @@ The async periodic tasks running loop application
 import asyncio
 import os
 import sys
-from typing import Any, Mapping, Coroutine, Sequence
 from datetime import datetime
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 from loguru import logger as _LOG
 
 # TODO: Improve DX on the root directory
 # The application root dir is the parent dir
 sys.path.insert(1, os.getcwd())
+from async_tasks.candles import CandleRollup
+from async_tasks.emcont_service.pipeline import EmcontIngestionPipeline
 from async_tasks.emcont_service.service import EmcontService
+from async_tasks.retention import ExchangeRateRetention
+from async_tasks.scheduler import PeriodicScheduler
+from db.archive import exchange_rate_archive
 from db.database import initialize_database
+from db.models.exchange_rate import ExchangeRate
+from db.shared_rates import SharedRatesTable
+from relay.publisher import TickRelayPublisher
+from settings import settings
 
 EMCONT_SERVICE = EmcontService()
 
 
-async def get_and_save_exchnage_rates():
-    await EMCONT_SERVICE.get_and_save_exchange_rates()
+def get_parse_executor() -> Executor | None:
+    """Get the executor to parse the exchange rates configured in the settings"""
+    match settings.INGESTION_PARSE_EXECUTOR:
+        case "thread":
+            return ThreadPoolExecutor(max_workers=1)
+        case "process":
+            return ProcessPoolExecutor(max_workers=1)
+    return None
 
 
-async def periodic(
-    coroutine: Coroutine[Any, Any, Any],
-    interval_seconds: float | int = 1,
-    pre_sleep_seconds: float | int = 0,
-    args: Sequence[Any] | None = None,
-    kwargs: Mapping[str, Any] | None = None,
-):
+async def create_shared_rates() -> SharedRatesTable | None:
     """
-    Periodic execution function
-    :param float | int interval_seconds: interval before tasks finishing the task and executing it again
-    :param float | int pre_sleep_seconds: sleep asynhronously before starting the task
-    :param Coroutine[Any, Any, Any] coroutine: the async function
-    :param Sequence[Any] args: positional arguments to pass to `async_function`
-    :param Mapping[str, Any] args: key arguments to pass to `async_function`
+    Create the shared-memory table of the latest exchange rates configured in the settings
+    and fill it with the history window from the DB, so the application workers never read the DB
     """
-    args = args or tuple()
-    kwargs = kwargs or dict()
-    await asyncio.sleep(pre_sleep_seconds)
-    while True:
-        # await the target
-        try:
-            await coroutine(*args, **kwargs)
-        except Exception as exc:
-            _LOG.error(exc)
-            raise exc
-        await asyncio.sleep(interval_seconds)
+    if not settings.SHARED_RATES_TABLE_NAME:
+        return None
+    window_seconds = settings.HISTORY_WINDOW_MINUTES * 60
+    shared_rates = SharedRatesTable.create(
+        settings.SHARED_RATES_TABLE_NAME,
+        max_assets=settings.SHARED_RATES_MAX_ASSETS,
+        window=window_seconds,
+    )
+    time_from = int(datetime.now().timestamp()) - window_seconds
+    for asset in EMCONT_SERVICE.assets:
+        points = await ExchangeRate.find_points(asset.id, time_from=time_from).to_list()  # type: ignore
+        shared_rates.publish(
+            asset.id, [point.time for point in points], [point.value for point in points]  # type: ignore
+        )
+    _LOG.info(f"Publishing the exchange rates to the shared memory {shared_rates.name}")
+    return shared_rates
 
 
 async def main():
     _LOG.info("Starting creating async workers")
-    await initialize_database(skip_indexes=True)
+    # The upserts are keyed on the unique (asset, time) index: make sure it exists
+    await initialize_database()
     await EMCONT_SERVICE.sync_assets()
 
-    NUMBER_OF_TASKS = 4
-    # Launch the periodic tasks
-    task_set = set()
+    parse_executor = get_parse_executor()
+    candle_rollup = CandleRollup()
+    shared_rates = await create_shared_rates()
+    tick_relay = None
+    if settings.TICK_RELAY_ADDRESS:
+        tick_relay = TickRelayPublisher(settings.TICK_RELAY_ADDRESS)
+    pipeline = EmcontIngestionPipeline(
+        EMCONT_SERVICE,
+        parse_executor=parse_executor,
+        candle_rollup=candle_rollup,
+        shared_rates=shared_rates,
+        tick_relay=tick_relay,
+    )
+
+    # Fetch the exchange rates just after every second boundary;
+    # a slow fetch may overlap with the next one only
+    scheduler = PeriodicScheduler()
+    scheduler.add_job(
+        pipeline.fetch,
+        interval_seconds=1,
+        offset_seconds=0.05,
+        max_in_flight=2,
+        overdue_policy="coalesce",
+        name="fetch_exchange_rates",
+    )
+    scheduler.add_job(
+        candle_rollup.flush,
+        interval_seconds=settings.CANDLE_FLUSH_INTERVAL_SECONDS,
+        overdue_policy="skip",
+        name="flush_candles",
+    )
+    retention = None
+    if settings.EXCHANGE_RATE_RETENTION_DAYS > 0:
+        retention = ExchangeRateRetention(
+            exchange_rate_archive,
+            retention_days=settings.EXCHANGE_RATE_RETENTION_DAYS,
+            batch_size=settings.HISTORY_QUERY_BATCH_SIZE,
+        )
+        scheduler.add_job(
+            retention.purge,
+            interval_seconds=settings.EXCHANGE_RATE_PURGE_INTERVAL_SECONDS,
+            overdue_policy="skip",
+            name="purge_exchange_rates",
+        )
     try:
         async with asyncio.TaskGroup() as task_group:
-            for idx in range(NUMBER_OF_TASKS):
-                task = task_group.create_task(
-                    periodic(
-                        coroutine=get_and_save_exchnage_rates,
-                        interval_seconds=0.5,
-                        pre_sleep_seconds=(idx / NUMBER_OF_TASKS),
-                    )
-                )
-                task_set.add(task)
-    except ExceptionGroup as exc_group:
-        _LOG.error("The tasks have ended with some exceptions")
-        for exc in exc_group.exceptions:
-            _LOG.error(exc)
+            task_group.create_task(pipeline.run())
+            task_group.create_task(scheduler.run())
+            if tick_relay is not None:
+                task_group.create_task(tick_relay.run())
+    finally:
+        scheduler.report()
+        pipeline.report()
+        if retention is not None:
+            retention.report()
+        try:
+            await candle_rollup.flush()
+        except Exception as exc:
+            _LOG.error(f"Could not flush the candles: {exc}")
+        if parse_executor is not None:
+            parse_executor.shutdown(cancel_futures=True)
+        if shared_rates is not None:
+            shared_rates.close()
 
 
 if __name__ == "__main__":
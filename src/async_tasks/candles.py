@@ -0,0 +1,111 @@
+"""
+Incrementally maintained OHLC candle rollups of the ingested exchange rates
+"""
+
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from loguru import logger as _LOG
+from pymongo.errors import BulkWriteError
+
+from db.models.candle import CANDLE_INTERVALS, Candle, get_candle_time
+from db.models.exchange_rate import Asset, ExchangeRate
+
+# Asset ID, interval and candle open time
+CandleKey = Tuple[int, str, int]
+
+
+class CandleRollup:
+    """
+    In-memory OHLC rollups of the exchange rates per asset and interval.
+    Only the exchange rates added since the last flush are kept: every flush merges
+    the partial candles into the stored ones, so a restart within a candle loses nothing.
+    The exchange rates not later than the latest one of the asset are skipped
+    """
+
+    def __init__(self, intervals: Iterable[str] = tuple(CANDLE_INTERVALS)):
+        """
+        :param Iterable[str] intervals: the candle intervals to maintain
+        """
+        self.intervals = tuple(intervals)
+        # The partial candles waiting for the flush
+        self._pending: Dict[CandleKey, Candle] = {}
+        self._last_times: Dict[int, int] = {}
+        self.flushes = 0
+        self.flushed_candles = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, exchange_rates: List[ExchangeRate]) -> None:
+        """Add the exchange rates to the candles of every interval"""
+        for exchange_rate in exchange_rates:
+            asset: Asset = exchange_rate.asset  # type: ignore
+            asset_id: int = asset.id  # type: ignore
+            rate_time, value = exchange_rate.time, exchange_rate.value
+            last_time = self._last_times.get(asset_id)
+            if last_time is not None and rate_time <= last_time:
+                continue
+            self._last_times[asset_id] = rate_time
+            for interval in self.intervals:
+                key = (asset_id, interval, get_candle_time(rate_time, interval))
+                candle = self._pending.get(key)
+                if candle is None:
+                    self._pending[key] = Candle.open_with(asset, interval, rate_time, value)
+                else:
+                    candle.add(rate_time, value)
+
+    async def flush(self) -> None:
+        """
+        Merge the partial candles into the stored ones.
+        The candles are kept for the next flush if the write fails; on a bulk write error,
+        only the candles failed to merge are kept not to merge the other ones twice
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        started_at = time.monotonic()
+        try:
+            await Candle.merge_many(list(pending.values()))
+        except BulkWriteError as exc:
+            # The operations are in the order of the candles
+            failed_indexes = {error["index"] for error in exc.details.get("writeErrors", [])}
+            self._restore(
+                {
+                    key: candle
+                    for idx, (key, candle) in enumerate(pending.items())
+                    if idx in failed_indexes
+                }
+            )
+            raise
+        except Exception:
+            self._restore(pending)
+            raise
+        self.flushes += 1
+        self.flushed_candles += len(pending)
+        _LOG.debug(f"Flushed {len(pending)} candles in {time.monotonic() - started_at:.3f}s")
+
+    def _restore(self, failed: Dict[CandleKey, Candle]) -> None:
+        """
+        Keep the candles failed to merge for the next flush
+        :param Dict[CandleKey, Candle] failed: the partial candles failed to merge
+        """
+        # Merge the candles added in the meantime into the failed ones
+        for key, candle in self._pending.items():
+            failed_candle = failed.get(key)
+            if failed_candle is None:
+                failed[key] = candle
+                continue
+            failed_candle.high = max(failed_candle.high, candle.high)
+            failed_candle.low = min(failed_candle.low, candle.low)
+            failed_candle.close = candle.close
+            failed_candle.last_time = candle.last_time
+            failed_candle.ticks += candle.ticks
+        self._pending = failed
+
+    def report(self) -> None:
+        """Log the rollup counters"""
+        _LOG.info(
+            f"Candle rollup: flushes={self.flushes} flushed_candles={self.flushed_candles} "
+            f"pending={len(self._pending)}"
+        )
@@ -0,0 +1,61 @@
+"""
+Emcont (emcont.com) response parsing
+"""
+
+import json
+from typing import Any, Collection, Dict, List
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+# The JSONP wrapper of the endpoint response
+JSONP_PREFIX = b"null("
+JSONP_SUFFIX = b");"
+
+
+def loads_json(content: bytes | memoryview) -> Any:
+    """Decode JSON with the fastest library available"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(bytes(content))
+
+
+def strip_jsonp(payload: bytes) -> memoryview:
+    """
+    Strip the `null(...);` JSONP wrapper of the endpoint response without copying the content
+    :raises Exception: the payload is not wrapped
+    """
+    payload = payload.strip()
+    if not (payload.startswith(JSONP_PREFIX) and payload.endswith(JSONP_SUFFIX)):
+        raise Exception("Can not extract data from the resource content")
+    return memoryview(payload)[len(JSONP_PREFIX) : -len(JSONP_SUFFIX)]
+
+
+def extract_rates(payload: bytes) -> List[Any]:
+    """
+    Extract array of exchange rates from the endpoint response
+    """
+    return loads_json(strip_jsonp(payload))["Rates"]
+
+
+def parse_exchange_rate_values(payload: bytes, symbols: Collection[str]) -> Dict[str, float]:
+    """
+    Parse the endpoint response into the exchange rate values of the symbols only.
+    Only the bid and ask prices of the symbols are read, the other fields are not validated.
+    A pure function to run in a thread or process pool
+    :param bytes payload: the endpoint response content
+    :param Collection[str] symbols: the symbols to parse
+    :returns Dict[str, float]: the average of the bid and ask prices by symbol
+    """
+    symbols = symbols if isinstance(symbols, (set, frozenset)) else set(symbols)
+    values: Dict[str, float] = {}
+    for exchange_rate_data in extract_rates(payload):
+        symbol = exchange_rate_data["Symbol"]
+        if symbol not in symbols:
+            continue
+        values[symbol] = (float(exchange_rate_data["Bid"]) + float(exchange_rate_data["Ask"])) / 2
+        if len(values) == len(symbols):
+            break
+    return values
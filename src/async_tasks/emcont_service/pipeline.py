@@ -0,0 +1,239 @@
+"""
+Staged Emcont ingestion pipeline: fetch -> parse -> persist.
+The stages are connected by the bounded queues, so a slow stage does not delay the previous one
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from loguru import logger as _LOG
+
+from async_tasks.candles import CandleRollup
+from async_tasks.emcont_service.service import EmcontService
+from async_tasks.providers import ProviderResponse
+from db.models.exchange_rate import ExchangeRate
+from db.shared_rates import SharedRatesTable
+from relay.publisher import TickRelayPublisher
+
+
+@dataclass
+class StageMetrics:
+    """Per-stage counters and timings, seconds"""
+
+    # Number of the items processed
+    processed: int = 0
+    failed: int = 0
+    # Number of the items dropped on the full output queue
+    dropped: int = 0
+    # Number of the items waiting in the stage input queue
+    backlog: int = 0
+    max_backlog: int = 0
+    busy_seconds: float = 0
+    max_seconds: float = 0
+    started_at: float = 0
+
+    @property
+    def throughput(self) -> float:
+        """Number of the items processed per second"""
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0
+
+    @property
+    def utilization(self) -> float:
+        """Share of the time the stage is busy; the bottleneck stage is close to 1"""
+        elapsed = time.monotonic() - self.started_at
+        return self.busy_seconds / elapsed if elapsed > 0 else 0
+
+    def observe(self, seconds: float, items: int = 1) -> None:
+        """Account the processed items"""
+        self.processed += items
+        self.busy_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def observe_backlog(self, backlog: int) -> None:
+        """Account the input queue size"""
+        self.backlog = backlog
+        self.max_backlog = max(self.max_backlog, backlog)
+
+    def __str__(self) -> str:
+        return (
+            f"processed={self.processed} failed={self.failed} dropped={self.dropped} "
+            f"throughput={self.throughput:.2f}/s utilization={self.utilization:.0%} "
+            f"backlog={self.backlog} max_backlog={self.max_backlog} "
+            f"max_time={self.max_seconds * 1e3:.1f}ms"
+        )
+
+
+# The fetched response with its timestamp
+FetchedSnapshot = Tuple[int, ProviderResponse]
+
+
+class EmcontIngestionPipeline:
+    """
+    Emcont ingestion pipeline:
+        `fetch` - called periodically, puts the providers response into the parse queue;
+            the oldest snapshot is dropped if the parse stage does not keep up;
+        `parse` - parses the snapshots, in the executor if it is set;
+        `persist` - saves the records in batches merging the snapshots of several ticks,
+            adds the saved records to the candle rollups and publishes them to the shared rates
+            and the tick relay
+    """
+
+    def __init__(
+        self,
+        service: EmcontService,
+        parse_executor: Executor | None = None,
+        queue_size: int = 8,
+        batch_size: int = 2000,
+        batch_delay_seconds: float = 0.2,
+        report_interval_seconds: float = 60,
+        candle_rollup: CandleRollup | None = None,
+        shared_rates: SharedRatesTable | None = None,
+        tick_relay: TickRelayPublisher | None = None,
+    ):
+        """
+        :param EmcontService service: the Emcont service
+        :param Executor | None parse_executor: thread or process pool to parse the snapshots;
+            the parsing runs in the event loop if None
+        :param int queue_size: the maximum number of the items waiting per stage
+        :param int batch_size: the maximum number of the records saved at once
+        :param float batch_delay_seconds: time to wait for more records to save at once
+        :param float report_interval_seconds: interval between logging the stages metrics
+        :param CandleRollup | None candle_rollup: the candle rollups to add the saved records to
+        :param SharedRatesTable | None shared_rates: the shared-memory table to publish
+            the saved records to
+        :param TickRelayPublisher | None tick_relay: the tick relay publisher of the saved records
+        """
+        self._service = service
+        self._parse_executor = parse_executor
+        self._batch_size = batch_size
+        self._batch_delay_seconds = batch_delay_seconds
+        self._report_interval_seconds = report_interval_seconds
+        self._candle_rollup = candle_rollup
+        self._shared_rates = shared_rates
+        self._tick_relay = tick_relay
+        self._parse_queue: asyncio.Queue[FetchedSnapshot] = asyncio.Queue(maxsize=queue_size)
+        self._persist_queue: asyncio.Queue[List[ExchangeRate]] = asyncio.Queue(maxsize=queue_size)
+        started_at = time.monotonic()
+        self.metrics: Dict[str, StageMetrics] = {
+            stage: StageMetrics(started_at=started_at) for stage in ("fetch", "parse", "persist")
+        }
+
+    async def fetch(self) -> None:
+        """Fetch a snapshot and queue it for parsing"""
+        metrics = self.metrics["fetch"]
+        fetched_at = int(datetime.now().timestamp())
+        started_at = time.monotonic()
+        try:
+            response = await self._service.fetch_exchange_rates()
+        except Exception:
+            metrics.failed += 1
+            raise
+        metrics.observe(time.monotonic() - started_at)
+
+        if self._parse_queue.full():
+            # The fresh snapshot is more valuable than the stale one
+            self._parse_queue.get_nowait()
+            self._parse_queue.task_done()
+            metrics.dropped += 1
+        self._parse_queue.put_nowait((fetched_at, response))
+        self.metrics["parse"].observe_backlog(self._parse_queue.qsize())
+
+    async def run(self) -> None:
+        """Run the parse and persist stages until cancelled"""
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(self._run_parse_stage())
+            task_group.create_task(self._run_persist_stage())
+            task_group.create_task(self._report())
+
+    async def join(self) -> None:
+        """Wait for all the queued snapshots to be saved"""
+        await self._parse_queue.join()
+        await self._persist_queue.join()
+
+    def report(self) -> None:
+        """Log the metrics of every stage and the providers latencies"""
+        for stage, metrics in self.metrics.items():
+            _LOG.info(f"Ingestion stage {stage}: {metrics}")
+        if self._candle_rollup is not None:
+            self._candle_rollup.report()
+        if self._tick_relay is not None:
+            self._tick_relay.report()
+        self._service.report()
+
+    async def _run_parse_stage(self) -> None:
+        """Parse the snapshots into the ExchangeRate records"""
+        metrics = self.metrics["parse"]
+        loop = asyncio.get_running_loop()
+        while True:
+            fetched_at, response = await self._parse_queue.get()
+            started_at = time.monotonic()
+            try:
+                symbols = self._service.asset_names
+                parse_values = response.provider.parse_values
+                if self._parse_executor is None:
+                    values = parse_values(response.payload, symbols)
+                else:
+                    values = await loop.run_in_executor(
+                        self._parse_executor, parse_values, response.payload, symbols
+                    )
+                exchange_rates = self._service.to_exchange_rates(values, fetched_at)
+            except Exception as exc:
+                metrics.failed += 1
+                _LOG.error(f"Could not parse the exchange rates: {exc}")
+                continue
+            finally:
+                self._parse_queue.task_done()
+            metrics.observe(time.monotonic() - started_at)
+            metrics.observe_backlog(self._parse_queue.qsize())
+
+            # Wait for the persist stage: the parse queue absorbs the delay
+            await self._persist_queue.put(exchange_rates)
+            self.metrics["persist"].observe_backlog(self._persist_queue.qsize())
+
+    async def _run_persist_stage(self) -> None:
+        """Save the records in batches"""
+        metrics = self.metrics["persist"]
+        while True:
+            batch = await self._persist_queue.get()
+            batch_items = 1
+            # Merge the snapshots arriving shortly after the first one
+            deadline = time.monotonic() + self._batch_delay_seconds
+            while len(batch) < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.extend(await asyncio.wait_for(self._persist_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                batch_items += 1
+
+            started_at = time.monotonic()
+            try:
+                await self._service.save_exchange_rates(batch)
+            except Exception as exc:
+                metrics.failed += batch_items
+                _LOG.error(f"Could not save {len(batch)} exchange rates: {exc}")
+            else:
+                metrics.observe(time.monotonic() - started_at, items=batch_items)
+                if self._candle_rollup is not None:
+                    self._candle_rollup.add(batch)
+                if self._shared_rates is not None:
+                    self._shared_rates.publish_exchange_rates(batch)
+                if self._tick_relay is not None:
+                    self._tick_relay.publish_exchange_rates(batch)
+            finally:
+                for _ in range(batch_items):
+                    self._persist_queue.task_done()
+            metrics.observe_backlog(self._persist_queue.qsize())
+
+    async def _report(self) -> None:
+        """Log the metrics periodically"""
+        while True:
+            await asyncio.sleep(self._report_interval_seconds)
+            self.report()
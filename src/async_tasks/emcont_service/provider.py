@@ -0,0 +1,50 @@
+"""
+Emcont (emcont.com) exchange rates provider
+"""
+
+from typing import Collection, Dict
+
+import httpx
+
+from async_tasks.emcont_service.parsing import parse_exchange_rate_values, strip_jsonp
+from async_tasks.providers import AbstractRateProvider, ProviderError
+
+
+class EmcontRateProvider(AbstractRateProvider):
+    """Provider of the Emcont-compatible JSONP endpoint"""
+
+    def __init__(
+        self,
+        url: str,
+        client: httpx.AsyncClient,
+        name: str | None = None,
+        timeout_seconds: float = 2.5,
+    ):
+        """
+        :param str url: the endpoint URL
+        :param httpx.AsyncClient client: the HTTP client
+        :param str name: the provider name; the URL by default
+        :param float timeout_seconds: the request timeout
+        """
+        super().__init__(name or url)
+        self.url = url
+        self._client = client
+        self._timeout = httpx.Timeout(timeout_seconds, connect=timeout_seconds)
+
+    async def fetch_payload(self) -> bytes:
+        """Fetch the endpoint response content"""
+        response = await self._client.get(url=self.url, timeout=self._timeout)
+        response.raise_for_status()
+        return response.content
+
+    def validate_payload(self, payload: bytes) -> None:
+        """Check the JSONP wrapper of the response content"""
+        try:
+            strip_jsonp(payload)
+        except Exception as exc:
+            raise ProviderError(f"{self.name}: {exc}") from exc
+
+    @staticmethod
+    def parse_values(payload: bytes, symbols: Collection[str]) -> Dict[str, float]:
+        """Parse the response content into the exchange rate values by symbol"""
+        return parse_exchange_rate_values(payload, symbols)
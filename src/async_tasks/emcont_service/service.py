@@ -2,17 +2,14 @@
 Emcont (emcont.com) service class
 """
 
-import json
-import re
-from typing import Any, Dict, List
+from typing import Dict, FrozenSet, List
 
 import httpx
-from beanie.exceptions import RevisionIdWasChanged
-from beanie.operators import Set
 from loguru import logger as _LOG
-from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult
 
-from async_tasks.emcont_service.models import EmcontExchangeRate
+from async_tasks.emcont_service.provider import EmcontRateProvider
+from async_tasks.providers import AbstractRateProvider, HedgedRateFetcher, ProviderResponse
 from db.models.exchange_rate import Asset, ExchangeRate
 from settings import settings
 
@@ -20,12 +17,19 @@ from settings import settings
 class EmcontService:
     """Emcont service to manage functions related to tasks"""
 
-    def __init__(self):
-        """Init"""
+    def __init__(self, providers: List[AbstractRateProvider] | None = None):
+        """
+        Init
+        :param List[AbstractRateProvider] providers: the exchange rates providers in the order
+            of preference; the Emcont endpoint and its mirrors from the settings by default
+        """
         self.URL = settings.EMCONT_EXCHANGE_RATES_URL
-        self._regex_comp = re.compile(r"null\((?P<content>.*)\);")
         self._assets: List[Asset] = []
         self._client = httpx.AsyncClient()
+        if providers is None:
+            urls = [self.URL, *settings.EXCHANGE_RATE_PROVIDER_URLS]
+            providers = [EmcontRateProvider(url, self._client) for url in urls]
+        self._fetcher = HedgedRateFetcher(providers)
 
     async def sync_assets(self) -> None:
         """Synchronize the available assets from the DB"""
@@ -35,64 +39,51 @@ class EmcontService:
         await Asset.initialize_assets(raise_exception=False)
         self._assets = await Asset.find_assets_from_settings().to_list()
 
-    def _extract_rates(self, text) -> List[Any]:
-        """
-        Extract array of exchange rates from the endpoint response text
-        """
-        match = self._regex_comp.match(text)
-        if not match:
-            raise Exception("Can not extract data from the resource content")
-        content = match["content"]
-        json_content = json.loads(content)
-        rates = json_content["Rates"]
-        return rates
+    @property
+    def assets(self) -> List[Asset]:
+        """The synchronized assets"""
+        return self._assets
+
+    @property
+    def asset_names(self) -> FrozenSet[str]:
+        """Names of the synchronized assets"""
+        return frozenset(asset.name for asset in self._assets)
 
-    async def fetch_exchange_rates_data(self) -> List[Any]:
+    async def fetch_exchange_rates(self) -> ProviderResponse:
         """
-        Get the exchange rates
+        Get the first valid exchange rates response of the hedged providers requests
+        :raises ProviderError: all the providers have failed
         """
-        if not self._assets:
-            return []
-        timeout = httpx.Timeout(2.5, connect=2.5)
-        response: httpx.Response = await self._client.get(url=self.URL, timeout=timeout)
-        return self._extract_rates(response.text)
-
-    @staticmethod
-    def exchange_rates_data_to_dict(exchange_rates_data) -> Dict[str, Any]:
-        return {er["Symbol"]: er for er in exchange_rates_data}
+        return await self._fetcher.fetch()
 
-    async def get_and_save_exchange_rates(self) -> None:
+    def to_exchange_rates(self, values: Dict[str, float], time: int) -> List[ExchangeRate]:
         """
-        Synchronize the exchange rates from Emcont to the DB
+        Create the ExchangeRate records of the synchronized assets
+        :param Dict[str, float] values: the exchange rate values by symbol
+        :param int time: the exchange rates timestamp
         """
-        if not self._assets:
-            _LOG.info(f"Assets are not set")
-            return
-        exchange_rates_data_list = await self.fetch_exchange_rates_data()
-        exchange_rates_data_dict = self.exchange_rates_data_to_dict(exchange_rates_data_list)
-        # Find the matching asset
-        records_saved_number: int = 0
+        exchange_rates = []
         for asset in self._assets:
-            exchange_rates_data = exchange_rates_data_dict[asset.name]
-
-            emcon_exchange_rate_dto = EmcontExchangeRate(asset=asset, **exchange_rates_data)
-            exchange_rate = emcon_exchange_rate_dto.to_exchange_rate()
-            try:
-                update_query = await ExchangeRate.find_one(
-                    ExchangeRate.asset.id == asset.id,
-                    ExchangeRate.time == exchange_rate.time,
-                ).upsert(
-                    Set({}),
-                    on_insert=ExchangeRate(
-                        asset=asset,
-                        time=exchange_rate.time,
-                        value=exchange_rate.value,
-                    ),
-                )
-            except DuplicateKeyError:
+            value = values.get(asset.name)
+            if value is None:
+                _LOG.warning(f"No {asset.name} exchange rate received")
                 continue
-            if isinstance(update_query, ExchangeRate):
-                exchange_rate = update_query
-                records_saved_number += 1
+            # The values are valid already
+            exchange_rates.append(ExchangeRate.model_construct(asset=asset, time=time, value=value))
+        return exchange_rates
+
+    async def save_exchange_rates(self, exchange_rates: List[ExchangeRate]) -> BulkWriteResult:
+        """
+        Save the exchange rates missing in the DB
+        :returns BulkWriteResult: the result with the inserted (upserted) and matched counts
+        """
+        result = await ExchangeRate.upsert_many(exchange_rates)
+        _LOG.info(
+            f"Successfully saved {result.upserted_count + result.inserted_count} records, "
+            f"{result.matched_count} records already existed"
+        )
+        return result
 
-        _LOG.info(f"Successfully saved {records_saved_number} records")
+    def report(self) -> None:
+        """Log the providers latencies"""
+        self._fetcher.report()
@@ -0,0 +1,224 @@
+"""
+Exchange rate providers and the hedged requests to several providers
+"""
+
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Collection, Deque, Dict, List, Set
+
+from loguru import logger as _LOG
+
+
+class ProviderError(Exception):
+    """The provider has failed to return a valid response"""
+
+
+class LatencyTracker:
+    """
+    Latencies of the recent successful requests, seconds.
+    The requests cancelled by a faster hedged response count by their elapsed time
+    as a lower bound, so the slow responses are not left out of the quantiles
+    """
+
+    def __init__(self, window: int = 200):
+        """
+        :param int window: the number of the recent latencies kept
+        """
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.cancellations = 0
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of a successful request"""
+        self.requests += 1
+        self._latencies.append(seconds)
+
+    def record_cancellation(self, seconds: float) -> None:
+        """Record the time waited for a cancelled request, the lower bound of its latency"""
+        self.requests += 1
+        self.cancellations += 1
+        self._latencies.append(seconds)
+
+    def record_failure(self) -> None:
+        """Record a failed request"""
+        self.requests += 1
+        self.failures += 1
+
+    def quantile(self, quantile: float) -> float | None:
+        """Get the latency quantile, e.g., 0.95; None if there are no latencies"""
+        if not self._latencies:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(math.ceil(quantile * len(latencies)) - 1, len(latencies) - 1)]
+
+    def __str__(self) -> str:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        latencies = "" if p50 is None else f" p50={p50 * 1e3:.1f}ms p95={p95 * 1e3:.1f}ms"  # type: ignore
+        return (
+            f"requests={self.requests} failures={self.failures} "
+            f"cancellations={self.cancellations}{latencies}"
+        )
+
+
+class AbstractRateProvider(ABC):
+    """Abstract exchange rates provider"""
+
+    def __init__(self, name: str):
+        """
+        :param str name: the provider name used in logs
+        """
+        self.name = name
+        self.latency = LatencyTracker()
+
+    @abstractmethod
+    async def fetch_payload(self) -> bytes:
+        """
+        Fetch the exchange rates response content
+        :raises Exception: the request has failed
+        """
+
+    @abstractmethod
+    def validate_payload(self, payload: bytes) -> None:
+        """
+        Check the response content cheaply before accepting it
+        :raises ProviderError: the content is not valid
+        """
+
+    @staticmethod
+    @abstractmethod
+    def parse_values(payload: bytes, symbols: Collection[str]) -> Dict[str, float]:
+        """
+        Parse the response content into the exchange rate values by symbol.
+        A module-level pure function to run in a thread or process pool
+        """
+
+    async def request(self) -> "ProviderResponse":
+        """
+        Fetch and validate the response content tracking the latency
+        :raises ProviderError: the request has failed or the content is not valid
+        """
+        started_at = time.monotonic()
+        try:
+            payload = await self.fetch_payload()
+            self.validate_payload(payload)
+        except asyncio.CancelledError:
+            # Another provider has responded first
+            self.latency.record_cancellation(time.monotonic() - started_at)
+            raise
+        except Exception as exc:
+            self.latency.record_failure()
+            if isinstance(exc, ProviderError):
+                raise
+            raise ProviderError(f"{self.name}: {exc!r}") from exc
+        latency = time.monotonic() - started_at
+        self.latency.record(latency)
+        return ProviderResponse(provider=self, payload=payload, latency=latency)
+
+
+@dataclass
+class ProviderResponse:
+    """A valid response of the provider"""
+
+    provider: AbstractRateProvider
+    payload: bytes
+    latency: float
+
+
+class HedgedRateFetcher:
+    """
+    Fetcher requesting the providers in order: the next provider is requested
+    if the previous ones have failed or have not responded within the hedge delay.
+    The hedge delay is the latency quantile of the last requested provider,
+    so the hedged requests are sent for the slowest responses only.
+    The first valid response is taken, the other requests are cancelled
+    """
+
+    def __init__(
+        self,
+        providers: List[AbstractRateProvider],
+        hedge_quantile: float = 0.95,
+        min_hedge_delay_seconds: float = 0.05,
+        max_hedge_delay_seconds: float = 1,
+        default_hedge_delay_seconds: float = 0.5,
+        min_samples: int = 10,
+    ):
+        """
+        :param List[AbstractRateProvider] providers: the providers in the order of preference
+        :param float hedge_quantile: the latency quantile to wait for before hedging
+        :param float min_hedge_delay_seconds: the minimum hedge delay
+        :param float max_hedge_delay_seconds: the maximum hedge delay
+        :param float default_hedge_delay_seconds: the hedge delay until enough latencies are known
+        :param int min_samples: the number of latencies required to use the quantile
+        """
+        if not providers:
+            raise ValueError("At least a single provider is required")
+        self.providers = providers
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay_seconds = min_hedge_delay_seconds
+        self.max_hedge_delay_seconds = max_hedge_delay_seconds
+        self.default_hedge_delay_seconds = default_hedge_delay_seconds
+        self.min_samples = min_samples
+        # Number of the responses taken by provider name
+        self.wins: Dict[str, int] = {provider.name: 0 for provider in providers}
+        self.hedged_requests = 0
+
+    def get_hedge_delay(self, provider: AbstractRateProvider) -> float:
+        """Get the time to wait for the provider before requesting the next one"""
+        if len(provider.latency) < self.min_samples:
+            return self.default_hedge_delay_seconds
+        delay = provider.latency.quantile(self.hedge_quantile)
+        return min(max(delay, self.min_hedge_delay_seconds), self.max_hedge_delay_seconds)  # type: ignore
+
+    async def fetch(self) -> ProviderResponse:
+        """
+        Get the first valid response
+        :raises ProviderError: all the providers have failed
+        """
+        pending: Set[asyncio.Task] = set()
+        errors: List[BaseException] = []
+        providers = iter(self.providers)
+        try:
+            while True:
+                provider = next(providers, None)
+                if provider is not None:
+                    if pending:
+                        self.hedged_requests += 1
+                    pending.add(asyncio.create_task(provider.request()))
+                    timeout = self.get_hedge_delay(provider)
+                elif not pending:
+                    raise ProviderError(f"All the providers have failed: {errors}")
+                else:
+                    timeout = None
+
+                # Wait for a response until the hedge delay; a failure hedges at once
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    exception = task.exception()
+                    if exception is None:
+                        response = task.result()
+                        self.wins[response.provider.name] += 1
+                        return response
+                    errors.append(exception)
+                    _LOG.warning(f"Exchange rate provider failure: {exception}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def report(self) -> None:
+        """Log the providers latencies"""
+        for provider in self.providers:
+            _LOG.info(
+                f"Exchange rate provider {provider.name}: {provider.latency} "
+                f"wins={self.wins[provider.name]}"
+            )
+        _LOG.info(f"Hedged requests: {self.hedged_requests}")
@@ -0,0 +1,87 @@
+"""
+Retention of the raw exchange rates: the expired records are compacted into the archive
+"""
+
+import asyncio
+import time
+
+from loguru import logger as _LOG
+
+from db.archive import SECONDS_PER_DAY, ExchangeRateArchive, get_day_start
+from db.models.exchange_rate import Asset, ExchangeRate
+
+
+class ExchangeRateRetention:
+    """
+    Purge of the exchange rates older than `retention_days` whole UTC days:
+    every expired asset day is written into the archive and only then deleted from the DB,
+    so the collection and its indexes stay bounded while the old points remain readable.
+    An interrupted purge is resumed by the next one: the archived days are merged, not duplicated
+    """
+
+    def __init__(self, archive: ExchangeRateArchive, retention_days: int, batch_size: int = 2000):
+        """
+        :param ExchangeRateArchive archive: the archive of the expired records
+        :param int retention_days: the number of the whole UTC days kept in the DB
+        :param int batch_size: the number of the records fetched per round trip
+        """
+        self._archive = archive
+        self.retention_days = retention_days
+        self._batch_size = batch_size
+        self.purged_days = 0
+        self.purged_records = 0
+
+    def get_cutoff(self, now: int | None = None) -> int:
+        """Get the time the records before which are expired"""
+        today_start = get_day_start(int(time.time()) if now is None else now)
+        return today_start - self.retention_days * SECONDS_PER_DAY
+
+    async def purge(self, now: int | None = None) -> None:
+        """
+        Archive and delete the expired records of every asset
+        :param int | None now: the current timestamp
+        """
+        cutoff = self.get_cutoff(now)
+        for asset in await Asset.find().sort(+Asset.id).to_list():  # type: ignore
+            await self._purge_asset(asset.id, cutoff)  # type: ignore
+
+    async def _purge_asset(self, asset_id: int, cutoff: int) -> None:
+        """Archive and delete the expired asset records day by day from the oldest one"""
+        while True:
+            oldest_point = await ExchangeRate.find_points(asset_id).first_or_none()
+            if oldest_point is None or oldest_point.time >= cutoff:
+                return
+            day_start = get_day_start(oldest_point.time)
+            day_end = day_start + SECONDS_PER_DAY - 1
+
+            times, values = [], []
+            records = ExchangeRate.iter_points(
+                asset_id, time_from=day_start, time_to=day_end, batch_size=self._batch_size
+            )
+            try:
+                async for record in records:
+                    times.append(record["time"])
+                    values.append(record["value"])
+            finally:
+                await records.close()
+            archived_count = await asyncio.to_thread(
+                self._archive.write_day, asset_id, day_start, times, values
+            )
+
+            result = await ExchangeRate.find_by_asset(
+                asset_id, time_from=day_start, time_to=day_end
+            ).delete()
+            deleted_count = result.deleted_count if result else 0
+            self.purged_days += 1
+            self.purged_records += deleted_count
+            _LOG.info(
+                f"Archived {archived_count} exchange rates of the asset {asset_id} "
+                f"into {self._archive.get_path(asset_id, day_start)}; deleted {deleted_count}"
+            )
+
+    def report(self) -> None:
+        """Log the purge counters"""
+        _LOG.info(
+            f"Exchange rate retention: purged_days={self.purged_days} "
+            f"purged_records={self.purged_records}"
+        )
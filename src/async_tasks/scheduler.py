@@ -0,0 +1,238 @@
+"""
+Drift-free periodic jobs scheduler
+"""
+
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, List, Literal, Set
+
+from loguru import logger as _LOG
+
+# What to do with a tick while the job is busy with the maximum number of runs:
+#   `skip` - drop the tick;
+#   `coalesce` - run once as soon as a run finishes for all the ticks dropped in the meantime
+OverduePolicy = Literal["skip", "coalesce"]
+
+JobFunction = Callable[[], Coroutine[Any, Any, Any]]
+
+
+@dataclass
+class JobStats:
+    """Per-job counters and timings, seconds"""
+
+    runs: int = 0
+    failures: int = 0
+    # Number of the ticks dropped or merged into another run
+    skipped_ticks: int = 0
+    coalesced_ticks: int = 0
+    in_flight: int = 0
+    # Delay of the run start after its tick
+    last_lateness: float = 0
+    max_lateness: float = 0
+    total_lateness: float = 0
+    last_duration: float = 0
+    max_duration: float = 0
+    total_duration: float = 0
+
+    @property
+    def mean_lateness(self) -> float:
+        """Mean delay of the run start after its tick"""
+        return self.total_lateness / self.runs if self.runs else 0
+
+    @property
+    def mean_duration(self) -> float:
+        """Mean run duration"""
+        return self.total_duration / self.runs if self.runs else 0
+
+    def __str__(self) -> str:
+        return (
+            f"runs={self.runs} failures={self.failures} "
+            f"skipped={self.skipped_ticks} coalesced={self.coalesced_ticks} "
+            f"lateness mean={self.mean_lateness * 1e3:.1f}ms max={self.max_lateness * 1e3:.1f}ms "
+            f"duration mean={self.mean_duration * 1e3:.1f}ms max={self.max_duration * 1e3:.1f}ms"
+        )
+
+
+class PeriodicJob:
+    """
+    Job running the coroutine function on the wall-clock aligned ticks:
+    the tick times are `offset_seconds` after the multiples of `interval_seconds` since the epoch,
+    so the run time does not shift the following ticks.
+    The failures are logged and do not stop the job; the ticks are skipped for the backoff delay
+    doubled on every consecutive failure
+    """
+
+    def __init__(
+        self,
+        function: JobFunction,
+        interval_seconds: float = 1,
+        offset_seconds: float = 0,
+        max_in_flight: int = 1,
+        overdue_policy: OverduePolicy = "coalesce",
+        backoff_seconds: float = 1,
+        max_backoff_seconds: float = 30,
+        name: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param JobFunction function: the async function to run
+        :param float interval_seconds: interval between the ticks
+        :param float offset_seconds: offset of the ticks after the interval boundaries
+        :param int max_in_flight: the maximum number of the concurrent runs
+        :param OverduePolicy overdue_policy: what to do with the ticks while the job is busy
+        :param float backoff_seconds: the delay after the first failure
+        :param float max_backoff_seconds: the maximum delay after the consecutive failures
+        :param str name: the job name; the function name by default
+        :param Callable[[], float] clock: the wall clock, seconds since the epoch
+        """
+        if interval_seconds <= 0:
+            raise ValueError("The interval must be positive")
+        if max_in_flight < 1:
+            raise ValueError("The maximum number of the concurrent runs must be positive")
+        self.function = function
+        self.interval_seconds = interval_seconds
+        self.offset_seconds = offset_seconds
+        self.max_in_flight = max_in_flight
+        self.overdue_policy = overdue_policy
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.name = name or getattr(function, "__name__", repr(function))
+        self.stats = JobStats()
+        self._clock = clock
+        self._tasks: Set[asyncio.Task] = set()
+        # The latest tick waiting for a run to finish with the `coalesce` policy
+        self._pending_tick: float | None = None
+        self._consecutive_failures = 0
+        self._backoff_until = float("-inf")
+
+    def get_next_tick(self, now: float) -> float:
+        """Get the first tick time not earlier than `now`"""
+        interval, offset = self.interval_seconds, self.offset_seconds
+        return math.ceil((now - offset) / interval) * interval + offset
+
+    async def run(self) -> None:
+        """Run the job on every tick until cancelled"""
+        interval = self.interval_seconds
+        next_tick = self.get_next_tick(self._clock())
+        try:
+            while True:
+                await asyncio.sleep(max(next_tick - self._clock(), 0))
+                now = self._clock()
+                # The ticks passed while the event loop was busy are merged into the latest one
+                missed_ticks = int((now - next_tick) // interval)
+                if missed_ticks > 0:
+                    next_tick += missed_ticks * interval
+                    if self.overdue_policy == "skip":
+                        self.stats.skipped_ticks += missed_ticks
+                    else:
+                        self.stats.coalesced_ticks += missed_ticks
+                self._on_tick(next_tick, now)
+                next_tick += interval
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _on_tick(self, tick: float, now: float) -> None:
+        """Start a run of the tick unless the job is busy or backing off"""
+        stats = self.stats
+        if now < self._backoff_until:
+            stats.skipped_ticks += 1
+            return
+        if len(self._tasks) >= self.max_in_flight:
+            if self.overdue_policy == "skip":
+                stats.skipped_ticks += 1
+                return
+            if self._pending_tick is not None:
+                stats.coalesced_ticks += 1
+            self._pending_tick = tick
+            return
+        self._start(tick)
+
+    def _start(self, tick: float) -> None:
+        """Start a run of the tick"""
+        task = asyncio.create_task(self._run_once(tick))
+        self._tasks.add(task)
+        self.stats.in_flight = len(self._tasks)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        """Forget the finished run and start the coalesced one"""
+        self._tasks.discard(task)
+        self.stats.in_flight = len(self._tasks)
+        if task.cancelled() or self._pending_tick is None:
+            return
+        if self._clock() < self._backoff_until:
+            self.stats.skipped_ticks += 1
+            self._pending_tick = None
+            return
+        tick, self._pending_tick = self._pending_tick, None
+        self._start(tick)
+
+    async def _run_once(self, tick: float) -> None:
+        """Run the function once and update the stats"""
+        stats = self.stats
+        started_at = self._clock()
+        lateness = max(started_at - tick, 0)
+        try:
+            await self.function()
+        except Exception as exc:
+            stats.failures += 1
+            self._consecutive_failures += 1
+            backoff = min(
+                self.backoff_seconds * 2 ** (self._consecutive_failures - 1),
+                self.max_backoff_seconds,
+            )
+            self._backoff_until = self._clock() + backoff
+            _LOG.error(f"The {self.name} job has failed, retrying in {backoff}s: {exc}")
+        else:
+            self._consecutive_failures = 0
+        duration = self._clock() - started_at
+        stats.runs += 1
+        stats.last_lateness = lateness
+        stats.max_lateness = max(stats.max_lateness, lateness)
+        stats.total_lateness += lateness
+        stats.last_duration = duration
+        stats.max_duration = max(stats.max_duration, duration)
+        stats.total_duration += duration
+
+
+class PeriodicScheduler:
+    """Scheduler running the periodic jobs and reporting their stats"""
+
+    def __init__(self, report_interval_seconds: float = 60):
+        """
+        :param float report_interval_seconds: interval between logging the jobs stats
+        """
+        self.report_interval_seconds = report_interval_seconds
+        self.jobs: List[PeriodicJob] = []
+
+    def add_job(self, function: JobFunction, **kwargs: Any) -> PeriodicJob:
+        """
+        Add a job running the async function periodically
+        :param JobFunction function: the async function to run
+        :param kwargs: the PeriodicJob options
+        """
+        job = PeriodicJob(function, **kwargs)
+        self.jobs.append(job)
+        return job
+
+    async def run(self) -> None:
+        """Run all the jobs until cancelled"""
+        async with asyncio.TaskGroup() as task_group:
+            for job in self.jobs:
+                task_group.create_task(job.run())
+            task_group.create_task(self._report())
+
+    def report(self) -> None:
+        """Log the stats of every job"""
+        for job in self.jobs:
+            _LOG.info(f"Job {job.name}: {job.stats}")
+
+    async def _report(self) -> None:
+        """Log the stats periodically"""
+        while True:
+            await asyncio.sleep(self.report_interval_seconds)
+            self.report()
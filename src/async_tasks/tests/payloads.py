@@ -0,0 +1,26 @@
+"""
+Emcont endpoint payloads for the tests
+"""
+
+import json
+from typing import List
+
+
+def make_payload(symbols: List[str], bid: float = 1.17) -> bytes:
+    """Make the Emcont endpoint response content"""
+    rates = [
+        {
+            "Symbol": symbol,
+            "Bid": bid,
+            "Ask": bid + 0.0002,
+            "Spread": 2.0,
+            "ProductType": "1",
+            "LastClose": bid,
+            "PriceChange": 0.0,
+            "PercentChange": 0.0,
+            "52WeekHigh": bid,
+            "52WeekLow": bid,
+        }
+        for symbol in symbols
+    ]
+    return f"null({json.dumps({'Rates': rates})});".encode()
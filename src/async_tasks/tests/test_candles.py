@@ -0,0 +1,93 @@
+"""
+Test the OHLC candle rollups
+"""
+
+from typing import List
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from async_tasks.candles import CandleRollup
+from db.models.candle import Candle
+from db.models.exchange_rate import Asset, ExchangeRate
+
+# The 5-minute candle open time
+TIME_FROM = 1_700_000_100
+
+
+@pytest.mark.asyncio
+async def test_candle_rollup(assets: List[Asset]):
+    """Test the rollups: the partial candles of every flush are merged into the stored ones"""
+    eurusd = assets[0]
+    rollup = CandleRollup(intervals=("1m", "5m"))
+
+    def add(time_offset: int, value: float) -> None:
+        rollup.add([ExchangeRate(asset=eurusd, time=TIME_FROM + time_offset, value=value)])
+
+    add(0, 1.17)
+    add(5, 1.19)
+    # Duplicates and late records are skipped
+    add(5, 1.5)
+    add(3, 1.5)
+    assert len(rollup) == 2
+    await rollup.flush()
+    assert len(rollup) == 0
+
+    add(10, 1.16)
+    # The next minute
+    add(70, 1.18)
+    await rollup.flush()
+
+    minute_candles = await Candle.find_range(eurusd.id, "1m", time_from=0)  # type: ignore
+    assert [candle.to_dict() for candle in minute_candles] == [
+        {"time": TIME_FROM, "open": 1.17, "high": 1.19, "low": 1.16, "close": 1.16, "ticks": 3},
+        {
+            "time": TIME_FROM + 60,
+            "open": 1.18,
+            "high": 1.18,
+            "low": 1.18,
+            "close": 1.18,
+            "ticks": 1,
+        },
+    ]
+    five_minutes_candles = await Candle.find_range(eurusd.id, "5m")  # type: ignore
+    assert [candle.to_dict() for candle in five_minutes_candles] == [
+        {"time": TIME_FROM, "open": 1.17, "high": 1.19, "low": 1.16, "close": 1.18, "ticks": 4},
+    ]
+    assert (rollup.flushes, rollup.flushed_candles) == (2, 5)
+
+
+@pytest.mark.asyncio
+async def test_candle_rollup__partial_failure(monkeypatch, assets: List[Asset]):
+    """
+    Test the rollups: on a bulk write error, only the failed candles are merged again
+    """
+    eurusd = assets[0]
+    rollup = CandleRollup(intervals=("1m", "5m"))
+    merge_many = Candle.merge_many
+
+    async def merge_all_but_5m(candles: List[Candle]):
+        # The unordered bulk write merges the 1m candle and fails the 5m one
+        await merge_many([candle for candle in candles if candle.interval == "1m"])
+        failed_indexes = [idx for idx, candle in enumerate(candles) if candle.interval == "5m"]
+        raise BulkWriteError(
+            {"writeErrors": [{"index": idx, "code": 1, "errmsg": ""} for idx in failed_indexes]}
+        )
+
+    rollup.add([ExchangeRate(asset=eurusd, time=TIME_FROM, value=1.17)])
+    monkeypatch.setattr(Candle, "merge_many", merge_all_but_5m)
+    with pytest.raises(BulkWriteError):
+        await rollup.flush()
+    assert len(rollup) == 1
+
+    # The candles added in the meantime are merged into the failed one
+    rollup.add([ExchangeRate(asset=eurusd, time=TIME_FROM + 5, value=1.19)])
+    monkeypatch.setattr(Candle, "merge_many", merge_many)
+    await rollup.flush()
+
+    minute_candles = await Candle.find_range(eurusd.id, "1m")  # type: ignore
+    assert [candle.ticks for candle in minute_candles] == [2]
+    five_minutes_candles = await Candle.find_range(eurusd.id, "5m")  # type: ignore
+    assert [candle.to_dict() for candle in five_minutes_candles] == [
+        {"time": TIME_FROM, "open": 1.17, "high": 1.19, "low": 1.17, "close": 1.19, "ticks": 2},
+    ]
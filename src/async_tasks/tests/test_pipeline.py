@@ -0,0 +1,115 @@
+"""
+Test the Emcont ingestion pipeline
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List
+
+import pytest
+
+from async_tasks.emcont_service import pipeline as pipeline_module
+from async_tasks.emcont_service.parsing import parse_exchange_rate_values
+from async_tasks.emcont_service.pipeline import EmcontIngestionPipeline
+from async_tasks.emcont_service.provider import EmcontRateProvider
+from async_tasks.emcont_service.service import EmcontService
+from async_tasks.tests.payloads import make_payload
+from db.models.exchange_rate import Asset, ExchangeRate
+
+
+class StaticRateProvider(EmcontRateProvider):
+    """Emcont provider returning the same response content"""
+
+    def __init__(self, payload: bytes):
+        super().__init__(url="http://static.test/", client=None, name="static")  # type: ignore
+        self.payload = payload
+
+    async def fetch_payload(self) -> bytes:
+        return self.payload
+
+
+class FrozenDatetime(datetime):
+    """Datetime of the fixed current time"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 2, 3, 4, 5, tzinfo=tz)
+
+
+def test_parse_exchange_rate_values():
+    """
+    Test parsing the response: only the requested symbols are parsed
+    """
+    payload = make_payload(["EURUSD", "USDJPY", "XAUUSD"])
+    values = parse_exchange_rate_values(payload, ["EURUSD", "USDJPY"])
+    assert values == pytest.approx({"EURUSD": 1.1701, "USDJPY": 1.1701})
+
+    # The JSONP wrapper is required
+    with pytest.raises(Exception, match="Can not extract data"):
+        parse_exchange_rate_values(payload[5:], ["EURUSD"])
+
+
+@pytest.mark.asyncio
+async def test_ingestion_pipeline(monkeypatch, assets: List[Asset]):
+    """
+    Test the ingestion pipeline: the fetched snapshots are parsed in the executor
+    and saved in batches
+    """
+    # All the snapshots are fetched within the same second
+    monkeypatch.setattr(pipeline_module, "datetime", FrozenDatetime)
+    payload = make_payload([asset.name for asset in assets])
+    service = EmcontService(providers=[StaticRateProvider(payload)])
+    await service.sync_assets()
+    save_exchange_rates = service.save_exchange_rates
+    saved_batches: List[List[ExchangeRate]] = []
+
+    async def save_batch(exchange_rates: List[ExchangeRate]):
+        saved_batches.append(list(exchange_rates))
+        return await save_exchange_rates(exchange_rates)
+
+    monkeypatch.setattr(service, "save_exchange_rates", save_batch)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = EmcontIngestionPipeline(
+            service, parse_executor=executor, batch_delay_seconds=0.5
+        )
+        task = asyncio.create_task(pipeline.run())
+        for _ in range(3):
+            await pipeline.fetch()
+        await asyncio.wait_for(pipeline.join(), timeout=2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    metrics = pipeline.metrics
+    assert metrics["fetch"].processed == metrics["parse"].processed == 3
+    assert metrics["persist"].processed == 3
+    assert all(stage_metrics.failed == 0 for stage_metrics in metrics.values())
+
+    # The snapshots are merged into fewer batches
+    assert len(saved_batches) < 3
+    assert sum(len(batch) for batch in saved_batches) == 3 * len(assets)
+
+    # The snapshots fetched within the same second are saved once
+    records = await ExchangeRate.find().to_list()
+    assert len(records) == len(assets)
+    assert {record.time for record in records} == {int(FrozenDatetime.now().timestamp())}
+    assert all(record.value == pytest.approx(1.1701) for record in records)
+
+
+@pytest.mark.asyncio
+async def test_ingestion_pipeline__backlog(assets: List[Asset]):
+    """
+    Test the ingestion pipeline: the oldest snapshot is dropped if the parse stage is behind
+    """
+    payload = make_payload([asset.name for asset in assets])
+    service = EmcontService(providers=[StaticRateProvider(payload)])
+    await service.sync_assets()
+    pipeline = EmcontIngestionPipeline(service, queue_size=2)
+    for _ in range(3):
+        await pipeline.fetch()
+
+    metrics = pipeline.metrics
+    assert metrics["fetch"].processed == 3
+    assert metrics["fetch"].dropped == 1
+    assert metrics["parse"].backlog == metrics["parse"].max_backlog == 2
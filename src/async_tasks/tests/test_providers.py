@@ -0,0 +1,177 @@
+"""
+Test the exchange rate providers and the hedged requests
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+import httpx
+import pytest
+
+from async_tasks.emcont_service.provider import EmcontRateProvider
+from async_tasks.providers import HedgedRateFetcher, LatencyTracker, ProviderError
+from async_tasks.tests.payloads import make_payload
+
+
+class StandInServer:
+    """Local stand-in HTTP server of the Emcont endpoint with the injected delay"""
+
+    def __init__(self, delay_seconds: float = 0, status: int = 200):
+        self.delay_seconds = delay_seconds
+        self.status = status
+        self.requests = 0
+        self.payload = make_payload(["EURUSD"])
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.requests += 1
+                time.sleep(stand_in.delay_seconds)
+                self.send_response(stand_in.status)
+                self.send_header("Content-Length", str(len(stand_in.payload)))
+                self.end_headers()
+                self.wfile.write(stand_in.payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    @contextmanager
+    def serve(self) -> Iterator["StandInServer"]:
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+@contextmanager
+def stand_in_servers(*servers: StandInServer) -> Iterator[None]:
+    """Serve all the stand-in servers"""
+    with servers[0].serve():
+        if len(servers) > 1:
+            with stand_in_servers(*servers[1:]):
+                yield
+        else:
+            yield
+
+
+def make_fetcher(client: httpx.AsyncClient, *servers: StandInServer) -> HedgedRateFetcher:
+    """Make the fetcher of the Emcont providers of the stand-in servers"""
+    providers = [
+        EmcontRateProvider(server.url, client, name=f"provider{idx}")
+        for idx, server in enumerate(servers)
+    ]
+    return HedgedRateFetcher(providers, default_hedge_delay_seconds=0.1)
+
+
+def test_latency_tracker():
+    """
+    Test the latency tracker quantiles over the recent latencies
+    """
+    latency = LatencyTracker(window=100)
+    assert latency.quantile(0.95) is None
+    for milliseconds in range(1, 201):
+        latency.record(milliseconds / 1000)
+    latency.record_failure()
+
+    assert len(latency) == 100
+    assert latency.quantile(0.95) == pytest.approx(0.195)
+    assert latency.quantile(0.5) == pytest.approx(0.15)
+    assert (latency.requests, latency.failures) == (201, 1)
+
+    # The cancelled requests count by their elapsed time
+    for _ in range(10):
+        latency.record_cancellation(0.5)
+    assert latency.quantile(0.95) == pytest.approx(0.5)
+    assert (latency.requests, latency.cancellations) == (211, 10)
+
+
+@pytest.mark.asyncio
+async def test_hedged_rate_fetcher__primary():
+    """
+    Test the hedged fetcher: the fast primary provider is requested only
+    """
+    primary, secondary = StandInServer(), StandInServer()
+    with stand_in_servers(primary, secondary):
+        async with httpx.AsyncClient() as client:
+            fetcher = make_fetcher(client, primary, secondary)
+            for _ in range(3):
+                response = await fetcher.fetch()
+                assert response.provider.name == "provider0"
+                assert response.payload == primary.payload
+
+    assert (primary.requests, secondary.requests) == (3, 0)
+    assert fetcher.hedged_requests == 0
+    assert len(fetcher.providers[0].latency) == 3
+
+
+@pytest.mark.asyncio
+async def test_hedged_rate_fetcher__slow_primary():
+    """
+    Test the hedged fetcher: the secondary provider is requested after the hedge delay
+    and its response is taken
+    """
+    primary, secondary = StandInServer(delay_seconds=1), StandInServer()
+    with stand_in_servers(primary, secondary):
+        async with httpx.AsyncClient() as client:
+            fetcher = make_fetcher(client, primary, secondary)
+            started_at = time.monotonic()
+            response = await fetcher.fetch()
+            elapsed = time.monotonic() - started_at
+            await asyncio.sleep(0)
+
+    assert response.provider.name == "provider1"
+    assert 0.1 <= elapsed < 0.5
+    assert fetcher.hedged_requests == 1
+    assert fetcher.wins == {"provider0": 0, "provider1": 1}
+    # The cancelled primary request counts by the time waited for it
+    primary_latency = fetcher.providers[0].latency
+    assert (primary_latency.requests, primary_latency.cancellations) == (1, 1)
+    assert primary_latency.quantile(0.95) >= 0.1  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_hedged_rate_fetcher__hedge_delay():
+    """
+    Test the hedged fetcher: the hedge delay follows the provider p95 latency
+    """
+    primary = StandInServer(delay_seconds=0.02)
+    with stand_in_servers(primary):
+        async with httpx.AsyncClient() as client:
+            fetcher = make_fetcher(client, primary)
+            assert fetcher.get_hedge_delay(fetcher.providers[0]) == 0.1
+            for _ in range(fetcher.min_samples):
+                await fetcher.fetch()
+
+    hedge_delay = fetcher.get_hedge_delay(fetcher.providers[0])
+    assert fetcher.min_hedge_delay_seconds <= hedge_delay < 0.1
+
+
+@pytest.mark.asyncio
+async def test_hedged_rate_fetcher__failures():
+    """
+    Test the hedged fetcher: a failed provider is hedged at once; all the providers may fail
+    """
+    primary, secondary = StandInServer(status=500), StandInServer()
+    with stand_in_servers(primary, secondary):
+        async with httpx.AsyncClient() as client:
+            fetcher = make_fetcher(client, primary, secondary)
+            started_at = time.monotonic()
+            response = await fetcher.fetch()
+            assert response.provider.name == "provider1"
+            assert time.monotonic() - started_at < 0.1
+            assert fetcher.providers[0].latency.failures == 1
+
+            secondary.payload = b"Service unavailable"
+            with pytest.raises(ProviderError):
+                await fetcher.fetch()
@@ -0,0 +1,48 @@
+"""
+Test the exchange rates retention
+"""
+
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from async_tasks.retention import ExchangeRateRetention
+from db.archive import SECONDS_PER_DAY, ExchangeRateArchive
+from db.models.exchange_rate import Asset, ExchangeRate
+
+# 2023-11-14 00:00:00 UTC
+DAY_START = 1_699_920_000
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_retention(assets: List[Asset], tmp_path: Path):
+    """
+    Test the purge: the expired days are archived and deleted, the retained ones are kept
+    """
+    eurusd = assets[0]
+    times = [DAY_START + day * SECONDS_PER_DAY + offset for day in range(3) for offset in (0, 60)]
+    await ExchangeRate.upsert_many(
+        [
+            ExchangeRate(asset=eurusd, time=time, value=1 + idx / 100)
+            for idx, time in enumerate(times)
+        ]
+    )
+    archive = ExchangeRateArchive(tmp_path)
+    retention = ExchangeRateRetention(archive, retention_days=1)
+
+    # The third day is today
+    now = DAY_START + 2 * SECONDS_PER_DAY + 100
+    assert retention.get_cutoff(now) == DAY_START + SECONDS_PER_DAY
+    await retention.purge(now=now)
+    assert retention.purged_days == 1
+    assert retention.purged_records == 2
+
+    remaining_times = [point.time for point in await ExchangeRate.find_points(eurusd.id).to_list()]  # type: ignore
+    assert remaining_times == times[2:]
+    assert archive.get_days(eurusd.id) == [DAY_START]  # type: ignore
+    assert list(archive.iter_points(eurusd.id, DAY_START)) == [(times[:2], [1.0, 1.01])]  # type: ignore
+
+    # Nothing else is expired
+    await retention.purge(now=now)
+    assert retention.purged_days == 1
@@ -0,0 +1,147 @@
+"""
+Test the periodic jobs scheduler
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from async_tasks.scheduler import PeriodicJob, PeriodicScheduler
+
+INTERVAL_SECONDS = 0.05
+
+
+async def run_for(job: PeriodicJob, seconds: float) -> None:
+    """Run the job for the given time"""
+    task = asyncio.create_task(job.run())
+    await asyncio.sleep(seconds)
+    assert not task.done()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_periodic_job__get_next_tick():
+    """
+    Test the periodic job: the ticks are aligned to the interval boundaries with the offset
+    """
+
+    async def noop():
+        pass
+
+    job = PeriodicJob(noop, interval_seconds=1, offset_seconds=0.05)
+    assert job.get_next_tick(100.0) == 100.05
+    assert job.get_next_tick(100.05) == 100.05
+    assert job.get_next_tick(100.5) == 101.05
+
+
+@pytest.mark.asyncio
+async def test_periodic_job__aligned_ticks():
+    """
+    Test the periodic job: the runs start on the ticks and the run time does not cause a drift
+    """
+    started_at = []
+
+    async def record():
+        started_at.append(time.time())
+        await asyncio.sleep(INTERVAL_SECONDS / 2)
+
+    job = PeriodicJob(record, interval_seconds=INTERVAL_SECONDS, offset_seconds=0.01)
+    await run_for(job, INTERVAL_SECONDS * 8)
+
+    assert len(started_at) >= 6
+    for start_time in started_at:
+        phase = (start_time - 0.01) % INTERVAL_SECONDS
+        assert min(phase, INTERVAL_SECONDS - phase) < 0.02
+    # The last run may be cancelled before finishing
+    assert job.stats.runs <= len(started_at) <= job.stats.runs + 1
+    assert job.stats.max_lateness < 0.02
+    assert job.stats.failures == job.stats.skipped_ticks == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("overdue_policy", ["skip", "coalesce"])
+async def test_periodic_job__overdue_ticks(overdue_policy):
+    """
+    Test the periodic job: the number of the concurrent runs is limited,
+    the overdue ticks are either skipped or coalesced
+    """
+    concurrency = []
+    in_flight = 0
+
+    async def slow():
+        nonlocal in_flight
+        in_flight += 1
+        concurrency.append(in_flight)
+        await asyncio.sleep(INTERVAL_SECONDS * 2.5)
+        in_flight -= 1
+
+    job = PeriodicJob(
+        slow,
+        interval_seconds=INTERVAL_SECONDS,
+        max_in_flight=2,
+        overdue_policy=overdue_policy,
+    )
+    await run_for(job, INTERVAL_SECONDS * 12)
+
+    assert max(concurrency) == 2
+    stats = job.stats
+    if overdue_policy == "skip":
+        assert stats.skipped_ticks > 0
+        assert stats.coalesced_ticks == 0
+    else:
+        assert stats.coalesced_ticks > 0
+        assert stats.skipped_ticks == 0
+
+
+@pytest.mark.asyncio
+async def test_periodic_job__failures():
+    """
+    Test the periodic job: the failures do not stop the job and back off the following runs
+    """
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        raise ValueError("Unavailable")
+
+    job = PeriodicJob(
+        fail,
+        interval_seconds=INTERVAL_SECONDS,
+        backoff_seconds=INTERVAL_SECONDS * 3,
+        max_backoff_seconds=INTERVAL_SECONDS * 3,
+    )
+    await run_for(job, INTERVAL_SECONDS * 10)
+
+    stats = job.stats
+    assert 2 <= calls <= 4
+    assert stats.failures == stats.runs == calls
+    assert stats.skipped_ticks > 0
+
+
+@pytest.mark.asyncio
+async def test_periodic_scheduler():
+    """
+    Test the periodic scheduler: all the jobs are run
+    """
+    calls = {"first": 0, "second": 0}
+
+    def make_job_function(name: str):
+        async def count():
+            calls[name] += 1
+
+        return count
+
+    scheduler = PeriodicScheduler()
+    for name in calls:
+        scheduler.add_job(make_job_function(name), interval_seconds=INTERVAL_SECONDS, name=name)
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(INTERVAL_SECONDS * 4)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert all(count >= 2 for count in calls.values())
+    assert [job.name for job in scheduler.jobs] == ["first", "second"]
@@ -0,0 +1,4 @@
+"""
+Benchmarks of the application hot paths.
+Run from the `src/` directory, e.g., `poetry run python -m benchmarks.bench_rpc_codecs`
+"""
@@ -0,0 +1,96 @@
+"""
+Microbenchmark of the Emcont payload parsing:
+the regex, `json.loads`, the symbols dict and the DTO per asset against the fast path.
+The payloads mimic the recorded Emcont responses with the increasing number of symbols;
+the first `ASSET_COUNT` symbols are parsed
+"""
+
+import json
+import random
+import re
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+from async_tasks.emcont_service.parsing import parse_exchange_rate_values
+
+from benchmarks.utils import measure, print_comparison
+
+SYMBOL_COUNTS = (10, 100, 1000, 5000)
+ASSET_COUNT = 5
+RATES_REGEX = re.compile(r"null\((?P<content>.*)\);")
+
+
+class EmcontExchangeRate(BaseModel):
+    """The former DTO of an Emcont exchange rate validated per asset"""
+
+    symbol: str = Field(alias="Symbol")
+    bid: float = Field(alias="Bid")
+    ask: float = Field(alias="Ask")
+    spread: float = Field(alias="Spread")
+    product_type: str = Field(alias="ProductType")
+    last_close: float = Field(alias="LastClose")
+    price_change: float = Field(alias="PriceChange")
+    percent_change: float = Field(alias="PercentChange")
+    week_high_52: float = Field(alias="52WeekHigh")
+    week_low_52: float = Field(alias="52WeekLow")
+
+
+def make_payload(symbol_count: int) -> bytes:
+    """Make the Emcont endpoint response content of the symbols"""
+    randomizer = random.Random(symbol_count)
+    rates = []
+    for idx in range(symbol_count):
+        bid = round(randomizer.uniform(0.5, 150), 5)
+        rates.append(
+            {
+                "Symbol": f"SYM{idx:05}",
+                "Bid": bid,
+                "Ask": round(bid * 1.0001, 5),
+                "Spread": 1.0,
+                "ProductType": "1",
+                "LastClose": bid,
+                "PriceChange": 0.0012,
+                "PercentChange": 0.11,
+                "52WeekHigh": round(bid * 1.2, 5),
+                "52WeekLow": round(bid * 0.8, 5),
+            }
+        )
+    return f"null({json.dumps({'Rates': rates})});".encode()
+
+
+def legacy_parse(payload: bytes, symbols: List[str]) -> Dict[str, float]:
+    """The former path: the regex, `json.loads`, the dict of all the symbols and the DTOs"""
+    match = RATES_REGEX.match(payload.decode())
+    if not match:
+        raise Exception("Can not extract data from the resource content")
+    rates = json.loads(match["content"])["Rates"]
+    rates_by_symbol = {rate["Symbol"]: rate for rate in rates}
+    values = {}
+    for symbol in symbols:
+        emcont_exchange_rate = EmcontExchangeRate(**rates_by_symbol[symbol])
+        values[symbol] = (emcont_exchange_rate.bid + emcont_exchange_rate.ask) / 2
+    return values
+
+
+def main():
+    for symbol_count in SYMBOL_COUNTS:
+        payload = make_payload(symbol_count)
+        symbols = [f"SYM{idx:05}" for idx in range(ASSET_COUNT)]
+        assert legacy_parse(payload, symbols) == parse_exchange_rate_values(payload, symbols)
+        number = max(10, 20000 // symbol_count)
+        print_comparison(
+            f"Parse {ASSET_COUNT} assets of a {len(payload) / 1024:.0f} KB payload "
+            f"of {symbol_count} symbols",
+            {
+                "legacy": measure(lambda: legacy_parse(payload, symbols), number=number),
+                "fast": measure(
+                    lambda: parse_exchange_rate_values(payload, symbols), number=number
+                ),
+            },
+            baseline="legacy",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the `exchangeRate` collection layouts: the regular collection against
+the time-series one. Compares the insert throughput, the storage and index sizes
+and the 30-minute asset history query.
+Requires a running MongoDB instance at `MONGO_CONNECTION_URI`;
+the `<MONGO_INITDB_DATABASE>_bench` database is created and dropped
+"""
+
+import asyncio
+from datetime import UTC, datetime
+from typing import Any, Dict, List
+
+from bson.dbref import DBRef
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+
+from db.database import get_database
+from db.models.exchange_rate import (
+    EXCHANGE_RATE_INDEXES,
+    EXCHANGE_RATE_TIME_SERIES_CONFIG,
+    EXCHANGE_RATE_TIME_SERIES_INDEXES,
+)
+from settings import settings
+
+from benchmarks.utils import measure_async, print_comparison
+
+ASSET_COUNT = 5
+# A day of the per-second snapshots
+SNAPSHOT_COUNT = 24 * 60 * 60
+HISTORY_SECONDS = 30 * 60
+TIME_FROM = 1_700_000_000
+
+
+def get_snapshot(time: int) -> List[Dict[str, Any]]:
+    """Get the records of all the assets at the time"""
+    date = datetime.fromtimestamp(time, UTC)
+    return [
+        {
+            "asset": DBRef("asset", asset_id),
+            "time": time,
+            "value": 1.17 + asset_id * 1e-3 + (time % 600) * 1e-6,
+            "date": date,
+        }
+        for asset_id in range(1, ASSET_COUNT + 1)
+    ]
+
+
+async def create_collection(
+    database: AsyncIOMotorDatabase, name: str, time_series: bool
+) -> AsyncIOMotorCollection:
+    """Create the collection of the layout with its indexes"""
+    if time_series:
+        await database.create_collection(**EXCHANGE_RATE_TIME_SERIES_CONFIG.build_query(name))
+        indexes = EXCHANGE_RATE_TIME_SERIES_INDEXES
+    else:
+        await database.create_collection(name)
+        indexes = EXCHANGE_RATE_INDEXES
+    collection = database[name]
+    await collection.create_indexes(indexes)
+    return collection
+
+
+async def insert_snapshots(collection: AsyncIOMotorCollection) -> float:
+    """
+    Insert a day of the snapshots in batches of a minute
+    :returns float: records inserted per second
+    """
+    started_at = asyncio.get_running_loop().time()
+    batch: List[Dict[str, Any]] = []
+    for time in range(TIME_FROM, TIME_FROM + SNAPSHOT_COUNT):
+        batch.extend(get_snapshot(time))
+        if len(batch) >= ASSET_COUNT * 60:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    elapsed = asyncio.get_running_loop().time() - started_at
+    return ASSET_COUNT * SNAPSHOT_COUNT / elapsed
+
+
+async def main():
+    database = get_database().client[f"{settings.MONGO_DB_NAME}_bench"]
+    time_to = TIME_FROM + SNAPSHOT_COUNT
+    time_from = time_to - HISTORY_SECONDS
+    try:
+        results = {}
+        for name, time_series in (("regular", False), ("time-series", True)):
+            collection = await create_collection(database, f"exchangeRate_{name}", time_series)
+            records_per_second = await insert_snapshots(collection)
+            stats = await database.command("collStats", collection.name)
+            print(
+                f"{name}: {records_per_second:,.0f} records/s inserted, "
+                f"storage {stats['storageSize'] / 2**20:.2f} MiB, "
+                f"indexes {stats['totalIndexSize'] / 2**20:.2f} MiB"
+            )
+
+            history_filter: Dict[str, Any] = {"asset.$id": 1, "time": {"$gte": time_from}}
+            sort_field = "time"
+            if time_series:
+                history_filter["date"] = {"$gte": datetime.fromtimestamp(time_from, UTC)}
+                sort_field = "date"
+
+            async def get_history():
+                cursor = collection.find(history_filter, projection={"_id": 0}).sort(sort_field)
+                records = await cursor.to_list(None)
+                assert len(records) == HISTORY_SECONDS
+
+            results[f"{name}: 30-minute history"] = await measure_async(
+                get_history, number=20, repeat=3
+            )
+        print_comparison(
+            "Query the 30-minute asset history",
+            results,
+            baseline="regular: 30-minute history",
+        )
+    finally:
+        await database.client.drop_database(database)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
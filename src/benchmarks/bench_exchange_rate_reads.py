@@ -0,0 +1,103 @@
+"""
+Benchmark of the ExchangeRate read path: the documents with the asset links fetched by `$lookup`
+against the full documents, the lean (time, value) projection and the raw projected cursor.
+Requires a running MongoDB instance at `MONGO_CONNECTION_URI`;
+the `<MONGO_INITDB_DATABASE>_bench` database is created and dropped.
+Usage: python -m benchmarks.bench_exchange_rate_reads [--points N]
+"""
+
+import argparse
+import asyncio
+from typing import Any, Dict, List
+
+from bson.dbref import DBRef
+
+from db.database import initialize_database
+from db.models.exchange_rate import Asset, ExchangeRate
+from settings import settings
+
+from benchmarks.utils import measure_async, print_comparison
+
+ASSET_COUNT = 5
+TIME_FROM = 1_700_000_000
+INSERT_BATCH_SIZE = 10_000
+# The queried ranges, seconds
+RANGES = {"30 minutes": 30 * 60, "1 day": 24 * 60 * 60}
+
+
+async def insert_points(points_number: int) -> int:
+    """
+    Insert the per-second points of all the assets
+    :returns int: the time of the latest point
+    """
+    collection = ExchangeRate.get_motor_collection()
+    snapshots_number = points_number // ASSET_COUNT
+    batch: List[Dict[str, Any]] = []
+    for time in range(TIME_FROM, TIME_FROM + snapshots_number):
+        for asset_id in range(1, ASSET_COUNT + 1):
+            batch.append({"asset": DBRef("asset", asset_id), "time": time, "value": 1.17})
+        if len(batch) >= INSERT_BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    return TIME_FROM + snapshots_number - 1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    settings.MONGO_DB_NAME = f"{settings.MONGO_DB_NAME}_bench"
+    database = await initialize_database()
+    try:
+        await Asset.insert_many(
+            [Asset(id=idx + 1, name=f"ASSET{idx + 1:04}") for idx in range(ASSET_COUNT)]
+        )
+        time_to = await insert_points(args.points)
+        print(f"Inserted {args.points:,} points")
+
+        for range_name, seconds in RANGES.items():
+            time_from = time_to - seconds + 1
+
+            async def fetch_links():
+                return await (
+                    ExchangeRate.find(
+                        ExchangeRate.asset.id == 1,
+                        ExchangeRate.time >= time_from,
+                        fetch_links=True,
+                    )
+                    .sort(+ExchangeRate.time)
+                    .to_list()
+                )
+
+            async def documents():
+                return await ExchangeRate.find_by_asset(1, time_from=time_from).to_list()
+
+            async def projection():
+                return await ExchangeRate.find_points(1, time_from=time_from).to_list()
+
+            async def cursor():
+                return await ExchangeRate.iter_points(
+                    1, time_from=time_from, batch_size=settings.HISTORY_QUERY_BATCH_SIZE
+                ).to_list(None)
+
+            results = {}
+            for name, query in (
+                ("fetch_links", fetch_links),
+                ("documents", documents),
+                ("projection", projection),
+                ("projected cursor", cursor),
+            ):
+                assert len(await query()) == seconds
+                results[name] = await measure_async(query, number=5, repeat=3)
+            print_comparison(
+                f"Read {range_name} of an asset points", results, baseline="fetch_links"
+            )
+    finally:
+        await database.client.drop_database(database)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Benchmark of saving an exchange rates snapshot:
+the per-document `find_one(...).upsert(...)` round trips against a single unordered bulk write.
+Requires a running MongoDB instance at `MONGO_CONNECTION_URI`;
+the `<MONGO_INITDB_DATABASE>_bench` database is created and dropped
+"""
+
+import asyncio
+import itertools
+from typing import List
+
+from beanie.operators import Set
+from pymongo.errors import DuplicateKeyError
+
+from db.database import initialize_database
+from db.models.exchange_rate import Asset, ExchangeRate
+from settings import settings
+
+from benchmarks.utils import measure_async, print_comparison
+
+ASSET_COUNTS = (5, 100, 500)
+ROUNDS = 20
+
+
+async def per_document_upserts(exchange_rates: List[ExchangeRate]) -> int:
+    """The former path: a separate upsert round trip per asset"""
+    records_saved_number = 0
+    for exchange_rate in exchange_rates:
+        try:
+            update_query = await ExchangeRate.find_one(
+                ExchangeRate.asset.id == exchange_rate.asset.id,  # type: ignore
+                ExchangeRate.time == exchange_rate.time,
+            ).upsert(
+                Set({}),
+                on_insert=ExchangeRate(
+                    asset=exchange_rate.asset, time=exchange_rate.time, value=exchange_rate.value
+                ),
+            )
+        except DuplicateKeyError:
+            continue
+        if isinstance(update_query, ExchangeRate):
+            records_saved_number += 1
+    return records_saved_number
+
+
+async def bulk_upserts(exchange_rates: List[ExchangeRate]) -> int:
+    """The single unordered bulk write of the upserts"""
+    result = await ExchangeRate.upsert_many(exchange_rates)
+    return result.upserted_count
+
+
+async def main():
+    settings.MONGO_DB_NAME = f"{settings.MONGO_DB_NAME}_bench"
+    database = await initialize_database()
+    try:
+        for asset_count in ASSET_COUNTS:
+            await database.drop_collection(ExchangeRate.Settings.name)
+            await database.drop_collection(Asset.Settings.name)
+            await initialize_database()
+            assets = [Asset(id=idx + 1, name=f"ASSET{idx + 1:04}") for idx in range(asset_count)]
+            await Asset.insert_many(assets)
+            timestamps = itertools.count(1_700_000_000)
+
+            def snapshot(time: int) -> List[ExchangeRate]:
+                return [ExchangeRate(asset=asset, time=time, value=1.17) for asset in assets]
+
+            results = {}
+            for name, save in (("per-document", per_document_upserts), ("bulk", bulk_upserts)):
+                # A new snapshot per call: all the records are inserted
+                results[f"{name}: insert"] = await measure_async(
+                    lambda: save(snapshot(next(timestamps))), number=ROUNDS, repeat=3
+                )
+                # The same snapshot on every call: all the records are matched
+                existing_snapshot = snapshot(next(timestamps))
+                await save(existing_snapshot)
+                results[f"{name}: match"] = await measure_async(
+                    lambda: save(existing_snapshot), number=ROUNDS, repeat=3
+                )
+            print_comparison(
+                f"Save a snapshot of {asset_count} assets",
+                results,
+                baseline="per-document: insert",
+            )
+    finally:
+        await database.client.drop_database(database)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Query plans regression suite: every DB query the application issues is explained
+against the seeded data and fails on a collection scan, an in-memory sort
+or, given the recorded baseline, on more keys or documents examined.
+Requires a running MongoDB instance at `MONGO_CONNECTION_URI`;
+the `<MONGO_INITDB_DATABASE>_bench` database is created and dropped.
+The regular `exchangeRate` layout is explained; unset `EXCHANGE_RATE_TIME_SERIES`.
+Usage: python -m benchmarks.bench_query_plans [--points N] [--output PATH] [--baseline PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from db.database import initialize_database
+from db.models.candle import Candle
+from db.models.exchange_rate import Asset, ExchangeRate
+from db.query_plans import compare_with_baseline, explain_query_plans, get_query_plan_cases
+from settings import settings
+
+from benchmarks.bench_exchange_rate_reads import ASSET_COUNT, TIME_FROM, insert_points
+
+CANDLE_BATCH_SIZE = 10_000
+
+
+async def insert_candles(time_to: int) -> None:
+    """Insert the 1-minute candles of all the assets up to the time"""
+    candles = []
+    for asset_id in range(1, ASSET_COUNT + 1):
+        asset = Asset(id=asset_id, name=f"ASSET{asset_id:04}")
+        for time in range(TIME_FROM, time_to + 1, 60):
+            candles.append(Candle.open_with(asset, "1m", time, 1.17))
+            if len(candles) >= CANDLE_BATCH_SIZE:
+                await Candle.merge_many(candles)
+                candles = []
+    await Candle.merge_many(candles)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=500_000)
+    parser.add_argument("--output", help="Path to record the results to as JSON")
+    parser.add_argument("--baseline", help="Path of the recorded results of the same --points")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+    if ExchangeRate.is_time_series():
+        print("The regular exchangeRate layout is explained; unset EXCHANGE_RATE_TIME_SERIES")
+        return 2
+
+    settings.MONGO_DB_NAME = f"{settings.MONGO_DB_NAME}_bench"
+    database = await initialize_database()
+    try:
+        await Asset.insert_many(
+            [Asset(id=idx + 1, name=f"ASSET{idx + 1:04}") for idx in range(ASSET_COUNT)]
+        )
+        time_to = await insert_points(args.points)
+        await insert_candles(time_to)
+        print(f"Inserted {args.points:,} points")
+
+        asset = await Asset.get(1)
+        results = await explain_query_plans(get_query_plan_cases(asset, TIME_FROM, time_to))  # type: ignore
+    finally:
+        await database.client.drop_database(database)
+
+    failures = []
+    print(f"  {'query':<32} {'keys':>9} {'docs':>9} {'returned':>9}  plan")
+    for result in results:
+        print(
+            f"  {result.name:<32} {result.keys_examined:>9} {result.docs_examined:>9} "
+            f"{result.returned:>9}  {' <- '.join(result.stages)} {result.indexes}"
+        )
+        failures.extend(f"{result.name}: {violation}" for violation in result.violations)
+
+    recorded = {result.name: result.to_dict() for result in results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"points": args.points, "queries": recorded}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["points"] != args.points:
+            print(f"The baseline is recorded with --points {baseline['points']}")
+            return 2
+        failures.extend(compare_with_baseline(results, baseline["queries"], args.tolerance))
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
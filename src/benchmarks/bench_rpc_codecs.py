@@ -0,0 +1,63 @@
+"""
+Microbenchmark of the RPC command decoding and the message encoding:
+the generic Starlette `receive_json` / `send_json` path against the RPC codecs
+"""
+
+import json
+
+from rpc.codecs import JSON_CODEC, StdlibJSONCodec
+from rpc.models import RPCCommandModel
+
+from benchmarks.utils import measure, print_comparison
+
+COMMAND_FRAME = '{"action": "subscribe", "message": {"assetId": 1}}'
+HISTORY_MESSAGE = {
+    "action": "asset_history",
+    "message": {
+        "points": [
+            {"assetName": "EURUSD", "assetId": 1, "time": 1455883484 + idx, "value": 1.110481}
+            for idx in range(1800)
+        ]
+    },
+}
+
+
+def generic_decode_command() -> RPCCommandModel:
+    """The generic path: `json.loads` and the model construction"""
+    return RPCCommandModel(**json.loads(COMMAND_FRAME))
+
+
+def generic_encode_history() -> str:
+    """The generic path: the model dump and `json.dumps`"""
+    rpc_command = RPCCommandModel(**HISTORY_MESSAGE)
+    return json.dumps(rpc_command.model_dump(), separators=(",", ":"), ensure_ascii=False)
+
+
+def main():
+    stdlib_codec = StdlibJSONCodec()
+    print_comparison(
+        "Decode a `subscribe` command",
+        {
+            "generic": measure(generic_decode_command, number=20000),
+            "codec: json": measure(lambda: stdlib_codec.decode_command(COMMAND_FRAME), 20000),
+            f"codec: {type(JSON_CODEC).__name__}": measure(
+                lambda: JSON_CODEC.decode_command(COMMAND_FRAME), number=20000
+            ),
+        },
+        baseline="generic",
+    )
+    print_comparison(
+        "Encode an `asset_history` message of 1800 points",
+        {
+            "generic": measure(generic_encode_history, number=50),
+            "codec: json": measure(lambda: stdlib_codec.encode(HISTORY_MESSAGE), number=50),
+            f"codec: {type(JSON_CODEC).__name__}": measure(
+                lambda: JSON_CODEC.encode(HISTORY_MESSAGE), number=50
+            ),
+        },
+        baseline="generic",
+    )
+
+
+if __name__ == "__main__":
+    main()
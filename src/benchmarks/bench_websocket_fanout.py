@@ -0,0 +1,376 @@
+"""
+Websocket load test of a single application worker: the server is started as a subprocess
+reading the live points from the tick relay, thousands of websocket clients run
+`assets` -> `subscribe`, and the ingestion stand-in saves and publishes the ticks at a fixed rate.
+Reports the connect throughput, the `asset_history` latency, the tick-to-delivery percentiles
+and the server CPU and RSS per 1k connections (read from `/proc`, Linux only).
+Requires a running MongoDB instance at `MONGO_CONNECTION_URI`;
+the `<MONGO_INITDB_DATABASE>_bench` database is created and dropped.
+Usage: python -m benchmarks.bench_websocket_fanout [--clients N] [--rate N] [--duration S]
+    [--output PATH] [--baseline PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import websockets
+from bson.dbref import DBRef
+
+from db.database import initialize_database
+from db.models.exchange_rate import Asset, ExchangeRate, ExchangeRatePoint
+from relay.publisher import TickRelayPublisher
+from relay.server import TickRelay
+from settings import settings
+
+from benchmarks.utils import get_percentiles
+
+QUANTILES = (0.5, 0.99, 0.999)
+# Interval between injecting the due ticks, seconds
+INJECT_INTERVAL_SECONDS = 0.01
+# Time to wait for the ticks in flight once the injection stops, seconds
+DRAIN_SECONDS = 2
+
+
+@dataclass
+class ProcessUsage:
+    """CPU time and resident memory of a process"""
+
+    cpu_seconds: float
+    rss_bytes: int
+
+    @classmethod
+    def read(cls, pid: int) -> "ProcessUsage":
+        """Read the usage of the process from `/proc`"""
+        with open(f"/proc/{pid}/stat") as file:
+            # The fields after the parenthesized command name; utime and stime are 14th and 15th
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as file:
+            resident_pages = int(file.read().split()[1])
+        return cls(
+            cpu_seconds=(int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+            rss_bytes=resident_pages * os.sysconf("SC_PAGE_SIZE"),
+        )
+
+
+@dataclass
+class LoadStats:
+    """Measurements of all the clients, seconds"""
+
+    connect_seconds: List[float] = field(default_factory=list)
+    history_seconds: List[float] = field(default_factory=list)
+    delivery_seconds: List[float] = field(default_factory=list)
+    failed: int = 0
+    disconnected: int = 0
+    # The number of the subscribed clients by asset ID
+    subscribers: Dict[int, int] = field(default_factory=dict)
+    # The injection time of every tick by (asset ID, time)
+    sent_at: Dict[Tuple[int, int], float] = field(default_factory=dict)
+
+
+async def insert_history(assets: List[Asset]) -> int:
+    """
+    Insert the per-second points of the history window ending now,
+    so every subscription gets the full `asset_history` like on a running deployment
+    :returns int: the time of the next point
+    """
+    time_to = int(time.time())
+    await ExchangeRate.get_motor_collection().insert_many(
+        [
+            {"asset": DBRef("asset", asset.id), "time": point_time, "value": 1.17}
+            for asset in assets
+            for point_time in range(time_to - settings.HISTORY_WINDOW_MINUTES * 60, time_to)
+        ]
+    )
+    return time_to
+
+
+class TickInjector:
+    """
+    Ingestion stand-in: saves the ticks of the assets at the fixed rate and publishes every batch
+    to the relay like the ingestion pipeline. The tick times are consecutive seconds per asset,
+    so the rate is not limited to a tick per second per asset
+    """
+
+    def __init__(
+        self, publisher: TickRelayPublisher, assets: List[Asset], stats: LoadStats, time_from: int
+    ):
+        """
+        :param TickRelayPublisher publisher: the publisher of the saved ticks
+        :param List[Asset] assets: the assets to inject the ticks of in turn
+        :param LoadStats stats: the stats to record the injection times to
+        :param int time_from: the time of the first tick of every asset
+        """
+        self._publisher = publisher
+        self._assets = assets
+        self._stats = stats
+        self._next_times = {asset.id: time_from for asset in assets}
+        self._next_times_from = dict(self._next_times)
+        self.injected = 0
+
+    @property
+    def expected_deliveries(self) -> int:
+        """The number of the points the subscribed clients should receive"""
+        return sum(
+            (next_time - self._next_times_from[asset_id]) * self._stats.subscribers.get(asset_id, 0)
+            for asset_id, next_time in self._next_times.items()
+        )
+
+    async def run(self, rate: float, duration_seconds: float) -> None:
+        """Inject `rate` ticks per second for the duration"""
+        collection = ExchangeRate.get_motor_collection()
+        started_at = time.perf_counter()
+        while (elapsed := time.perf_counter() - started_at) < duration_seconds:
+            due = int(elapsed * rate) + 1 - self.injected
+            if due > 0:
+                documents, exchange_rates = [], []
+                for idx in range(self.injected, self.injected + due):
+                    asset = self._assets[idx % len(self._assets)]
+                    asset_id: int = asset.id  # type: ignore
+                    point = ExchangeRatePoint.model_construct(
+                        time=self._next_times[asset_id], value=1 + idx % 1000 / 1e4
+                    )
+                    self._next_times[asset_id] += 1
+                    self._stats.sent_at[(asset_id, point.time)] = time.perf_counter()
+                    documents.append(
+                        {
+                            "asset": DBRef("asset", asset_id),
+                            "time": point.time,
+                            "value": point.value,
+                        }
+                    )
+                    exchange_rates.append(ExchangeRate.from_point(asset, point))
+                self.injected += due
+                # Saved before publishing like the ingestion pipeline, so the gaps are backfilled
+                await collection.insert_many(documents)
+                self._publisher.publish_exchange_rates(exchange_rates)
+            await asyncio.sleep(INJECT_INTERVAL_SECONDS)
+
+
+async def run_client(uri: str, asset_id: int, stats: LoadStats, subscribed: asyncio.Event) -> None:
+    """
+    Connect, request the assets and subscribe to the asset like a browser client,
+    then measure the delivery latency of the points until cancelled
+    """
+    started_at = time.perf_counter()
+    try:
+        websocket = await websockets.connect(uri, open_timeout=60, max_size=None, compression=None)
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+        stats.failed += 1
+        subscribed.set()
+        return
+    stats.connect_seconds.append(time.perf_counter() - started_at)
+    try:
+        await websocket.send(json.dumps({"action": "assets", "message": {}}))
+        await websocket.recv()
+
+        started_at = time.perf_counter()
+        await websocket.send(json.dumps({"action": "subscribe", "message": {"assetId": asset_id}}))
+        while (frame := json.loads(await websocket.recv()))["action"] != "asset_history":
+            if "errors" in frame["message"]:
+                raise RuntimeError(f"Could not subscribe: {frame['message']['errors']}")
+        stats.history_seconds.append(time.perf_counter() - started_at)
+        stats.subscribers[asset_id] = stats.subscribers.get(asset_id, 0) + 1
+        subscribed.set()
+
+        async for data in websocket:
+            received_at = time.perf_counter()
+            frame = json.loads(data)
+            if frame["action"] != "point":
+                continue
+            message = frame["message"]
+            sent_at = stats.sent_at.get((message["assetId"], message["time"]))
+            if sent_at is not None:
+                stats.delivery_seconds.append(received_at - sent_at)
+    except websockets.ConnectionClosed:
+        stats.disconnected += 1
+    except RuntimeError:
+        stats.failed += 1
+    finally:
+        subscribed.set()
+        await websocket.close()
+
+
+async def wait_for_server(uri: str, server: subprocess.Popen, timeout_seconds: float = 60) -> None:
+    """
+    Wait for the server to accept the connections
+    :raises RuntimeError: the server has exited or has not started in time
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server has exited with the code {server.returncode}")
+        try:
+            async with websockets.connect(uri):
+                return
+        except (OSError, websockets.WebSocketException):
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"The server has not started in {timeout_seconds} seconds")
+
+
+def get_milliseconds_percentiles(seconds: List[float]) -> Dict[str, float | None]:
+    """Get the percentiles of the durations in milliseconds, e.g., `{"p99_ms": ...}`"""
+    return {
+        f"{name}_ms": value * 1e3 if value is not None else None
+        for name, value in get_percentiles(seconds, QUANTILES).items()
+    }
+
+
+def raise_open_files_limit() -> int:
+    """Raise the open files limit of the clients process to the hard one"""
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+    return hard_limit
+
+
+def print_results(results: Dict[str, Any], baseline: Dict[str, Any] | None = None) -> None:
+    """Print the results and their change relative to the baseline ones"""
+    for section in ("connect", "asset_history", "delivery", "server", "clients"):
+        print(section)
+        for key, value in results[section].items():
+            recorded = baseline.get(section, {}).get(key) if baseline else None
+            change = ""
+            if isinstance(value, (int, float)) and isinstance(recorded, (int, float)) and recorded:
+                change = f"  {(value - recorded) / recorded:+.1%}"
+            if isinstance(value, float):
+                value = f"{value:.2f}"
+            print(f"  {key:<28} {value if value is not None else '-':>14}{change}")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=50, help="Ticks per second of all the assets")
+    parser.add_argument("--duration", type=float, default=30, help="Injection time, seconds")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Path to record the results to as JSON")
+    parser.add_argument("--baseline", help="Path of the recorded results to compare with")
+    args = parser.parse_args()
+    open_files_limit = raise_open_files_limit()
+    if open_files_limit < args.clients + 100:
+        print(f"The open files limit {open_files_limit} is too low for {args.clients} clients")
+        return 2
+
+    settings.MONGO_DB_NAME = f"{settings.MONGO_DB_NAME}_bench"
+    database = await initialize_database()
+    await Asset.initialize_assets(raise_exception=False)
+    assets = await Asset.find_assets_from_settings().to_list()
+    time_from = await insert_history(assets)
+    uri = f"ws://127.0.0.1:{args.port}/"
+    with tempfile.TemporaryDirectory() as directory:
+        relay_address = f"unix://{directory}/relay.sock"
+        relay_task = asyncio.create_task(TickRelay().run(relay_address))
+        publisher = TickRelayPublisher(relay_address, queue_size=1024)
+        publisher_task = asyncio.create_task(publisher.run())
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1"]
+            + ["--port", str(args.port), "--log-level", "warning", "--no-access-log"],
+            env={
+                **os.environ,
+                "MONGO_INITDB_DATABASE": settings.MONGO_DB_NAME,
+                "EXCHANGE_RATE_SOURCE": "relay",
+                "TICK_RELAY_ADDRESS": relay_address,
+            },
+        )
+        stats = LoadStats()
+        clients: List[asyncio.Task] = []
+        try:
+            await wait_for_server(uri, server)
+            idle_usage = ProcessUsage.read(server.pid)
+
+            # Connect and subscribe the clients spreading them over the assets
+            semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+            async def start_client(idx: int) -> None:
+                subscribed = asyncio.Event()
+                async with semaphore:
+                    asset_id: int = assets[idx % len(assets)].id  # type: ignore
+                    clients.append(
+                        asyncio.create_task(run_client(uri, asset_id, stats, subscribed))
+                    )
+                    await subscribed.wait()
+
+            started_at = time.perf_counter()
+            await asyncio.gather(*(start_client(idx) for idx in range(args.clients)))
+            connect_elapsed = time.perf_counter() - started_at
+            connected_usage = ProcessUsage.read(server.pid)
+            print(f"Connected {len(stats.connect_seconds)} clients in {connect_elapsed:.2f}s")
+
+            # Inject the ticks
+            injector = TickInjector(publisher, assets, stats, time_from)
+            client_cpu_started = time.process_time()
+            started_at = time.perf_counter()
+            await injector.run(args.rate, args.duration)
+            await asyncio.sleep(DRAIN_SECONDS)
+            inject_elapsed = time.perf_counter() - started_at
+            client_cpu_seconds = time.process_time() - client_cpu_started
+            injected_usage = ProcessUsage.read(server.pid)
+        finally:
+            for task in clients:
+                task.cancel()
+            await asyncio.gather(*clients, return_exceptions=True)
+            server.terminate()
+            server.wait()
+            publisher_task.cancel()
+            relay_task.cancel()
+            await asyncio.gather(publisher_task, relay_task, return_exceptions=True)
+            await database.client.drop_database(database)
+
+    connections = len(stats.connect_seconds)
+    per_1k = 1000 / connections if connections else 0
+    server_cpu_share = (injected_usage.cpu_seconds - connected_usage.cpu_seconds) / inject_elapsed
+    results = {
+        "parameters": {
+            "clients": args.clients,
+            "rate": args.rate,
+            "duration": args.duration,
+            "connect_concurrency": args.connect_concurrency,
+            "assets": len(assets),
+            "send_queue_policy": settings.WS_SEND_QUEUE_POLICY,
+        },
+        "connect": {
+            "connections": connections,
+            "failed": stats.failed,
+            "per_second": connections / connect_elapsed,
+            **get_milliseconds_percentiles(stats.connect_seconds),
+        },
+        "asset_history": get_milliseconds_percentiles(stats.history_seconds),
+        "delivery": {
+            "ticks": injector.injected,
+            "expected": injector.expected_deliveries,
+            "delivered": len(stats.delivery_seconds),
+            "disconnected": stats.disconnected,
+            **get_milliseconds_percentiles(stats.delivery_seconds),
+        },
+        "server": {
+            "rss_mb_per_1k": (connected_usage.rss_bytes - idle_usage.rss_bytes) / 2**20 * per_1k,
+            "cpu_percent_per_1k": server_cpu_share * 100 * per_1k,
+            "cpu_percent": server_cpu_share * 100,
+            "rss_mb": injected_usage.rss_bytes / 2**20,
+        },
+        # The clients share a single process: the results are bound by it near 100%
+        "clients": {"cpu_percent": client_cpu_seconds / inject_elapsed * 100},
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
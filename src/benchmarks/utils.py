@@ -0,0 +1,59 @@
+"""
+Benchmark utils
+"""
+
+import math
+import time
+import timeit
+from typing import Awaitable, Callable, Dict, Iterable, Sequence
+
+
+def measure(function: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """
+    Measure the best time per call of the function
+    :returns float: seconds per call
+    """
+    timer = timeit.Timer(function)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+async def measure_async(
+    function: Callable[[], Awaitable[object]], number: int, repeat: int = 5
+) -> float:
+    """
+    Measure the best time per call of the async function
+    :returns float: seconds per call
+    """
+    results = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            await function()
+        results.append(time.perf_counter() - started_at)
+    return min(results) / number
+
+
+def print_comparison(title: str, results: Dict[str, float], baseline: str) -> None:
+    """Print the results per call relative to the baseline one"""
+    print(title)
+    baseline_result = results[baseline]
+    for name, result in results.items():
+        speedup = baseline_result / result
+        print(f"  {name:<32} {result * 1e6:>10.2f} us/call  x{speedup:.2f}")
+
+
+def get_percentiles(values: Sequence[float], quantiles: Iterable[float]) -> Dict[str, float | None]:
+    """
+    Get the nearest-rank percentiles of the values, e.g., `{"p99": ...}` of the quantile 0.99
+    :returns Dict[str, float | None]: None per quantile if there are no values
+    """
+    sorted_values = sorted(values)
+    percentiles: Dict[str, float | None] = {}
+    for quantile in quantiles:
+        name = f"p{quantile * 100:g}".replace(".", "")
+        if not sorted_values:
+            percentiles[name] = None
+            continue
+        rank = min(len(sorted_values) - 1, max(0, math.ceil(quantile * len(sorted_values)) - 1))
+        percentiles[name] = sorted_values[rank]
+    return percentiles
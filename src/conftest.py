@@ -20,7 +20,7 @@ from settings.settings import Settings
 def test_settings():
     settings_mock = Mock(spec=Settings)
     settings_instance = Settings()  # type: ignore
-    for field in settings_instance.model_fields_set:
+    for field in settings_instance.model_fields:
         value = getattr(settings_instance, field)
         setattr(settings_mock, field, value)
     settings_mock.MONGO_DB_NAME = f"{settings_instance.MONGO_DB_NAME}_test"
@@ -35,9 +35,13 @@ async def db():
     """Use db"""
     from db.database import initialize_database
 
+    from exchange_rate.registry import asset_registry
+
     db = await initialize_database(multiprocessing_mode=True)
     yield db
     await db.client.drop_database(db)
+    # The cached assets are dropped with the DB
+    asset_registry.clear()
 
 
 @pytest_asyncio.fixture()
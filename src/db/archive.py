@@ -0,0 +1,220 @@
+"""
+Compact on-disk archives of the exchange rates expired from the DB:
+a file per asset and UTC day holding the fixed-width time and value columns
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple
+
+from settings import settings
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The archive file header: the format magic and the number of the points
+ARCHIVE_HEADER = struct.Struct("<4sI")
+ARCHIVE_MAGIC = b"ERA1"
+ARCHIVE_SUFFIX = ".rates"
+
+# The columns are stored little-endian and mapped as is on the little-endian platforms
+_NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def get_day_start(time: int) -> int:
+    """Get the start timestamp of the UTC day containing the time"""
+    return time - time % SECONDS_PER_DAY
+
+
+class ArchiveDay:
+    """
+    Memory-mapped archive of the asset points of a single UTC day: the header is followed by
+    the int64 times column and the float64 values column sorted by time,
+    so a time range is found by a binary search and read without parsing
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param Path path: the archive file path
+        :raises ValueError: the file is not an exchange rates archive
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = ARCHIVE_HEADER.unpack_from(self._mmap)
+        if magic != ARCHIVE_MAGIC or len(self._mmap) != ARCHIVE_HEADER.size + count * 16:
+            self._mmap.close()
+            raise ValueError(f"Invalid exchange rates archive: {path}")
+        self._count = count
+        times_offset = ARCHIVE_HEADER.size
+        values_offset = times_offset + count * 8
+        self.times: Sequence[int]
+        self.values: Sequence[float]
+        if _NATIVE_LITTLE_ENDIAN:
+            buffer = memoryview(self._mmap)
+            self.times = buffer[times_offset:values_offset].cast("q")
+            self.values = buffer[values_offset:].cast("d")
+            buffer.release()
+        else:
+            self.times = _read_column("q", self._mmap[times_offset:values_offset])
+            self.values = _read_column("d", self._mmap[values_offset:])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "ArchiveDay":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def read(
+        self, time_from: int | None = None, time_to: int | None = None, limit: int = 0
+    ) -> Tuple[List[int], List[float]]:
+        """
+        Read the points of the time range
+        :param int | None time_from: the minimum point time
+        :param int | None time_to: the maximum point time
+        :param int limit: the maximum number of the points; unlimited if 0
+        :returns Tuple[List[int], List[float]]: the point times and values
+        """
+        start = 0 if time_from is None else bisect_left(self.times, time_from)
+        end = self._count if time_to is None else bisect_right(self.times, time_to)
+        if limit:
+            end = min(end, start + limit)
+        if start >= end:
+            return [], []
+        return list(self.times[start:end]), list(self.values[start:end])
+
+    def close(self) -> None:
+        """Release the columns and unmap the file"""
+        if isinstance(self.times, memoryview):
+            self.times.release()
+            self.values.release()  # type: ignore
+        self._mmap.close()
+
+
+class ExchangeRateArchive:
+    """
+    Archive of the exchange rates: `<directory>/<asset ID>/<YYYY-MM-DD>.rates` files
+    of the asset points of the UTC day. The files are replaced atomically
+    """
+
+    def __init__(self, directory: str | Path | None = None):
+        """
+        :param str | Path | None directory: the archive root directory;
+            `EXCHANGE_RATE_ARCHIVE_DIR` by default
+        """
+        self._directory = directory
+
+    @property
+    def directory(self) -> Path:
+        """The archive root directory"""
+        return Path(self._directory or settings.EXCHANGE_RATE_ARCHIVE_DIR)
+
+    def get_path(self, asset_id: int, day_start: int) -> Path:
+        """Get the archive file path of the asset day"""
+        day = datetime.fromtimestamp(day_start, UTC).strftime("%Y-%m-%d")
+        return self.directory / str(asset_id) / f"{day}{ARCHIVE_SUFFIX}"
+
+    def get_days(self, asset_id: int) -> List[int]:
+        """Get the start timestamps of the archived asset days in the ascending order"""
+        asset_directory = self.directory / str(asset_id)
+        if not asset_directory.is_dir():
+            return []
+        days = []
+        for path in asset_directory.glob(f"*{ARCHIVE_SUFFIX}"):
+            day = datetime.strptime(path.stem, "%Y-%m-%d").replace(tzinfo=UTC)
+            days.append(int(day.timestamp()))
+        return sorted(days)
+
+    def open_day(self, asset_id: int, day_start: int) -> ArchiveDay | None:
+        """Map the archive of the asset day; None if the day is not archived"""
+        path = self.get_path(asset_id, day_start)
+        if not path.exists():
+            return None
+        return ArchiveDay(path)
+
+    def write_day(
+        self, asset_id: int, day_start: int, times: Sequence[int], values: Sequence[float]
+    ) -> int:
+        """
+        Write the asset points of the day merging them into the existing archive:
+        the points of the archived times are skipped, so writing the same day again is harmless
+        :param int asset_id: ID of the asset
+        :param int day_start: the start timestamp of the UTC day
+        :param Sequence[int] times: the point times of the day
+        :param Sequence[float] values: the point values
+        :returns int: the number of the archived points of the day
+        """
+        points = dict(zip(times, values))
+        archive_day = self.open_day(asset_id, day_start)
+        if archive_day is not None:
+            with archive_day:
+                points.update(zip(*archive_day.read()))
+        if not points:
+            return 0
+        if min(points) < day_start or max(points) >= day_start + SECONDS_PER_DAY:
+            raise ValueError(f"The points are out of the day starting at {day_start}")
+
+        sorted_times = array("q", sorted(points))
+        sorted_values = array("d", (points[time] for time in sorted_times))
+        if not _NATIVE_LITTLE_ENDIAN:
+            sorted_times.byteswap()
+            sorted_values.byteswap()
+        path = self.get_path(asset_id, day_start)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as file:
+            file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, len(sorted_times)))
+            file.write(sorted_times.tobytes())
+            file.write(sorted_values.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+        return len(sorted_times)
+
+    def iter_points(
+        self, asset_id: int, time_from: int, time_to: int | None = None, limit: int = 0
+    ) -> Iterator[Tuple[List[int], List[float]]]:
+        """
+        Iterate the archived asset points of the time range in the ascending time order
+        :param int asset_id: ID of the asset
+        :param int time_from: the minimum point time
+        :param int | None time_to: the maximum point time
+        :param int limit: the maximum number of the points; unlimited if 0
+        :returns Iterator[Tuple[List[int], List[float]]]: the point times and values per day
+        """
+        remaining = limit
+        for day_start in self.get_days(asset_id):
+            if day_start + SECONDS_PER_DAY <= time_from:
+                continue
+            if time_to is not None and day_start > time_to:
+                return
+            archive_day = self.open_day(asset_id, day_start)
+            if archive_day is None:
+                continue
+            with archive_day:
+                times, values = archive_day.read(time_from, time_to, limit=remaining)
+            if not times:
+                continue
+            yield times, values
+            if limit:
+                remaining -= len(times)
+                if remaining <= 0:
+                    return
+
+
+def _read_column(typecode: str, data: bytes) -> array:
+    """Read the little-endian column on a big-endian platform"""
+    column = array(typecode, data)
+    column.byteswap()
+    return column
+
+
+exchange_rate_archive = ExchangeRateArchive()
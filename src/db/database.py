@@ -7,6 +7,7 @@ from beanie.odm.utils.init import Initializer
 from loguru import logger as _LOG
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
+from db.models.candle import Candle
 from db.models.exchange_rate import Asset, ExchangeRate
 from settings import settings
 
@@ -38,7 +39,7 @@ async def initialize_database(
 
     init_kwargs = dict(
         database=database,
-        document_models=[Asset, ExchangeRate],
+        document_models=[Asset, ExchangeRate, Candle],
         multiprocessing_mode=multiprocessing_mode,
     )
 
@@ -0,0 +1,3 @@
+"""
+The one-off database migrations run as modules, e.g., `python -m db.migrations.<name>`
+"""
@@ -0,0 +1,95 @@
+"""
+Migrate the `exchangeRate` collection into a time-series collection:
+    the records are copied in batches into a new time-series collection with the `date` field set;
+    the old collection is renamed to `exchangeRate_legacy` and the new one to `exchangeRate`.
+Stop the ingestion before running; set `EXCHANGE_RATE_TIME_SERIES=true` afterwards.
+Usage: python -m db.migrations.exchange_rate_time_series [--batch-size N] [--drop-legacy]
+"""
+
+import argparse
+import asyncio
+from datetime import UTC, datetime
+
+from loguru import logger as _LOG
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import InsertOne
+
+from db.database import get_database
+from db.models.exchange_rate import (
+    EXCHANGE_RATE_TIME_SERIES_CONFIG,
+    EXCHANGE_RATE_TIME_SERIES_INDEXES,
+    ExchangeRate,
+)
+
+COLLECTION_NAME = ExchangeRate.Settings.name
+TIME_SERIES_COLLECTION_NAME = f"{COLLECTION_NAME}_timeseries"
+LEGACY_COLLECTION_NAME = f"{COLLECTION_NAME}_legacy"
+
+
+async def is_time_series(database: AsyncIOMotorDatabase, name: str) -> bool | None:
+    """
+    Check whether the collection is a time-series one
+    :returns bool | None: None if the collection does not exist
+    """
+    async for collection_info in await database.list_collections(filter={"name": name}):
+        return collection_info["type"] == "timeseries"
+    return None
+
+
+async def migrate(database: AsyncIOMotorDatabase, batch_size: int, drop_legacy: bool) -> None:
+    """
+    Copy the records into a new time-series collection and swap the collections
+    :param AsyncIOMotorDatabase database: the database
+    :param int batch_size: the number of the records copied at once
+    :param bool drop_legacy: drop the old collection once migrated
+    """
+    collection_type = await is_time_series(database, COLLECTION_NAME)
+    if collection_type is None:
+        _LOG.info(f"There is no {COLLECTION_NAME} collection to migrate")
+        return
+    if collection_type:
+        _LOG.info(f"The {COLLECTION_NAME} collection is a time-series one already")
+        return
+
+    # A partial copy of the interrupted run is started over
+    await database.drop_collection(TIME_SERIES_COLLECTION_NAME)
+    await database.create_collection(
+        **EXCHANGE_RATE_TIME_SERIES_CONFIG.build_query(TIME_SERIES_COLLECTION_NAME)
+    )
+    source = database[COLLECTION_NAME]
+    target = database[TIME_SERIES_COLLECTION_NAME]
+
+    copied_number = 0
+    operations = []
+    async for record in source.find({}, projection={"_id": 0}, batch_size=batch_size):
+        record["date"] = datetime.fromtimestamp(record["time"], UTC)
+        operations.append(InsertOne(record))
+        if len(operations) >= batch_size:
+            await target.bulk_write(operations, ordered=False)
+            copied_number += len(operations)
+            operations = []
+            _LOG.info(f"Copied {copied_number} records")
+    if operations:
+        await target.bulk_write(operations, ordered=False)
+        copied_number += len(operations)
+    await target.create_indexes(EXCHANGE_RATE_TIME_SERIES_INDEXES)
+    _LOG.info(f"Copied {copied_number} records into {TIME_SERIES_COLLECTION_NAME}")
+
+    await source.rename(LEGACY_COLLECTION_NAME, dropTarget=True)
+    await target.rename(COLLECTION_NAME)
+    _LOG.info(f"Renamed {COLLECTION_NAME} to {LEGACY_COLLECTION_NAME}")
+    if drop_legacy:
+        await database.drop_collection(LEGACY_COLLECTION_NAME)
+        _LOG.info(f"Dropped {LEGACY_COLLECTION_NAME}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--drop-legacy", action="store_true")
+    args = parser.parse_args()
+    await migrate(get_database(), batch_size=args.batch_size, drop_legacy=args.drop_legacy)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
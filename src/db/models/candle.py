@@ -0,0 +1,198 @@
+"""
+The exchange rate OHLC candle rollup models
+"""
+
+from typing import Any, Dict, List, Literal
+
+import pymongo
+from beanie import Document, Link
+from beanie.odm.queries.find import FindMany
+from bson.dbref import DBRef
+from pydantic import Field
+from pymongo import UpdateOne
+from pymongo.results import BulkWriteResult
+
+from db.models.exchange_rate import Asset
+
+# The candle intervals, seconds
+CANDLE_INTERVALS: Dict[str, int] = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+CandleInterval = Literal["1m", "5m", "1h", "1d"]
+
+
+def get_candle_time(time: int, interval: str) -> int:
+    """Get the open time of the interval candle containing the time"""
+    return time - time % CANDLE_INTERVALS[interval]
+
+
+class Candle(Document):
+    """
+    OHLC candle of the asset exchange rates within the interval.
+    The candles are maintained incrementally: the updates of the same candle are merged
+    """
+
+    asset: Link[Asset] = Field(description="Asset corresponding with the pair")
+    interval: str = Field(description="Candle interval, e.g., `1m`")
+    time: int = Field(description="Candle open timestamp")
+    open: float = Field(description="The first exchange rate value")
+    high: float = Field(description="The highest exchange rate value")
+    low: float = Field(description="The lowest exchange rate value")
+    close: float = Field(description="The latest exchange rate value")
+    last_time: int = Field(description="Time of the latest exchange rate")
+    ticks: int = Field(default=1, description="Number of the exchange rates")
+
+    @classmethod
+    def open_with(cls, asset: Asset, interval: str, time: int, value: float) -> "Candle":
+        """Create the interval candle of the first exchange rate"""
+        return cls.model_construct(
+            asset=asset,
+            interval=interval,
+            time=get_candle_time(time, interval),
+            open=value,
+            high=value,
+            low=value,
+            close=value,
+            last_time=time,
+            ticks=1,
+        )
+
+    def add(self, time: int, value: float) -> bool:
+        """
+        Add the later exchange rate of the candle interval
+        :returns bool: whether the exchange rate has been added; the earlier ones are skipped
+        """
+        if time <= self.last_time:
+            return False
+        if value > self.high:
+            self.high = value
+        elif value < self.low:
+            self.low = value
+        self.close = value
+        self.last_time = time
+        self.ticks += 1
+        return True
+
+    def to_dict(self) -> Dict[str, float | int]:
+        """Get the candle values of the RPC messages"""
+        return {
+            "time": self.time,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "ticks": self.ticks,
+        }
+
+    @classmethod
+    def find_range_query(
+        cls,
+        asset_id: int,
+        interval: str,
+        time_from: int | None = None,
+        time_to: int | None = None,
+        latest: bool = False,
+    ) -> FindMany["Candle"]:
+        """
+        Find the asset interval candles of the range sorted by time:
+        the latest first if `latest` is set or time_from is None, the earliest first otherwise
+        :param int asset_id: ID of the asset
+        :param str interval: the candle interval
+        :param int | None time_from: the minimum candle open time
+        :param int | None time_to: the maximum candle open time
+        :param bool latest: sort the latest candles first
+        """
+        # Match the whole asset DBRef to use the unique index
+        asset_ref = DBRef(Asset.Settings.name, asset_id)
+        query = cls.find({"asset": asset_ref}, cls.interval == interval)
+        if time_from is not None:
+            query = query.find(cls.time >= time_from)
+        if time_to is not None:
+            query = query.find(cls.time <= time_to)
+        if time_from is not None and not latest:
+            return query.sort(+cls.time)  # type: ignore
+        return query.sort(-cls.time)  # type: ignore
+
+    @classmethod
+    async def find_range(
+        cls,
+        asset_id: int,
+        interval: str,
+        time_from: int | None = None,
+        time_to: int | None = None,
+        limit: int = 500,
+        latest: bool = False,
+    ) -> List["Candle"]:
+        """
+        Find the asset interval candles in the ascending time order
+        :param int asset_id: ID of the asset
+        :param str interval: the candle interval
+        :param int | None time_from: the minimum candle open time
+        :param int | None time_to: the maximum candle open time
+        :param int limit: the maximum number of the candles
+        :param bool latest: find the latest candles of the range; the earliest ones by default.
+            The latest ones are found if time_from is None
+        """
+        candles = (
+            await cls.find_range_query(
+                asset_id, interval, time_from=time_from, time_to=time_to, latest=latest
+            )
+            .limit(limit)
+            .to_list()
+        )
+        if time_from is None or latest:
+            candles.reverse()
+        return candles
+
+    @classmethod
+    async def merge_many(cls, candles: List["Candle"]) -> BulkWriteResult | None:
+        """
+        Merge the partial candles into the stored ones in a single unordered bulk write:
+        the open value is kept, the high and low are extended,
+        the close is replaced and the ticks are summed
+        :param List[Candle] candles: the candles of the exchange rates added since the last merge
+        :raises BulkWriteError: some of the candles have failed to merge, the other ones are merged;
+            the `index` of a write error is the index of the failed candle
+        """
+        operations = []
+        for candle in candles:
+            operations.append(
+                UpdateOne(
+                    candle.get_key_filter(),
+                    {
+                        "$setOnInsert": {"open": candle.open},
+                        "$max": {"high": candle.high, "last_time": candle.last_time},
+                        "$min": {"low": candle.low},
+                        "$set": {"close": candle.close},
+                        "$inc": {"ticks": candle.ticks},
+                    },
+                    upsert=True,
+                )
+            )
+        if not operations:
+            return None
+        return await cls.get_motor_collection().bulk_write(operations, ordered=False)
+
+    def get_key_filter(self) -> Dict[str, Any]:
+        """Get the filter matching the candle by its unique (asset, interval, time) key"""
+        asset_ref = self.asset.to_ref() if isinstance(self.asset, Asset) else self.asset.ref
+        return {"asset": asset_ref, "interval": self.interval, "time": self.time}
+
+    class Settings:
+        """Collection settings"""
+
+        name = "candle"
+        indexes = [
+            pymongo.IndexModel(
+                [
+                    ("asset", pymongo.ASCENDING),
+                    ("interval", pymongo.ASCENDING),
+                    ("time", pymongo.ASCENDING),
+                ],
+                name="assetWithIntervalAndTime",
+                unique=True,
+            ),
+        ]
@@ -2,21 +2,45 @@
 The exchange rate domain models
 """
 
-from datetime import datetime
-from typing import Annotated
+from datetime import UTC, datetime
+from typing import Annotated, Any, Dict, List
 
 import pymongo
-from beanie import Document, Indexed, Insert, Link, Replace, before_event
+from beanie import (
+    Document,
+    Granularity,
+    Indexed,
+    Insert,
+    Link,
+    Replace,
+    TimeSeriesConfig,
+    before_event,
+)
 from beanie.odm.queries.find import FindMany
 from beanie.operators import In
-from pydantic import Field, NaiveDatetime
+from bson.dbref import DBRef
+from motor.motor_asyncio import AsyncIOMotorCursor
+from pydantic import BaseModel, Field, NaiveDatetime
+from pymongo import InsertOne, UpdateOne
 from pymongo.errors import BulkWriteError
-from pymongo.results import InsertManyResult
+from pymongo.results import BulkWriteResult, InsertManyResult
 
 from db.models.exceptions import AlreadyPopulatedException
 from settings import settings
 
 
+# The unique index violation code
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+# The `exchangeRate` time-series collection options: the records are grouped into compressed
+# buckets per asset; the time field must be a BSON date, so the `date` copy of `time` is stored
+EXCHANGE_RATE_TIME_SERIES_CONFIG = TimeSeriesConfig(
+    time_field="date",
+    meta_field="asset",
+    granularity=Granularity.seconds,
+)
+
+
 class Asset(Document):
     """
     Asset model.
@@ -52,8 +76,10 @@ class Asset(Document):
 
     @staticmethod
     def find_assets_from_settings() -> FindMany:
-        """Find assets from the asset list in settings"""
-        return Asset.find(In(Asset.name, settings.ASSET_LIST)).sort(+Asset.id)  # type: ignore
+        """Find assets from the asset list in settings in the ID order"""
+        # Walk the `_id` index to get the assets in order instead of sorting the matched ones
+        query = Asset.find(In(Asset.name, settings.ASSET_LIST), hint=[("_id", pymongo.ASCENDING)])
+        return query.sort(+Asset.id)  # type: ignore
 
     class Settings:
         """Collection settings"""
@@ -61,12 +87,61 @@ class Asset(Document):
         name = "asset"
 
 
+class ExchangeRatePoint(BaseModel):
+    """
+    Lean projection of the ExchangeRate record: the time and the value only.
+    The asset is known to the reader, so the link is neither fetched nor validated
+    """
+
+    time: int = Field(description="Exact creation timestamp")
+    value: float = Field(description="Average rate")
+
+    class Settings:
+        """Projection settings"""
+
+        projection = {"_id": 0, "time": 1, "value": 1}
+
+
+# The secondary indexes of the regular `exchangeRate` collection layout
+EXCHANGE_RATE_INDEXES = [
+    pymongo.IndexModel(
+        [
+            ("asset", pymongo.ASCENDING),
+            ("time", pymongo.ASCENDING),
+        ],
+        name="assetIdWithTime",
+        unique=True,
+    ),
+    pymongo.IndexModel(
+        [
+            ("time", pymongo.DESCENDING),
+        ],
+        name="time",
+    ),
+]
+
+# The time-series collection indexes: the unique ones are not supported
+EXCHANGE_RATE_TIME_SERIES_INDEXES = [
+    pymongo.IndexModel(
+        [
+            ("asset", pymongo.ASCENDING),
+            ("date", pymongo.ASCENDING),
+        ],
+        name="assetWithDate",
+    ),
+]
+
+
 class ExchangeRate(Document):
     """Exchange rate Mongo model"""
 
     asset: Link[Asset] = Field(description="Asset corresponding with the pair")
     time: int = Field(description="Exact creation timestamp")
     value: float = Field(description="Average rate")
+    date: datetime | None = Field(
+        default=None,
+        description="The `time` date; stored with the time-series collection layout only",
+    )
 
     @before_event(Insert, Replace)
     def validate_time(self):
@@ -78,30 +153,198 @@ class ExchangeRate(Document):
             )
         if isinstance(self.time, datetime):
             self.time = int(self.time.timestamp())
+        if self.is_time_series():
+            self.date = datetime.fromtimestamp(self.time, UTC)
+
+    @classmethod
+    def is_time_series(cls) -> bool:
+        """Whether the collection is configured as a time-series one"""
+        return cls.get_settings().timeseries is not None
+
+    @classmethod
+    def find_by_asset(
+        cls,
+        asset_id: int,
+        time_from: int | None = None,
+        latest_first: bool = False,
+        time_to: int | None = None,
+    ) -> FindMany:
+        """
+        Find the asset records sorted by time.
+        With the time-series layout, the records are filtered and sorted by `date`
+        to read the matching buckets only
+        :param int asset_id: ID of the asset
+        :param int | None time_from: the minimum record time
+        :param bool latest_first: sort the latest records first
+        :param int | None time_to: the maximum record time
+        """
+        time_series = cls.is_time_series()
+        # Match the whole asset DBRef to use the (asset, time) index
+        query = cls.find({"asset": DBRef(Asset.Settings.name, asset_id)})
+        if time_from is not None:
+            query = query.find(cls.time >= time_from)
+            if time_series:
+                query = query.find(cls.date >= datetime.fromtimestamp(time_from, UTC))
+        if time_to is not None:
+            query = query.find(cls.time <= time_to)
+            if time_series:
+                query = query.find(cls.date <= datetime.fromtimestamp(time_to, UTC))
+        sort_field = cls.date if time_series else cls.time
+        return query.sort(-sort_field if latest_first else +sort_field)  # type: ignore
+
+    @classmethod
+    def find_points(
+        cls, asset_id: int, time_from: int | None = None, latest_first: bool = False
+    ) -> FindMany[ExchangeRatePoint]:
+        """
+        Find the asset (time, value) points sorted by time
+        :param int asset_id: ID of the asset
+        :param int | None time_from: the minimum point time
+        :param bool latest_first: sort the latest points first
+        """
+        return cls.find_by_asset(asset_id, time_from=time_from, latest_first=latest_first).project(
+            ExchangeRatePoint
+        )
+
+    @classmethod
+    def from_point(cls, asset: Asset, point: ExchangeRatePoint) -> "ExchangeRate":
+        """Create the ExchangeRate record of the asset point without validation"""
+        return cls.model_construct(asset=asset, time=point.time, value=point.value)
+
+    @classmethod
+    def iter_points(
+        cls,
+        asset_id: int,
+        time_from: int,
+        time_to: int | None = None,
+        limit: int = 0,
+        batch_size: int = 1000,
+    ) -> AsyncIOMotorCursor:
+        """
+        Iterate the asset (time, value) pairs in the ascending time order with a server-side cursor:
+        the documents are projected and fetched `batch_size` per round trip, not all at once
+        :param int asset_id: ID of the asset
+        :param int time_from: the minimum record time
+        :param int | None time_to: the maximum record time
+        :param int limit: the maximum number of the records; unlimited if 0
+        :param int batch_size: the number of the records fetched per round trip
+        """
+        query = cls.find_by_asset(asset_id, time_from=time_from, time_to=time_to)
+        return cls.get_motor_collection().find(
+            query.get_filter_query(),
+            projection={"_id": 0, "time": 1, "value": 1},
+            sort=query.sort_expressions,
+            limit=limit,
+            batch_size=batch_size,
+        )
+
+    @classmethod
+    async def upsert_many(cls, exchange_rates: List["ExchangeRate"]) -> BulkWriteResult:
+        """
+        Insert the exchange rates missing in the DB in a single unordered bulk write
+        of upserts keyed on (asset, time); the existing records are left intact
+        :returns BulkWriteResult: the result with the upserted and matched counts
+        :raises BulkWriteError: any write has failed except on the (asset, time) duplicates
+            inserted concurrently
+        """
+        if cls.is_time_series():
+            return await cls._insert_missing(exchange_rates)
+        operations = []
+        for exchange_rate in exchange_rates:
+            operations.append(
+                UpdateOne(
+                    exchange_rate.get_key_filter(),
+                    {"$setOnInsert": {"value": exchange_rate.value}},
+                    upsert=True,
+                )
+            )
+        if not operations:
+            return get_empty_bulk_write_result()
+        try:
+            return await cls.get_motor_collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            # The concurrent upserts of the same (asset, time) may fail on the unique index
+            write_errors = exc.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR_CODE for error in write_errors):
+                raise
+            return BulkWriteResult(exc.details, acknowledged=True)
+
+    @classmethod
+    async def _insert_missing(cls, exchange_rates: List["ExchangeRate"]) -> BulkWriteResult:
+        """
+        Insert the exchange rates missing in the time-series collection:
+        the upserts and the unique indexes are not available, so the existing (asset, time)
+        records of the batch are found first by a single query of the batch time range
+        """
+        if not exchange_rates:
+            return get_empty_bulk_write_result()
+        times = [exchange_rate.time for exchange_rate in exchange_rates]
+        asset_ids = list({exchange_rate.get_asset_ref().id for exchange_rate in exchange_rates})
+        existing_records = cls.get_motor_collection().find(
+            {
+                "asset.$id": {"$in": asset_ids},
+                "date": {
+                    "$gte": datetime.fromtimestamp(min(times), UTC),
+                    "$lte": datetime.fromtimestamp(max(times), UTC),
+                },
+            },
+            projection={"_id": 0, "asset": 1, "time": 1},
+        )
+        existing_keys = {(record["asset"].id, record["time"]) async for record in existing_records}
+
+        operations = []
+        for exchange_rate in exchange_rates:
+            asset_ref = exchange_rate.get_asset_ref()
+            key = (asset_ref.id, exchange_rate.time)
+            if key in existing_keys:
+                continue
+            existing_keys.add(key)
+            document: Dict[str, Any] = {
+                "asset": asset_ref,
+                "time": exchange_rate.time,
+                "value": exchange_rate.value,
+                "date": datetime.fromtimestamp(exchange_rate.time, UTC),
+            }
+            operations.append(InsertOne(document))
+        matched_count = len(exchange_rates) - len(operations)
+        if not operations:
+            result = get_empty_bulk_write_result()
+        else:
+            result = await cls.get_motor_collection().bulk_write(operations, ordered=False)
+        result.bulk_api_result["nMatched"] = matched_count
+        return result
+
+    def get_key_filter(self) -> Dict[str, Any]:
+        """Get the filter matching the record by its unique (asset, time) key"""
+        return {"asset": self.get_asset_ref(), "time": self.time}
+
+    def get_asset_ref(self) -> DBRef:
+        """Get the DBRef of the asset"""
+        asset = self.asset
+        if isinstance(asset, Asset):
+            return asset.to_ref()
+        if isinstance(asset, DBRef):
+            return asset
+        return asset.ref
 
     class Settings:
         """Collection settings"""
 
         name = "exchangeRate"
-        indexes = [
-            pymongo.IndexModel(
-                [
-                    ("asset", pymongo.ASCENDING),
-                    ("time", pymongo.ASCENDING),
-                ],
-                name="assetIdWithTime",
-                unique=True,
-            ),
-            pymongo.IndexModel(
-                [
-                    ("asset._id", pymongo.ASCENDING),
-                ],
-                name="asset",
-            ),
-            pymongo.IndexModel(
-                [
-                    ("time", pymongo.DESCENDING),
-                ],
-                name="time",
-            ),
-        ]
+        keep_nulls = False
+        timeseries = (
+            EXCHANGE_RATE_TIME_SERIES_CONFIG if settings.EXCHANGE_RATE_TIME_SERIES else None
+        )
+        indexes = (
+            EXCHANGE_RATE_TIME_SERIES_INDEXES
+            if settings.EXCHANGE_RATE_TIME_SERIES
+            else EXCHANGE_RATE_INDEXES
+        )
+
+
+def get_empty_bulk_write_result() -> BulkWriteResult:
+    """Get the result of a bulk write without operations"""
+    return BulkWriteResult(
+        {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0},
+        acknowledged=True,
+    )
@@ -149,3 +149,57 @@ async def test_exchange_rate_model__conditional_create(db):
     fetched_exchange_rate: ExchangeRate | None = await ExchangeRate.find_one(fetch_links=True)
     assert fetched_exchange_rate is not None
     assert fetched_exchange_rate.value == new_value
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_model__upsert_many(db):
+    """Test the exchange rate model on the bulk upserts keyed on (asset, time)"""
+    await Asset.initialize_assets()
+    assets = await Asset.find().to_list()
+    now_timestamp = int(datetime.now().timestamp())
+
+    exchange_rates = [
+        ExchangeRate(asset=asset, time=now_timestamp, value=1.17) for asset in assets[:2]
+    ]
+    result = await ExchangeRate.upsert_many(exchange_rates)
+    assert (result.upserted_count, result.matched_count) == (2, 0)
+
+    # The existing records are matched and left intact, the new ones are inserted
+    exchange_rates = [
+        ExchangeRate(asset=asset, time=now_timestamp, value=1.18) for asset in assets[:3]
+    ]
+    result = await ExchangeRate.upsert_many(exchange_rates)
+    assert (result.upserted_count, result.matched_count) == (1, 2)
+
+    records = await ExchangeRate.find(ExchangeRate.time == now_timestamp).to_list()
+    assert sorted((record.asset.ref.id, record.value) for record in records) == [
+        (assets[0].id, 1.17),
+        (assets[1].id, 1.17),
+        (assets[2].id, 1.18),
+    ]
+
+    result = await ExchangeRate.upsert_many([])
+    assert (result.upserted_count, result.matched_count) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_model__find_by_asset(db):
+    """Test finding the asset records sorted by time"""
+    await Asset.initialize_assets()
+    asset, other_asset = await Asset.find().limit(2).to_list()
+    now_timestamp = int(datetime.now().timestamp())
+    await ExchangeRate.upsert_many(
+        [
+            ExchangeRate(asset=asset, time=now_timestamp - 2, value=1.16),
+            ExchangeRate(asset=asset, time=now_timestamp, value=1.18),
+            ExchangeRate(asset=asset, time=now_timestamp - 1, value=1.17),
+            ExchangeRate(asset=other_asset, time=now_timestamp, value=2.0),
+        ]
+    )
+
+    records = await ExchangeRate.find_by_asset(asset.id, time_from=now_timestamp - 1).to_list()
+    assert [record.value for record in records] == [1.17, 1.18]
+
+    latest_record = await ExchangeRate.find_by_asset(asset.id, latest_first=True).first_or_none()
+    assert latest_record is not None
+    assert latest_record.value == 1.18
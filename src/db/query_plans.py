@@ -0,0 +1,251 @@
+"""
+Query plans of the application access paths: every DB query the application issues
+is explained and checked for the collection scans and the in-memory sorts
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List
+
+from beanie.odm.queries.find import FindMany
+from motor.motor_asyncio import AsyncIOMotorCursor
+
+from db.archive import SECONDS_PER_DAY, get_day_start
+from db.models.candle import Candle
+from db.models.exchange_rate import Asset, ExchangeRate
+
+# The plan stages reading the whole collection or sorting the documents in memory
+FORBIDDEN_STAGES = frozenset({"COLLSCAN", "SORT"})
+
+ExplainFactory = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class QueryPlanCase:
+    """An application query to explain"""
+
+    name: str
+    explain: ExplainFactory
+
+
+@dataclass
+class QueryPlanResult:
+    """The winning plan of the query and its execution stats"""
+
+    name: str
+    stages: List[str]
+    indexes: List[str]
+    keys_examined: int
+    docs_examined: int
+    returned: int
+    violations: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_explain(cls, case: QueryPlanCase, explain: Dict[str, Any]) -> "QueryPlanResult":
+        """Get the result of the `executionStats` explain output of the case query"""
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        stats = explain["executionStats"]
+        stages = [stage["stage"] for stage in iter_plan_stages(winning_plan)]
+        indexes = [
+            stage["indexName"] for stage in iter_plan_stages(winning_plan) if "indexName" in stage
+        ]
+        violations = [f"{stage} stage" for stage in stages if stage in FORBIDDEN_STAGES]
+        return cls(
+            name=case.name,
+            stages=stages,
+            indexes=indexes,
+            keys_examined=stats.get("totalKeysExamined", 0),
+            docs_examined=stats.get("totalDocsExamined", 0),
+            returned=stats.get("nReturned", 0),
+            violations=violations,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the result to record"""
+        return {
+            "stages": self.stages,
+            "indexes": self.indexes,
+            "keysExamined": self.keys_examined,
+            "docsExamined": self.docs_examined,
+            "returned": self.returned,
+        }
+
+
+def iter_plan_stages(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate the stages of the plan tree from the root.
+    Both the classic plans and the slot-based engine ones, nested into `queryPlan`, are walked
+    """
+    if "queryPlan" in plan:
+        yield from iter_plan_stages(plan["queryPlan"])
+        return
+    if "stage" in plan:
+        yield plan
+    if "inputStage" in plan:
+        yield from iter_plan_stages(plan["inputStage"])
+    for input_stage in plan.get("inputStages", []):
+        yield from iter_plan_stages(input_stage)
+
+
+def compare_with_baseline(
+    results: List[QueryPlanResult], baseline: Dict[str, Dict[str, Any]], tolerance: float = 0.1
+) -> List[str]:
+    """
+    Compare the results with the recorded ones of the same data
+    :param List[QueryPlanResult] results: the current results
+    :param Dict[str, Dict[str, Any]] baseline: the recorded results by query name
+    :param float tolerance: the allowed relative growth of the keys and the documents examined
+    :returns List[str]: the regressions
+    """
+    regressions = []
+    for result in results:
+        recorded = baseline.get(result.name)
+        if recorded is None:
+            continue
+        if result.indexes != recorded["indexes"]:
+            regressions.append(
+                f"{result.name}: uses the indexes {result.indexes} instead of {recorded['indexes']}"
+            )
+        for key, value in (
+            ("keysExamined", result.keys_examined),
+            ("docsExamined", result.docs_examined),
+        ):
+            if value > recorded[key] * (1 + tolerance):
+                regressions.append(f"{result.name}: {key} {recorded[key]} -> {value}")
+    return regressions
+
+
+async def explain_find(query: FindMany | AsyncIOMotorCursor) -> Dict[str, Any]:
+    """Explain the find query or cursor"""
+    cursor = query.motor_cursor if isinstance(query, FindMany) else query
+    return await cursor.explain()
+
+
+async def explain_command(
+    document_model: Any, command: str, arguments: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Explain the write command of the model collection with the execution stats;
+    nothing is written
+    :param Any document_model: the Document class
+    :param str command: the command name, e.g., `update`
+    :param Dict[str, Any] arguments: the command arguments, e.g., `updates`
+    """
+    collection = document_model.get_motor_collection()
+    return await collection.database.command(
+        {"explain": {command: collection.name, **arguments}, "verbosity": "executionStats"}
+    )
+
+
+def get_query_plan_cases(asset: Asset, time_from: int, time_to: int) -> List[QueryPlanCase]:
+    """
+    Get the queries of every application access path of the regular `exchangeRate` layout
+    :param Asset asset: the asset of the queries
+    :param int time_from: the time the queried ranges start at
+    :param int time_to: the latest time of the asset records
+    """
+    asset_id: int = asset.id  # type: ignore
+    day_start = get_day_start(time_from)
+    exchange_rate = ExchangeRate(asset=asset, time=time_to, value=1)  # type: ignore
+    candle = Candle.open_with(asset, "1m", time_to, 1)
+    return [
+        # The latest point of the polling source and the change stream catch-up
+        QueryPlanCase(
+            "exchange_rate.latest",
+            lambda: explain_find(ExchangeRate.find_points(asset_id, latest_first=True).limit(1)),
+        ),
+        # The in-memory history backfill
+        QueryPlanCase(
+            "exchange_rate.history_backfill",
+            lambda: explain_find(ExchangeRate.find_points(asset_id, time_from=time_to - 30 * 60)),
+        ),
+        # A page of the `history` action
+        QueryPlanCase(
+            "exchange_rate.history_page",
+            lambda: explain_find(
+                ExchangeRate.iter_points(asset_id, time_from, time_to=time_to, limit=10_001)
+            ),
+        ),
+        QueryPlanCase(
+            "exchange_rate.upsert",
+            lambda: explain_command(
+                ExchangeRate,
+                "update",
+                {
+                    "updates": [
+                        {
+                            "q": exchange_rate.get_key_filter(),
+                            "u": {"$setOnInsert": {"value": exchange_rate.value}},
+                            "upsert": True,
+                        }
+                    ],
+                },
+            ),
+        ),
+        # The oldest record and the deletion of an expired day of the retention
+        QueryPlanCase(
+            "exchange_rate.oldest",
+            lambda: explain_find(ExchangeRate.find_points(asset_id).limit(1)),
+        ),
+        QueryPlanCase(
+            "exchange_rate.delete_day",
+            lambda: explain_command(
+                ExchangeRate,
+                "delete",
+                {
+                    "deletes": [
+                        {
+                            "q": ExchangeRate.find_by_asset(
+                                asset_id,
+                                time_from=day_start,
+                                time_to=day_start + SECONDS_PER_DAY - 1,
+                            ).get_filter_query(),
+                            "limit": 0,
+                        }
+                    ],
+                },
+            ),
+        ),
+        QueryPlanCase(
+            "candle.latest",
+            lambda: explain_find(Candle.find_range_query(asset_id, "1m").limit(500)),
+        ),
+        QueryPlanCase(
+            "candle.range",
+            lambda: explain_find(
+                Candle.find_range_query(asset_id, "1m", time_from=time_from, time_to=time_to).limit(
+                    500
+                )
+            ),
+        ),
+        QueryPlanCase(
+            "candle.merge",
+            lambda: explain_command(
+                Candle,
+                "update",
+                {
+                    "updates": [
+                        {"q": candle.get_key_filter(), "u": {"$inc": {"ticks": 1}}, "upsert": True}
+                    ],
+                },
+            ),
+        ),
+        # The assets registry load
+        QueryPlanCase(
+            "asset.all",
+            lambda: explain_find(Asset.find().sort(+Asset.id)),  # type: ignore
+        ),
+        # The configured assets of the ingestion and all the assets of the retention
+        QueryPlanCase(
+            "asset.from_settings",
+            lambda: explain_find(Asset.find_assets_from_settings()),
+        ),
+        QueryPlanCase(
+            "asset.retention",
+            lambda: explain_find(Asset.find().sort(+Asset.id)),  # type: ignore
+        ),
+    ]
+
+
+async def explain_query_plans(cases: List[QueryPlanCase]) -> List[QueryPlanResult]:
+    """Explain the queries of the cases"""
+    return [QueryPlanResult.from_explain(case, await case.explain()) for case in cases]
@@ -0,0 +1,231 @@
+"""
+Shared-memory table of the latest exchange rates published by the ingestion process
+and read by every application worker without querying the DB
+"""
+
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, Set, Tuple
+
+from db.models.exchange_rate import Asset, ExchangeRate
+
+# The table header: the format magic, the maximum number of the assets, the window size,
+# the number of the assigned asset slots and the creation token telling the writers apart
+TABLE_HEADER = struct.Struct("<4sIIIQ")
+TABLE_MAGIC = b"ERT1"
+TABLE_HEADER_SIZE = 64
+# The asset slot header: the asset ID, the sequence number and the number of the points written
+SLOT_HEADER = struct.Struct("<qQQ")
+SLOT_HEADER_SIZE = 32
+_SEQUENCE = struct.Struct("<Q")
+_POINT_TIME = struct.Struct("<q")
+_POINT_VALUE = struct.Struct("<d")
+
+# Names of the tables created by this process
+_created_names: Set[str] = set()
+
+
+class SharedRatesTableError(Exception):
+    """The shared memory is not a rates table or the table is full"""
+
+
+class SharedRatesTable:
+    """
+    Table of the assets slots in the named shared memory segment. A slot holds the ring buffer
+    of the latest `window` (time, value) points of an asset as the int64 times
+    and float64 values columns.
+    A single process writes the table; the slot sequence number is odd while the slot is
+    being written, so a reader retries the read if the sequence is odd or has changed meanwhile
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool = False):
+        """
+        :param SharedMemory memory: the shared memory segment of the table
+        :param bool owner: whether the table is the writer one unlinking the segment on close
+        """
+        self._memory = memory
+        self._owner = owner
+        magic, self.max_assets, self.window, _, self.token = TABLE_HEADER.unpack_from(memory.buf)
+        if magic != TABLE_MAGIC:
+            raise SharedRatesTableError(f"The shared memory {memory.name} is not a rates table")
+        self._slot_size = SLOT_HEADER_SIZE + self.window * 16
+        self._slots: Dict[int, int] = {}
+        # The latest time of every asset written by this process
+        self._last_times: Dict[int, int] = {}
+
+    @classmethod
+    def create(cls, name: str, max_assets: int, window: int) -> "SharedRatesTable":
+        """
+        Create the writer table replacing the segment left by a previous writer
+        :param str name: the shared memory segment name
+        :param int max_assets: the maximum number of the assets
+        :param int window: the number of the latest points kept per asset
+        """
+        size = TABLE_HEADER_SIZE + max_assets * (SLOT_HEADER_SIZE + window * 16)
+        try:
+            memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale_memory = shared_memory.SharedMemory(name=name)
+            stale_memory.close()
+            stale_memory.unlink()
+            memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        memory.buf[:size] = bytes(size)
+        TABLE_HEADER.pack_into(memory.buf, 0, TABLE_MAGIC, max_assets, window, 0, time.time_ns())
+        _created_names.add(memory.name)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRatesTable":
+        """
+        Attach to the table created by the writer process
+        :raises FileNotFoundError: the table has not been created
+        """
+        memory = shared_memory.SharedMemory(name=name)
+        if memory.name not in _created_names:
+            # The segment is owned by the writer: do not unlink it once this process exits
+            resource_tracker.unregister(memory._name, "shared_memory")  # type: ignore
+        return cls(memory)
+
+    @property
+    def name(self) -> str:
+        """The shared memory segment name"""
+        return self._memory.name
+
+    def close(self) -> None:
+        """Detach from the table; the writer removes the table"""
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+            _created_names.discard(self._memory.name)
+
+    def publish(self, asset_id: int, times: Iterable[int], values: Iterable[float]) -> int:
+        """
+        Append the asset points in the ascending time order; the older and duplicate ones are skipped
+        :returns int: the number of the appended points
+        :raises SharedRatesTableError: the table is full
+        """
+        offset = self._get_slot_offset(asset_id, create=True)
+        buffer = self._memory.buf
+        last_time = self._last_times.get(asset_id)
+        (sequence,) = _SEQUENCE.unpack_from(buffer, offset + 8)
+        (count,) = _SEQUENCE.unpack_from(buffer, offset + 16)
+        times_offset = offset + SLOT_HEADER_SIZE
+        values_offset = times_offset + self.window * 8
+        appended = 0
+        _SEQUENCE.pack_into(buffer, offset + 8, sequence + 1)
+        try:
+            for point_time, value in zip(times, values):
+                if last_time is not None and point_time <= last_time:
+                    continue
+                idx = count % self.window
+                _POINT_TIME.pack_into(buffer, times_offset + idx * 8, point_time)
+                _POINT_VALUE.pack_into(buffer, values_offset + idx * 8, value)
+                count += 1
+                last_time = point_time
+                appended += 1
+            _SEQUENCE.pack_into(buffer, offset + 16, count)
+        finally:
+            _SEQUENCE.pack_into(buffer, offset + 8, sequence + 2)
+        if last_time is not None:
+            self._last_times[asset_id] = last_time
+        return appended
+
+    def publish_exchange_rates(self, exchange_rates: List[ExchangeRate]) -> int:
+        """
+        Append the ExchangeRate records with the Asset assigned
+        :returns int: the number of the appended points
+        """
+        points_by_asset: Dict[int, Tuple[List[int], List[float]]] = {}
+        for exchange_rate in sorted(exchange_rates, key=lambda exchange_rate: exchange_rate.time):
+            asset: Asset = exchange_rate.asset  # type: ignore
+            times, values = points_by_asset.setdefault(asset.id, ([], []))  # type: ignore
+            times.append(exchange_rate.time)
+            values.append(exchange_rate.value)
+        return sum(
+            self.publish(asset_id, times, values)
+            for asset_id, (times, values) in points_by_asset.items()
+        )
+
+    def get_count(self, asset_id: int) -> int:
+        """Get the number of the asset points ever written; changes once a point is appended"""
+        offset = self._get_slot_offset(asset_id)
+        if offset is None:
+            return 0
+        (count,) = _SEQUENCE.unpack_from(self._memory.buf, offset + 16)
+        return count
+
+    def read(
+        self, asset_id: int, time_from: int | None = None, max_retries: int = 100
+    ) -> Tuple[List[int], List[float]]:
+        """
+        Read the asset points with time >= time_from in the ascending time order
+        :returns Tuple[List[int], List[float]]: times and values; empty if the asset is unknown
+        :raises SharedRatesTableError: the slot has been written during every read attempt
+        """
+        offset = self._get_slot_offset(asset_id)
+        if offset is None:
+            return [], []
+        buffer = self._memory.buf
+        times_offset = offset + SLOT_HEADER_SIZE
+        values_offset = times_offset + self.window * 8
+        for _ in range(max_retries):
+            (sequence,) = _SEQUENCE.unpack_from(buffer, offset + 8)
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            (count,) = _SEQUENCE.unpack_from(buffer, offset + 16)
+            times_data = bytes(buffer[times_offset:values_offset])
+            values_data = bytes(buffer[values_offset : values_offset + self.window * 8])
+            if _SEQUENCE.unpack_from(buffer, offset + 8)[0] == sequence:
+                break
+        else:
+            raise SharedRatesTableError(f"Could not read the asset {asset_id} slot consistently")
+
+        times, values = array("q", times_data), array("d", values_data)
+        size = min(count, self.window)
+        start = count % self.window if count > self.window else 0
+        ordered_times = (times[start:] + times[:start])[:size] if start else times[:size]
+        ordered_values = (values[start:] + values[:start])[:size] if start else values[:size]
+        first = 0 if time_from is None else bisect_left(ordered_times, time_from)
+        return ordered_times[first:].tolist(), ordered_values[first:].tolist()
+
+    def _get_slot_offset(self, asset_id: int, create: bool = False) -> int | None:
+        """
+        Get the asset slot offset; assign a new slot to the asset if `create` is set
+        :raises SharedRatesTableError: the table is full
+        """
+        slot = self._slots.get(asset_id)
+        if slot is None:
+            buffer = self._memory.buf
+            *_, slots_count, _ = TABLE_HEADER.unpack_from(buffer)
+            # Refresh the slots assigned by the writer
+            for slot_idx in range(len(self._slots), slots_count):
+                slot_asset_id, *_ = SLOT_HEADER.unpack_from(buffer, self._get_offset(slot_idx))
+                self._slots[slot_asset_id] = slot_idx
+            slot = self._slots.get(asset_id)
+            if slot is None:
+                if not create:
+                    return None
+                if slots_count == self.max_assets:
+                    raise SharedRatesTableError(f"The table is full: {self.max_assets} assets")
+                slot = slots_count
+                SLOT_HEADER.pack_into(buffer, self._get_offset(slot), asset_id, 0, 0)
+                # The slot is visible to the readers once the asset ID is written
+                TABLE_HEADER.pack_into(
+                    buffer,
+                    0,
+                    TABLE_MAGIC,
+                    self.max_assets,
+                    self.window,
+                    slots_count + 1,
+                    self.token,
+                )
+                self._slots[asset_id] = slot
+        return self._get_offset(slot)
+
+    def _get_offset(self, slot: int) -> int:
+        """Get the slot offset"""
+        return TABLE_HEADER_SIZE + slot * self._slot_size
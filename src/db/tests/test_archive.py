@@ -0,0 +1,52 @@
+"""
+Test the exchange rates archive
+"""
+
+from pathlib import Path
+
+import pytest
+
+from db.archive import SECONDS_PER_DAY, ExchangeRateArchive, get_day_start
+
+# 2023-11-14 00:00:00 UTC
+DAY_START = 1_699_920_000
+
+
+def test_get_day_start():
+    assert get_day_start(DAY_START) == DAY_START
+    assert get_day_start(DAY_START + SECONDS_PER_DAY - 1) == DAY_START
+
+
+def test_exchange_rate_archive(tmp_path: Path):
+    """
+    Test the archive: the days are merged on write and the time ranges are read across the days
+    """
+    archive = ExchangeRateArchive(tmp_path)
+    assert archive.write_day(1, DAY_START, [DAY_START + 2, DAY_START], [1.2, 1.0]) == 2
+    # The archived points are kept, the new ones are merged in order
+    assert archive.write_day(1, DAY_START, [DAY_START + 1, DAY_START + 2], [1.1, 5.0]) == 3
+    next_day_start = DAY_START + SECONDS_PER_DAY
+    archive.write_day(1, next_day_start, [next_day_start + 10], [2.0])
+    assert archive.get_path(1, DAY_START) == tmp_path / "1" / "2023-11-14.rates"
+    assert archive.get_days(1) == [DAY_START, next_day_start]
+    assert archive.get_days(2) == []
+
+    with archive.open_day(1, DAY_START) as archive_day:  # type: ignore
+        assert len(archive_day) == 3
+        assert archive_day.read() == ([DAY_START, DAY_START + 1, DAY_START + 2], [1.0, 1.1, 1.2])
+        assert archive_day.read(DAY_START + 1, DAY_START + 1) == ([DAY_START + 1], [1.1])
+
+    assert list(archive.iter_points(1, DAY_START + 1)) == [
+        ([DAY_START + 1, DAY_START + 2], [1.1, 1.2]),
+        ([next_day_start + 10], [2.0]),
+    ]
+    assert list(archive.iter_points(1, DAY_START, limit=2)) == [
+        ([DAY_START, DAY_START + 1], [1.0, 1.1])
+    ]
+    assert list(archive.iter_points(1, DAY_START, time_to=next_day_start)) == [
+        ([DAY_START, DAY_START + 1, DAY_START + 2], [1.0, 1.1, 1.2])
+    ]
+
+    # The points of another day are rejected
+    with pytest.raises(ValueError):
+        archive.write_day(1, DAY_START, [next_day_start], [1.0])
@@ -0,0 +1,97 @@
+"""
+Test the query plans checks
+"""
+
+from db.query_plans import (
+    QueryPlanCase,
+    QueryPlanResult,
+    compare_with_baseline,
+    iter_plan_stages,
+)
+
+
+async def explain_nothing():
+    return {}
+
+
+def get_explain(winning_plan: dict, keys_examined: int = 10, docs_examined: int = 10) -> dict:
+    return {
+        "queryPlanner": {"winningPlan": winning_plan},
+        "executionStats": {
+            "nReturned": 10,
+            "totalKeysExamined": keys_examined,
+            "totalDocsExamined": docs_examined,
+        },
+    }
+
+
+INDEX_PLAN = {
+    "stage": "LIMIT",
+    "inputStage": {
+        "stage": "PROJECTION_SIMPLE",
+        "inputStage": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "assetIdWithTime"},
+        },
+    },
+}
+SORT_PLAN = {
+    "queryPlan": {
+        "stage": "SORT",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [{"stage": "COLLSCAN"}, {"stage": "IXSCAN", "indexName": "time"}],
+        },
+    },
+    "slotBasedPlan": {},
+}
+
+
+def test_iter_plan_stages():
+    assert [stage["stage"] for stage in iter_plan_stages(INDEX_PLAN)] == [
+        "LIMIT",
+        "PROJECTION_SIMPLE",
+        "FETCH",
+        "IXSCAN",
+    ]
+    # The slot-based engine plans are nested
+    assert [stage["stage"] for stage in iter_plan_stages(SORT_PLAN)] == [
+        "SORT",
+        "OR",
+        "COLLSCAN",
+        "IXSCAN",
+    ]
+
+
+def test_query_plan_result():
+    """Test the collection scans and the in-memory sorts are reported"""
+    case = QueryPlanCase("points", explain_nothing)
+    result = QueryPlanResult.from_explain(case, get_explain(INDEX_PLAN))
+    assert result.violations == []
+    assert result.indexes == ["assetIdWithTime"]
+    assert result.to_dict() == {
+        "stages": ["LIMIT", "PROJECTION_SIMPLE", "FETCH", "IXSCAN"],
+        "indexes": ["assetIdWithTime"],
+        "keysExamined": 10,
+        "docsExamined": 10,
+        "returned": 10,
+    }
+
+    result = QueryPlanResult.from_explain(case, get_explain(SORT_PLAN))
+    assert result.violations == ["SORT stage", "COLLSCAN stage"]
+
+
+def test_compare_with_baseline():
+    """Test the regressions of the examined keys and documents and of the indexes used"""
+    case = QueryPlanCase("points", explain_nothing)
+    baseline = {"points": QueryPlanResult.from_explain(case, get_explain(INDEX_PLAN)).to_dict()}
+    results = [QueryPlanResult.from_explain(case, get_explain(INDEX_PLAN, keys_examined=11))]
+    assert compare_with_baseline(results, baseline) == []
+
+    results = [QueryPlanResult.from_explain(case, get_explain(INDEX_PLAN, docs_examined=20))]
+    assert compare_with_baseline(results, baseline) == ["points: docsExamined 10 -> 20"]
+
+    results = [QueryPlanResult.from_explain(case, get_explain(SORT_PLAN))]
+    assert compare_with_baseline(results, baseline) == [
+        "points: uses the indexes ['time'] instead of ['assetIdWithTime']"
+    ]
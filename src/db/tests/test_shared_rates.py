@@ -0,0 +1,49 @@
+"""
+Test the shared-memory rates table
+"""
+
+import os
+
+import pytest
+
+from db.models.exchange_rate import Asset, ExchangeRate
+from db.shared_rates import SharedRatesTable, SharedRatesTableError
+
+
+@pytest.fixture()
+def table():
+    table = SharedRatesTable.create(f"test_rates_{os.getpid()}", max_assets=2, window=4)
+    yield table
+    table.close()
+
+
+def test_shared_rates_table(table: SharedRatesTable):
+    """
+    Test the table: the readers get the latest window of the points in the ascending time order
+    """
+    reader = SharedRatesTable.attach(table.name)
+    assert reader.window == 4
+    assert reader.token == table.token
+    assert reader.read(1) == ([], [])
+
+    assert table.publish(1, [100, 101], [1.0, 1.01]) == 2
+    assert reader.get_count(1) == 2
+    assert reader.read(1) == ([100, 101], [1.0, 1.01])
+
+    # The older and duplicate points are skipped; the oldest ones leave the window
+    assert table.publish(1, [101, 102, 103, 104, 105], [9.0, 1.02, 1.03, 1.04, 1.05]) == 4
+    assert reader.get_count(1) == 6
+    assert reader.read(1) == ([102, 103, 104, 105], [1.02, 1.03, 1.04, 1.05])
+    assert reader.read(1, time_from=104) == ([104, 105], [1.04, 1.05])
+
+    eurusd = Asset.model_construct(id=2, name="EURUSD")
+    assert table.publish_exchange_rates(
+        [
+            ExchangeRate.model_construct(asset=eurusd, time=101, value=1.1),
+            ExchangeRate.model_construct(asset=eurusd, time=100, value=1.0),
+        ]
+    )
+    assert reader.read(2) == ([100, 101], [1.0, 1.1])
+    with pytest.raises(SharedRatesTableError):
+        table.publish(3, [100], [1.0])
+    reader.close()
@@ -4,139 +4,576 @@ The Exchange rate application client service to handle the exchange rates logic
 
 import abc
 import asyncio
-from datetime import datetime, timedelta
-from typing import Any, AsyncGenerator, Coroutine, List
-
-from pymongo import DESCENDING
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Dict, List, Tuple
 
+from db.archive import ExchangeRateArchive, exchange_rate_archive
+from db.models.candle import Candle, get_candle_time
 from db.models.exchange_rate import Asset, ExchangeRate
-from exchange_rate.models import (
-    AssetsMessageModel,
-    ExchangeRateAssetHistoryMessageModel,
-    ExchangeRatePointModel,
-)
+from exchange_rate.frames import CandleFrame, CandlesFrame, ExchangeRatePointFrame
+from exchange_rate.hub import ExchangeRateHub, exchange_rate_hub
+from exchange_rate.models import HistoryCursorModel
+from exchange_rate.registry import AssetRegistry, asset_registry
 from exchange_rate.utils import single_error_rpc_response
+from rpc.frames import RPCFrame
 from rpc.models import RPCErrorMessageModel, RPCCommandModel
+from settings import settings
+
+
+@dataclass
+class AssetSubscriptionOptions:
+    """Client-requested options of the asset subscription"""
+
+    # `asset_history` message shape: `points` or `compact`
+    history_format: str = "points"
+    # The maximum number of the points sent per second; unlimited if None
+    max_rate_per_second: float | None = None
+    # The minimum value change since the latest point sent; any change if None
+    min_change: float | None = None
 
 
 class AbstractExchangeRateClientService(abc.ABC):
     """Abstract exchange rate per client service"""
 
     @abc.abstractmethod
-    async def rpc_assets(self) -> RPCCommandModel:
+    async def rpc_assets(self) -> RPCCommandModel | RPCFrame:
         """
         Get the list of available assets
         """
 
     @abc.abstractmethod
-    async def rpc_switch_asset_id(self, asset_id: int | None) -> RPCErrorMessageModel | None:
+    async def rpc_switch_asset_id(
+        self, asset_id: int | None, options: AssetSubscriptionOptions | None = None
+    ) -> RPCErrorMessageModel | None:
         """
-        Set the new asset by ID
+        Replace all the subscriptions with the single asset by ID
         :param int asset_id: ID of the asset
+        :param AssetSubscriptionOptions options: the subscription options
         """
 
     @abc.abstractmethod
-    async def rpc_subscribe(self) -> AsyncGenerator[RPCCommandModel, Any]:
+    async def rpc_subscribe_asset_ids(
+        self, asset_ids: List[int], options: AssetSubscriptionOptions | None = None
+    ) -> RPCErrorMessageModel | None:
         """
-        Subscribe to the ExchangeRate data for the specified asset:
-            get data for last 30 mins;
+        Add the assets by IDs to the subscriptions
+        :param List[int] asset_ids: IDs of the assets
+        :param AssetSubscriptionOptions options: the subscription options
+        """
+
+    @abc.abstractmethod
+    def rpc_unsubscribe_asset_ids(self, asset_ids: List[int] | None) -> None:
+        """
+        Remove the assets by IDs from the points and candles subscriptions
+        :param List[int] | None asset_ids: IDs of the assets; all the assets if None
+        """
+
+    @abc.abstractmethod
+    async def rpc_candles(
+        self,
+        asset_id: int,
+        interval: str,
+        time_from: int | None = None,
+        time_to: int | None = None,
+        limit: int = 500,
+    ) -> RPCErrorMessageModel | None:
+        """
+        Request the asset interval candles; the open candle is streamed live if time_to is None
+        :param int asset_id: ID of the asset
+        :param str interval: the candle interval
+        :param int | None time_from: the minimum candle open time; the latest candles if None
+        :param int | None time_to: the maximum candle open time
+        :param int limit: the maximum number of the candles
+        """
+
+    @abc.abstractmethod
+    async def rpc_history(
+        self, cursor: HistoryCursorModel, limit: int, chunk_size: int
+    ) -> AsyncGenerator[RPCCommandModel | RPCFrame, Any]:
+        """
+        Stream a page of the asset points in the chunked `history` messages
+        :param HistoryCursorModel cursor: position of the page
+        :param int limit: the maximum number of the page points
+        :param int chunk_size: the maximum number of the points per message
+        """
+
+    @abc.abstractmethod
+    async def rpc_subscribe(self) -> AsyncGenerator[RPCCommandModel | RPCFrame, Any]:
+        """
+        Stream the ExchangeRate data of all the subscribed assets:
+            get data for last 30 mins once subscribed to an asset;
             listen to the new ExchangeRate records live
         """
 
 
+@dataclass(eq=False)
+class AssetSubscription:
+    """The per-asset state of the client subscription"""
+
+    asset: Asset
+    options: AssetSubscriptionOptions
+    # Time of the latest point received
+    last_time: int | None = None
+    # Value of the latest point sent
+    last_value: float | None = None
+    # Event loop time of the latest point sent
+    last_sent_at: float = float("-inf")
+    # The latest point held back until the rate limit window closes
+    pending_point: ExchangeRatePointFrame | None = None
+    flush_handle: asyncio.TimerHandle | None = field(default=None, repr=False)
+
+    @property
+    def min_interval(self) -> float:
+        """The minimum interval between the points sent, seconds"""
+        max_rate_per_second = self.options.max_rate_per_second
+        return 1 / max_rate_per_second if max_rate_per_second else 0
+
+    def is_changed(self, value: float) -> bool:
+        """Whether the value has changed enough since the latest point sent"""
+        min_change = self.options.min_change
+        if not min_change or self.last_value is None:
+            return True
+        return abs(value - self.last_value) >= min_change
+
+    def cancel_flush(self) -> None:
+        """Cancel the scheduled flush of the pending point"""
+        self.pending_point = None
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+
+@dataclass(eq=False)
+class CandleSubscription:
+    """The per-asset state of the client candles subscription"""
+
+    asset: Asset
+    interval: str
+    # The open candle; None until the candles range is sent
+    candle: Candle | None = None
+    ready: bool = False
+
+    def add(self, time: int, value: float) -> Candle | None:
+        """
+        Add the point to the open candle; a point of the next interval opens a new candle
+        :returns Candle | None: the updated candle; None if the point is not later than the candle
+        """
+        candle = self.candle
+        if candle is None or get_candle_time(time, self.interval) > candle.time:
+            self.candle = Candle.open_with(self.asset, self.interval, time, value)
+            return self.candle
+        return candle if candle.add(time, value) else None
+
+
+@dataclass
+class AssetCandlesRequest:
+    """Request to send the asset candles range queued ahead of the asset points"""
+
+    asset: Asset
+    interval: str
+    time_from: int | None
+    time_to: int | None
+    limit: int
+    # The live candles subscription; None if the range is sent only
+    subscription: CandleSubscription | None = None
+
+
+@dataclass
+class AssetHistoryRequest:
+    """Request to send the asset history queued ahead of the asset points"""
+
+    subscription: AssetSubscription
+
+
+@dataclass
+class AssetFlushRequest:
+    """Request to send the pending point once the rate limit window closes"""
+
+    subscription: AssetSubscription
+
+
 class ExchangeRateClientService(AbstractExchangeRateClientService):
     """
-    Exchange Rate app client service to handle client-specific data
+    Exchange Rate app client service to handle client-specific data.
+    The points of all the subscribed assets are multiplexed into a single per-client queue
     """
 
-    def __init__(self):
-        """A new instance of ExchangeRateClientService"""
-        self._asset: Asset | None = None
+    def __init__(
+        self,
+        hub: ExchangeRateHub | None = None,
+        registry: AssetRegistry | None = None,
+        archive: ExchangeRateArchive | None = None,
+    ):
+        """
+        A new instance of ExchangeRateClientService
+        :param ExchangeRateHub hub: the live records hub; the process-wide one by default
+        :param AssetRegistry registry: the assets registry; the process-wide one by default
+        :param ExchangeRateArchive archive: the archive of the records expired from the DB;
+            the process-wide one by default
+        """
+        self._hub: ExchangeRateHub = hub or exchange_rate_hub
+        self._registry: AssetRegistry = registry or asset_registry
+        self._archive: ExchangeRateArchive = archive or exchange_rate_archive
+        self._queue: asyncio.Queue[
+            ExchangeRatePointFrame | AssetHistoryRequest | AssetFlushRequest | AssetCandlesRequest
+        ] = asyncio.Queue()
+        self._subscriptions: Dict[int, AssetSubscription] = {}
+        self._candle_subscriptions: Dict[int, CandleSubscription] = {}
+
+    @property
+    def asset_ids(self) -> List[int]:
+        """IDs of the subscribed assets"""
+        return list(self._subscriptions)
 
-    async def rpc_switch_asset_id(self, asset_id: int | None) -> RPCErrorMessageModel | None:
+    async def rpc_switch_asset_id(
+        self, asset_id: int | None, options: AssetSubscriptionOptions | None = None
+    ) -> RPCErrorMessageModel | None:
         """
-        Set a new asset_id
+        Replace all the subscriptions with the single asset
         :param int | None asset_id: asset ID. Turn off listening if asset_id is None
+        :param AssetSubscriptionOptions options: the subscription options
         """
         # Fetch the Asset record
         if asset_id is None:
-            self._asset = None
+            self._detach_all()
             return None
-        asset = await Asset.find_one(Asset.id == asset_id)
+        asset = await self._registry.get(asset_id)
         if not asset:
             return RPCErrorMessageModel(
                 errors=[{"msg": f"Asset with id={asset_id} does not exist"}]
             )
-        self._asset = asset
+        self._detach_all()
+        self._attach(asset, options or AssetSubscriptionOptions())
         return None
 
-    async def rpc_assets(self) -> RPCCommandModel:
+    async def rpc_subscribe_asset_ids(
+        self, asset_ids: List[int], options: AssetSubscriptionOptions | None = None
+    ) -> RPCErrorMessageModel | None:
         """
-        Get the list of available assets
+        Add the assets to the subscriptions; the already subscribed ones are skipped
+        :param List[int] asset_ids: IDs of the assets
+        :param AssetSubscriptionOptions options: the subscription options
         """
-        assets = await self._get_assets()
-        message = AssetsMessageModel(assets=assets)
-        rpc_message = RPCCommandModel(action="assets", message=message.model_dump())
-        return rpc_message
+        assets_by_id = await self._registry.get_many(asset_ids)
+        missing_asset_ids = [asset_id for asset_id in asset_ids if asset_id not in assets_by_id]
+        if missing_asset_ids:
+            return RPCErrorMessageModel(
+                errors=[
+                    {"msg": f"Asset with id={asset_id} does not exist"}
+                    for asset_id in missing_asset_ids
+                ]
+            )
+        for asset_id in asset_ids:
+            if asset_id not in self._subscriptions:
+                self._attach(assets_by_id[asset_id], options or AssetSubscriptionOptions())
+        return None
 
-    async def rpc_subscribe(self) -> AsyncGenerator[RPCCommandModel, Any]:  # type: ignore
+    def rpc_unsubscribe_asset_ids(self, asset_ids: List[int] | None) -> None:
         """
-        Subscribe to the ExchangeRate data for the specified asset:
-        get data for last 30 mins
-        and listen to the new ExchangeRate records live
+        Remove the assets from the points and candles subscriptions
+        :param List[int] | None asset_ids: IDs of the assets; all the assets if None
         """
-        exchange_rates = await self.get_exchange_rate_history()
-        if not exchange_rates:
-            yield single_error_rpc_response(action="points", error="No points to return")
+        if asset_ids is None:
+            asset_ids = list(self._subscriptions.keys() | self._candle_subscriptions.keys())
+        for asset_id in asset_ids:
+            self._detach(asset_id)
+            self._detach_candles(asset_id)
+
+    async def rpc_candles(
+        self,
+        asset_id: int,
+        interval: str,
+        time_from: int | None = None,
+        time_to: int | None = None,
+        limit: int = 500,
+    ) -> RPCErrorMessageModel | None:
+        """
+        Queue the asset candles range request; the open candle is streamed live if time_to is None.
+        A new live request replaces the asset candles subscription
+        :param int asset_id: ID of the asset
+        :param str interval: the candle interval
+        :param int | None time_from: the minimum candle open time; the latest candles if None
+        :param int | None time_to: the maximum candle open time
+        :param int limit: the maximum number of the candles
+        """
+        asset = await self._registry.get(asset_id)
+        if not asset:
+            return RPCErrorMessageModel(
+                errors=[{"msg": f"Asset with id={asset_id} does not exist"}]
+            )
+        subscription = None
+        if time_to is None:
+            self._detach_candles(asset_id)
+            subscription = CandleSubscription(asset=asset, interval=interval)
+            self._candle_subscriptions[asset_id] = subscription
+            self._hub.subscribe(asset, self._queue)
+        self._queue.put_nowait(
+            AssetCandlesRequest(asset, interval, time_from, time_to, limit, subscription)
+        )
+        return None
+
+    async def rpc_assets(self) -> RPCCommandModel | RPCFrame:
+        """
+        Get the list of available assets; the frame is shared and encoded once per registry load
+        """
+        return await self._registry.get_assets_frame()
+
+    async def rpc_history(  # type: ignore
+        self, cursor: HistoryCursorModel, limit: int, chunk_size: int
+    ) -> AsyncGenerator[RPCCommandModel | RPCFrame, Any]:
+        """
+        Stream a page of the asset points in the ascending time order in the chunked
+        `history` messages read from the archive and the DB cursor,
+        so the page is never held in memory at once.
+        The last message has `last` set and the `cursor` resume token of the next page if any
+        :param HistoryCursorModel cursor: position of the page
+        :param int limit: the maximum number of the page points
+        :param int chunk_size: the maximum number of the points per message
+        """
+        asset = await self._registry.get(cursor.asset_id)
+        if not asset:
+            yield single_error_rpc_response(
+                action="history", error=f"Asset with id={cursor.asset_id} does not exist"
+            )
             return
+        asset_name, asset_id = asset.name, asset.id
 
-        # Yield the asset history points message
-        points = [ExchangeRatePointModel.from_exchange_rate(er) for er in exchange_rates]
-        message = ExchangeRateAssetHistoryMessageModel(points=points)
-        yield RPCCommandModel(action="asset_history", message=message.model_dump())
-
-        # Yield new exchange rate points live
-        last_er = exchange_rates[0]
-        while self._asset:
-            exchange_rate = (
-                await ExchangeRate.find(
-                    ExchangeRate.asset.id == self._asset.id,
-                )
-                .sort(-ExchangeRate.time)
-                .first_or_none()
+        def get_chunk_frame(
+            times: List[int],
+            values: List[float],
+            is_last: bool = False,
+            next_cursor: HistoryCursorModel | None = None,
+        ) -> RPCFrame:
+            """Get the `history` frame of the points chunk"""
+            return RPCFrame(
+                action="history",
+                message={
+                    "assetName": asset_name,
+                    "assetId": asset_id,
+                    "times": times,
+                    "values": values,
+                    "last": is_last,
+                    "cursor": next_cursor.encode() if next_cursor else None,
+                },
             )
 
-            if exchange_rate and last_er.id != exchange_rate.id:
-                # NOTE: Setting `asset` is much faster than fetching links inside the query
-                exchange_rate.asset = self._asset
-                last_er = exchange_rate
-                yield RPCCommandModel(
-                    action="point",
-                    message=ExchangeRatePointModel.from_exchange_rate(last_er).model_dump(),
-                )
-
-            sleep_timedelta = last_er.time + 1 - datetime.now().timestamp()
-            if sleep_timedelta > 0:
-                await asyncio.sleep(sleep_timedelta)
+        # A point beyond the limit tells there is the next page
+        points = self._iter_history_points(asset_id, cursor, limit=limit + 1)  # type: ignore
+        times: List[int] = []
+        values: List[float] = []
+        points_number = 0
+        next_cursor = None
+        try:
+            async for time, value in points:
+                if points_number == limit:
+                    next_cursor = HistoryCursorModel(
+                        assetId=asset_id, timeFrom=times[-1] + 1, timeTo=cursor.time_to  # type: ignore
+                    )
+                    break
+                if len(times) == chunk_size:
+                    yield get_chunk_frame(times, values)
+                    times, values = [], []
+                times.append(time)
+                values.append(value)
+                points_number += 1
+        finally:
+            await points.aclose()
+        yield get_chunk_frame(times, values, is_last=True, next_cursor=next_cursor)
+
+    async def _iter_history_points(
+        self, asset_id: int, cursor: HistoryCursorModel, limit: int
+    ) -> AsyncGenerator[Tuple[int, float], None]:
+        """
+        Iterate the asset (time, value) points of the cursor range in the ascending time order:
+        the archived days first, then the DB records later than the last archived point,
+        so the points of a day being purged are not repeated
+        """
+        time_from = cursor.time_from
+        for times, values in self._archive.iter_points(
+            asset_id, time_from, time_to=cursor.time_to, limit=limit
+        ):
+            for point in zip(times, values):
+                yield point
+            limit -= len(times)
+            time_from = times[-1] + 1
+        if limit <= 0:
+            return
+
+        records = ExchangeRate.iter_points(
+            asset_id,
+            time_from=time_from,
+            time_to=cursor.time_to,
+            limit=limit,
+            batch_size=settings.HISTORY_QUERY_BATCH_SIZE,
+        )
+        try:
+            async for record in records:
+                yield record["time"], record["value"]
+        finally:
+            await records.close()
+
+    async def rpc_subscribe(  # type: ignore
+        self,
+    ) -> AsyncGenerator[RPCCommandModel | RPCFrame, Any]:
+        """
+        Stream the ExchangeRate data of all the subscribed assets:
+        get data for last 30 mins from the in-memory history once subscribed to an asset
+        and listen to the new ExchangeRate records live
+        """
+        while True:
+            item = await self._queue.get()
+
+            if isinstance(item, AssetHistoryRequest):
+                subscription = item.subscription
+                asset = subscription.asset
+                if self._subscriptions.get(asset.id) is not subscription:  # type: ignore
+                    # Unsubscribed in the meantime
+                    continue
+                history_frame = await self._hub.get_history_frame(asset)
+                if history_frame is None:
+                    self._detach(asset.id)  # type: ignore
+                    yield single_error_rpc_response(action="points", error="No points to return")
+                    continue
+                subscription.last_time = history_frame.last_time
+                subscription.last_value = history_frame.values[0]
+                subscription.last_sent_at = self._loop_time()
+
+                # Yield the asset history points message
+                if subscription.options.history_format == "compact":
+                    yield history_frame.compact_frame
+                else:
+                    yield history_frame
+                continue
+
+            if isinstance(item, AssetCandlesRequest):
+                candle_subscription = item.subscription
+                asset_id = item.asset.id
+                if (
+                    candle_subscription is not None
+                    and self._candle_subscriptions.get(asset_id) is not candle_subscription  # type: ignore
+                ):
+                    # Replaced or unsubscribed in the meantime
+                    continue
+                yield await self._get_candles_frame(item)
+                continue
+
+            if isinstance(item, AssetFlushRequest):
+                subscription = item.subscription
+                point = subscription.pending_point
+                subscription.pending_point = subscription.flush_handle = None
+                if point is not None and subscription.is_changed(point.value):
+                    yield self._sent(subscription, point)
+                continue
+
+            # Yield the live update of the open candle
+            candle_subscription = self._candle_subscriptions.get(item.asset_id)
+            if candle_subscription is not None and candle_subscription.ready:
+                candle = candle_subscription.add(item.time, item.value)
+                if candle is not None:
+                    yield CandleFrame(
+                        candle_subscription.asset, candle_subscription.interval, candle
+                    )
+
+            # Yield new exchange rate points live;
+            # skip the points of the unsubscribed assets and the ones covered by the history
+            subscription = self._subscriptions.get(item.asset_id)
+            if subscription is None or subscription.last_time is None:
+                continue
+            if item.time <= subscription.last_time:
+                continue
+            subscription.last_time = item.time
+            is_changed = subscription.is_changed(item.value)
+            if not is_changed and subscription.pending_point is None:
+                continue
+
+            # Hold the point back until the rate limit window closes; a later point replaces it
+            window_closes_at = subscription.last_sent_at + subscription.min_interval
+            delay = window_closes_at - self._loop_time()
+            if delay > 0:
+                subscription.pending_point = item
+                if subscription.flush_handle is None:
+                    subscription.flush_handle = asyncio.get_running_loop().call_later(
+                        delay, self._queue.put_nowait, AssetFlushRequest(subscription)
+                    )
+            elif is_changed:
+                yield self._sent(subscription, item)
             else:
-                await asyncio.sleep(0.2)
-
-    async def get_exchange_rate_history(self) -> List[ExchangeRate]:
-        # Return the past 30 minutes ExchangeRates
-        if not self._asset:
-            return []
-        timestamp_from = int((datetime.now() - timedelta(minutes=30)).timestamp())
-        exchange_rates = (
-            await ExchangeRate.find(
-                ExchangeRate.asset.id == self._asset.id,
-                ExchangeRate.time >= timestamp_from,
-                fetch_links=True,
-            )
-            .sort(-ExchangeRate.time)
-            .to_list()
+                # The pending point is superseded by the latest one
+                subscription.cancel_flush()
+
+    def _attach(self, asset: Asset, options: AssetSubscriptionOptions) -> None:
+        """
+        Attach the client queue to the hub and queue the asset history request.
+        The request is queued before any live point of the asset
+        """
+        subscription = AssetSubscription(asset=asset, options=options)
+        self._subscriptions[asset.id] = subscription  # type: ignore
+        self._hub.subscribe(asset, self._queue)
+        self._queue.put_nowait(AssetHistoryRequest(subscription))
+
+    def _detach(self, asset_id: int) -> None:
+        """Remove the asset points subscription"""
+        subscription = self._subscriptions.pop(asset_id, None)
+        if subscription is None:
+            return
+        subscription.cancel_flush()
+        if asset_id not in self._candle_subscriptions:
+            self._hub.unsubscribe(asset_id, self._queue)
+
+    def _detach_all(self) -> None:
+        """Remove all the asset points subscriptions"""
+        for asset_id in list(self._subscriptions):
+            self._detach(asset_id)
+
+    def _detach_candles(self, asset_id: int) -> None:
+        """Remove the asset candles subscription"""
+        if self._candle_subscriptions.pop(asset_id, None) is None:
+            return
+        if asset_id not in self._subscriptions:
+            self._hub.unsubscribe(asset_id, self._queue)
+
+    async def _get_candles_frame(self, request: AssetCandlesRequest) -> CandlesFrame:
+        """
+        Get the `candles` frame of the stored candles.
+        For the live subscription, the points not merged into the stored candles yet
+        are added from the in-memory history, and the open candle is kept for the live updates
+        """
+        asset = request.asset
+        candles = await Candle.find_range(
+            asset.id,  # type: ignore
+            request.interval,
+            time_from=request.time_from,
+            time_to=request.time_to,
+            limit=request.limit,
+            # The live subscription continues the latest candle
+            latest=request.subscription is not None,
         )
-        return exchange_rates
+        subscription = request.subscription
+        if subscription is None:
+            return CandlesFrame(asset, request.interval, candles)
+
+        subscription.candle = candles[-1] if candles else None
+        points_from = subscription.candle.last_time + 1 if subscription.candle else 0
+        if request.time_from is not None:
+            points_from = max(points_from, request.time_from)
+        times, values = await self._hub.get_points(asset, points_from)
+        for time, value in zip(reversed(times), reversed(values)):
+            candle = subscription.candle
+            if subscription.add(time, value) is not None and subscription.candle is not candle:
+                candles.append(subscription.candle)  # type: ignore
+        subscription.ready = True
+        return CandlesFrame(asset, request.interval, candles[-request.limit :])
+
+    def _sent(
+        self, subscription: AssetSubscription, point: ExchangeRatePointFrame
+    ) -> ExchangeRatePointFrame:
+        """Record the point as sent and return it"""
+        subscription.cancel_flush()
+        subscription.last_value = point.value
+        subscription.last_sent_at = self._loop_time()
+        return point
 
-    async def _get_assets(self) -> List[Asset]:
-        """Get a list of assets"""
-        return await Asset.find().to_list()
+    @staticmethod
+    def _loop_time() -> float:
+        """Get the event loop monotonic time"""
+        return asyncio.get_running_loop().time()
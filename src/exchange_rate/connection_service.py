@@ -8,6 +8,7 @@ from json.decoder import JSONDecodeError
 from typing import Any, Dict, List
 
 from fastapi import WebSocket
+from loguru import logger as _LOG
 from pydantic import BaseModel, ValidationError
 from starlette.websockets import WebSocketState
 
@@ -16,9 +17,13 @@ from exchange_rate.client_service import (
     ExchangeRateClientService,
 )
 from rpc.connection_service import AbstractRPCConnectionService, BaseRPCConnectionService
+from rpc.codecs import AbstractRPCCodec
+from rpc.frames import RPCFrame
 from rpc.models import RPCErrorMessageModel, RPCCommandModel, RPCClientState
+from rpc.send_queue import RPCSendQueue
+from settings import settings
 
-SendMessageType = str | Dict[Any, Any] | List[Any] | BaseModel
+SendMessageType = str | Dict[Any, Any] | List[Any] | BaseModel | RPCFrame
 
 
 class AbstractExchangeRateRPCConnectionService(AbstractRPCConnectionService):
@@ -30,6 +35,18 @@ class AbstractExchangeRateRPCConnectionService(AbstractRPCConnectionService):
     def get_exchange_rate_service(self) -> AbstractExchangeRateClientService:
         """Get the exchange rate client service"""
 
+    @abstractmethod
+    def cancel_all_task(self) -> None:
+        """Cancel all the tasks from the list of stored tasks"""
+
+    @abstractmethod
+    def has_pending_tasks(self) -> bool:
+        """Whether any of the stored tasks is not done yet"""
+
+    @abstractmethod
+    def set_history_task(self, task: asyncio.Task) -> None:
+        """Replace the task streaming the history page cancelling the previous one"""
+
 
 class ExchangeRateRPCConnectionService(
     BaseRPCConnectionService,
@@ -37,9 +54,10 @@ class ExchangeRateRPCConnectionService(
 ):
     """RPC per-connection service to handle websocket connections"""
 
-    def __init__(self, websocket: WebSocket) -> None:
+    def __init__(self, websocket: WebSocket, codec: AbstractRPCCodec | None = None) -> None:
         """Initialize"""
-        super().__init__(websocket)
+        send_queue = RPCSendQueue(settings.WS_SEND_QUEUE_SIZE, policy=settings.WS_SEND_QUEUE_POLICY)
+        super().__init__(websocket, codec=codec, send_queue=send_queue)
 
         client_service: AbstractExchangeRateClientService = ExchangeRateClientService()
         self.client_state = RPCClientState(
@@ -52,6 +70,7 @@ class ExchangeRateRPCConnectionService(
         """Cancel the pending tasks and deallocate the used resources"""
         self.cancel_all_task()
         self.remove_completed_tasks()
+        self.get_exchange_rate_service().rpc_unsubscribe_asset_ids(None)
 
     async def connect(self) -> None:
         """Start accepting messages from the client"""
@@ -61,6 +80,9 @@ class ExchangeRateRPCConnectionService(
         """Stop accepting messages from the client and deallocate the resources"""
         await super().disconnect()
         self.deinitialize()
+        send_queue_stats = self.get_send_queue_stats()
+        if send_queue_stats.dropped or send_queue_stats.conflated:
+            _LOG.info(f"The client has not kept up with the messages: {send_queue_stats}")
 
     def get_exchange_rate_service(self) -> AbstractExchangeRateClientService:
         """Get the related ExchangeRateClientService"""
@@ -79,14 +101,29 @@ class ExchangeRateRPCConnectionService(
         self.remove_completed_tasks()
         self.client_state.tasks.append(task)
 
+    def has_pending_tasks(self) -> bool:
+        """Whether any of the stored tasks is not done yet"""
+        self.remove_completed_tasks()
+        return bool(self.client_state.tasks)
+
     def remove_completed_tasks(self) -> None:
         """Remove all the completed tasks"""
         tasks = self.client_state.tasks
         self.client_state.tasks = [task for task in tasks if task and not task.done()]
 
+    def set_history_task(self, task: asyncio.Task) -> None:
+        """Replace the task streaming the history page cancelling the previous one"""
+        history_task = self.client_state.history_task
+        if history_task is not None and not history_task.done():
+            history_task.cancel()
+        self.client_state.history_task = task
+
     def cancel_all_task(self) -> None:
         """Cancel all the tasks from the list of stored tasks"""
         # Remove all the completed tasks
         for task in self.client_state.tasks:
             if task and not task.done():
                 task.cancel()
+        history_task = self.client_state.history_task
+        if history_task is not None and not history_task.done():
+            history_task.cancel()
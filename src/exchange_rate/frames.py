@@ -0,0 +1,192 @@
+"""
+Exchange rate RPC frames encoded once and shared by all the subscribers
+"""
+
+import sys
+from array import array
+from typing import Any, Dict, List
+
+from db.models.candle import Candle
+from db.models.exchange_rate import Asset, ExchangeRate
+from rpc.codecs import AbstractRPCCodec
+from rpc.frames import RPCFrame
+from settings import settings
+
+
+class ExchangeRatePointFrame(RPCFrame):
+    """`point` frame of a single live ExchangeRate record"""
+
+    __slots__ = ("asset_id", "time", "value")
+
+    def __init__(self, asset: Asset, time: int, value: float):
+        """
+        :param Asset asset: the record asset
+        :param int time: the record time
+        :param float value: the record value
+        """
+        asset_name, asset_id = asset.name, asset.id
+        super().__init__(
+            action="point",
+            message=lambda: {
+                "assetName": asset_name,
+                "assetId": asset_id,
+                "time": time,
+                "value": value,
+            },
+        )
+        self.asset_id: int = asset_id  # type: ignore
+        self.time = time
+        self.value = value
+
+    @classmethod
+    def from_exchange_rate(cls, exchange_rate: ExchangeRate) -> "ExchangeRatePointFrame":
+        """
+        Create a frame of the ExchangeRate record
+        :raises ValueError: if exchange_rate.asset is in the DBLink state
+        """
+        if not isinstance(exchange_rate.asset, Asset):
+            raise ValueError("No Asset assigned to the ExchangeRate object while converting")
+        return cls(exchange_rate.asset, exchange_rate.time, exchange_rate.value)
+
+
+class ExchangeRateAssetHistoryFrame(RPCFrame):
+    """
+    `asset_history` frame of the asset points, the latest first.
+    The binary codecs get the columnar message:
+        `baseTime` - the latest point time;
+        `timeDeltas` - little-endian int32 array of the differences with the previous point time,
+            the 1st one is 0;
+        `values` - little-endian float64 array of the point values
+    """
+
+    __slots__ = ("asset_id", "asset_name", "times", "values", "_compact_frame")
+
+    def __init__(self, asset: Asset, times: List[int], values: List[float]):
+        """
+        :param Asset asset: the points asset
+        :param List[int] times: the points times, the latest first
+        :param List[float] values: the points values
+        """
+        super().__init__(action="asset_history", message=self._build_message)
+        self.asset_id: int = asset.id  # type: ignore
+        self.asset_name = asset.name
+        self.times = times
+        self.values = values
+        self._compact_frame: RPCFrame | None = None
+
+    @property
+    def last_time(self) -> int:
+        """Time of the latest point"""
+        return self.times[0]
+
+    @property
+    def compact_frame(self) -> RPCFrame:
+        """
+        The compact `asset_history` frame of the same points with the asset sent once:
+            `baseTime` - the latest point time;
+            `timeDeltas` - differences with the previous point time, the 1st one is 0;
+            `precision` - number of the value decimal places kept;
+            `values` - the point values multiplied by 10 ** `precision` and rounded
+        """
+        if self._compact_frame is None:
+            self._compact_frame = RPCFrame(action=self.action, message=self._build_compact_message)
+        return self._compact_frame
+
+    def get_message(self, codec: AbstractRPCCodec) -> Dict[str, Any]:
+        """Get the columnar message for the binary codecs and the generic one otherwise"""
+        if codec.binary:
+            return self._build_columnar_message()
+        return self.message
+
+    def _build_columnar_message(self) -> Dict[str, Any]:
+        """Build the columnar message of the time deltas and values arrays"""
+        times = self.times
+        time_deltas = array("i", [0])
+        time_deltas.extend(previous - time for previous, time in zip(times, times[1:]))
+        values = array("d", self.values)
+        if sys.byteorder == "big":
+            time_deltas.byteswap()
+            values.byteswap()
+        return {
+            "assetName": self.asset_name,
+            "assetId": self.asset_id,
+            "baseTime": times[0],
+            "timeDeltas": time_deltas.tobytes(),
+            "values": values.tobytes(),
+        }
+
+    def _build_compact_message(self) -> Dict[str, Any]:
+        """Build the compact message of the time deltas and quantized values"""
+        times = self.times
+        precision = settings.HISTORY_VALUE_PRECISION
+        scale = 10**precision
+        time_deltas = [0]
+        time_deltas.extend(previous - time for previous, time in zip(times, times[1:]))
+        return {
+            "assetName": self.asset_name,
+            "assetId": self.asset_id,
+            "baseTime": times[0],
+            "timeDeltas": time_deltas,
+            "precision": precision,
+            "values": [round(value * scale) for value in self.values],
+        }
+
+    def _build_message(self) -> Dict[str, Any]:
+        """Build the message in the ExchangeRateAssetHistoryMessageModel dump format"""
+        asset_name, asset_id = self.asset_name, self.asset_id
+        points = [
+            {"assetName": asset_name, "assetId": asset_id, "time": time, "value": value}
+            for time, value in zip(self.times, self.values)
+        ]
+        return {"points": points}
+
+
+class CandlesFrame(RPCFrame):
+    """`candles` frame of the asset interval candles in the ascending time order"""
+
+    __slots__ = ("asset_id",)
+
+    def __init__(self, asset: Asset, interval: str, candles: List[Candle]):
+        """
+        :param Asset asset: the candles asset
+        :param str interval: the candles interval
+        :param List[Candle] candles: the candles
+        """
+        asset_name, asset_id = asset.name, asset.id
+        # The open candle may be updated before the frame is encoded
+        values = [candle.to_dict() for candle in candles]
+        super().__init__(
+            action="candles",
+            message=lambda: {
+                "assetName": asset_name,
+                "assetId": asset_id,
+                "interval": interval,
+                "candles": values,
+            },
+        )
+        self.asset_id: int = asset_id  # type: ignore
+
+
+class CandleFrame(RPCFrame):
+    """`candle` frame of the live update of the open candle"""
+
+    __slots__ = ("asset_id",)
+
+    def __init__(self, asset: Asset, interval: str, candle: Candle):
+        """
+        :param Asset asset: the candle asset
+        :param str interval: the candle interval
+        :param Candle candle: the open candle; its values are copied
+        """
+        asset_name, asset_id = asset.name, asset.id
+        values = candle.to_dict()
+        super().__init__(
+            action="candle",
+            message=lambda: {
+                "assetName": asset_name,
+                "assetId": asset_id,
+                "interval": interval,
+                **values,
+            },
+        )
+        self.asset_id: int = asset_id  # type: ignore
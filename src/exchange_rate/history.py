@@ -0,0 +1,186 @@
+"""
+In-memory exchange rate history serving the `asset_history` messages without querying the DB
+"""
+
+import asyncio
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from db.models.exchange_rate import Asset, ExchangeRate, ExchangeRatePoint
+from exchange_rate.frames import ExchangeRateAssetHistoryFrame
+from settings import settings
+
+# Loader of the asset points with time >= time_from in the ascending time order
+PointsFinder = Callable[[Asset, int], Awaitable[List[ExchangeRatePoint]]]
+
+
+class ExchangeRateHistoryBuffer:
+    """
+    Array-backed ring buffer of the (time, value) pairs of a single asset.
+    Pairs must be appended in the ascending time order; the older and duplicate ones are skipped
+    """
+
+    __slots__ = ("_capacity", "_times", "_values", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        """
+        :param int capacity: maximal number of the stored pairs
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive")
+        self._capacity = capacity
+        self._times = array("q", [0]) * capacity
+        self._values = array("d", [0.0]) * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        """Maximal number of the stored pairs"""
+        return self._capacity
+
+    @property
+    def last_time(self) -> int | None:
+        """Time of the latest pair"""
+        if not self._size:
+            return None
+        return self._times[(self._start + self._size - 1) % self._capacity]
+
+    def append(self, time: int, value: float) -> bool:
+        """
+        Append a new pair overwriting the oldest one if the buffer is full
+        :returns bool: whether the pair has been appended
+        """
+        last_time = self.last_time
+        if last_time is not None and time <= last_time:
+            return False
+        if self._size < self._capacity:
+            idx = (self._start + self._size) % self._capacity
+            self._size += 1
+        else:
+            idx = self._start
+            self._start = (self._start + 1) % self._capacity
+        self._times[idx] = time
+        self._values[idx] = value
+        return True
+
+    def since(self, timestamp_from: int) -> Tuple[List[int], List[float]]:
+        """
+        Get the pairs with time >= timestamp_from, the latest first
+        :returns Tuple[List[int], List[float]]: times and values
+        """
+        times: List[int] = []
+        values: List[float] = []
+        for offset in range(self._size - 1, -1, -1):
+            idx = (self._start + offset) % self._capacity
+            time = self._times[idx]
+            if time < timestamp_from:
+                break
+            times.append(time)
+            values.append(self._values[idx])
+        return times, values
+
+
+@dataclass
+class HistoryFrameCacheEntry:
+    """Encoded `asset_history` frame with its expiration timestamp"""
+
+    frame: ExchangeRateAssetHistoryFrame
+    expires_at: float
+
+
+class ExchangeRateHistoryStore:
+    """
+    Per-asset exchange rate history for the last `HISTORY_WINDOW_MINUTES` minutes.
+    Filled from the DB once and appended with the live records afterwards;
+    the encoded `asset_history` frames are cached until the next record
+    """
+
+    def __init__(self, window_minutes: int | None = None):
+        """
+        :param int window_minutes: history window; `HISTORY_WINDOW_MINUTES` by default
+        """
+        self._window = timedelta(minutes=window_minutes or settings.HISTORY_WINDOW_MINUTES)
+        self._capacity = int(self._window.total_seconds())
+        self._buffers: Dict[int, ExchangeRateHistoryBuffer] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._frames: Dict[int, HistoryFrameCacheEntry] = {}
+
+    def get_timestamp_from(self) -> int:
+        """Get the history window start timestamp"""
+        return int((datetime.now() - self._window).timestamp())
+
+    def get_buffer(self, asset: Asset) -> ExchangeRateHistoryBuffer:
+        """Get the asset history buffer; create it on the first call"""
+        buffer = self._buffers.get(asset.id)  # type: ignore
+        if buffer is None:
+            buffer = ExchangeRateHistoryBuffer(self._capacity)
+            self._buffers[asset.id] = buffer  # type: ignore
+        return buffer
+
+    async def backfill(self, asset: Asset, find_points: PointsFinder | None = None) -> None:
+        """
+        Load the asset records missing from the history.
+        Concurrent calls for the same asset share a single query
+        :param Asset asset: the asset
+        :param PointsFinder | None find_points: the points loader; the DB query by default
+        """
+        lock = self._locks.setdefault(asset.id, asyncio.Lock())  # type: ignore
+        async with lock:
+            buffer = self.get_buffer(asset)
+            timestamp_from = self.get_timestamp_from()
+            if buffer.last_time is not None:
+                timestamp_from = max(timestamp_from, buffer.last_time + 1)
+            if find_points is None:
+                points = await ExchangeRate.find_points(
+                    asset.id, time_from=timestamp_from  # type: ignore
+                ).to_list()
+            else:
+                points = await find_points(asset, timestamp_from)
+            for point in points:
+                self.append(asset, point.time, point.value)
+
+    async def warm_up(self, assets: List[Asset], find_points: PointsFinder | None = None) -> None:
+        """Load the history of the assets"""
+        await asyncio.gather(*(self.backfill(asset, find_points) for asset in assets))
+
+    def append(self, asset: Asset, time: int, value: float) -> bool:
+        """
+        Append a live record to the asset history
+        :returns bool: whether the record has been appended; the older and duplicate ones are skipped
+        """
+        if not self.get_buffer(asset).append(time, value):
+            return False
+        self._frames.pop(asset.id, None)  # type: ignore
+        return True
+
+    def append_exchange_rate(self, exchange_rate: ExchangeRate) -> bool:
+        """
+        Append a live ExchangeRate record with the Asset assigned to the asset history
+        :returns bool: whether the record has been appended
+        """
+        return self.append(exchange_rate.asset, exchange_rate.time, exchange_rate.value)  # type: ignore
+
+    def get_history_frame(self, asset: Asset) -> ExchangeRateAssetHistoryFrame | None:
+        """
+        Get the encoded `asset_history` frame of the asset
+        :returns ExchangeRateAssetHistoryFrame | None: the frame; None if there are no points in the window
+        """
+        now = datetime.now().timestamp()
+        cache_entry = self._frames.get(asset.id)  # type: ignore
+        if cache_entry and cache_entry.expires_at > now:
+            return cache_entry.frame
+
+        times, values = self.get_buffer(asset).since(self.get_timestamp_from())
+        if not times:
+            return None
+        frame = ExchangeRateAssetHistoryFrame(asset, times, values)
+        # The frame is outdated once its oldest point leaves the window
+        expires_at = times[-1] + self._window.total_seconds()
+        self._frames[asset.id] = HistoryFrameCacheEntry(frame=frame, expires_at=expires_at)  # type: ignore
+        return frame
@@ -0,0 +1,161 @@
+"""
+Process-wide exchange rate hub fanning the live ExchangeRate records out to the subscribers
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Protocol, Set, Tuple
+
+from loguru import logger as _LOG
+
+from db.models.exchange_rate import Asset, ExchangeRate
+from exchange_rate.frames import ExchangeRateAssetHistoryFrame, ExchangeRatePointFrame
+from exchange_rate.history import ExchangeRateHistoryStore
+from exchange_rate.sources import AbstractExchangeRateSource, get_exchange_rate_source
+
+
+class SubscriberQueue(Protocol):
+    """Queue-like subscriber receiving the live records from the hub"""
+
+    def put_nowait(self, item: Any) -> None:
+        """Put the item into the queue without blocking"""
+
+
+@dataclass
+class AssetChannel:
+    """The per-asset state of the hub: a single feed task shared by all the subscribers"""
+
+    asset: Asset
+    subscribers: Set[SubscriberQueue] = field(default_factory=set)
+    task: asyncio.Task | None = None
+    # Set once the asset history is up to date with the feed
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class ExchangeRateHub:
+    """
+    Exchange rate hub keeping a single source watcher per subscribed asset.
+    Every new ExchangeRate record is appended to the asset history and its encoded frame
+    is put into every subscriber queue of the asset, so the per-tick load on the source,
+    the DB and the encoder does not depend on the number of subscribers
+    """
+
+    def __init__(
+        self,
+        source: AbstractExchangeRateSource | None = None,
+        history: ExchangeRateHistoryStore | None = None,
+        restart_delay_seconds: float = 1,
+    ):
+        """
+        :param AbstractExchangeRateSource source: source of the live ExchangeRate records;
+            the one configured in the settings by default
+        :param ExchangeRateHistoryStore history: in-memory history of the assets
+        :param float restart_delay_seconds: delay before restarting a failed asset feed
+        """
+        self._source: AbstractExchangeRateSource = source or get_exchange_rate_source()
+        self._history: ExchangeRateHistoryStore = history or ExchangeRateHistoryStore()
+        self._restart_delay_seconds = restart_delay_seconds
+        self._channels: Dict[int, AssetChannel] = {}
+
+    def subscribe(self, asset: Asset, queue: SubscriberQueue) -> None:
+        """
+        Subscribe the queue to the live ExchangeRate records of the asset.
+        Start the asset feed on the first subscription
+        """
+        channel = self._channels.get(asset.id)  # type: ignore
+        if channel is None:
+            channel = AssetChannel(asset=asset)
+            self._channels[asset.id] = channel  # type: ignore
+        channel.subscribers.add(queue)
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.create_task(self._run_feed(channel))
+
+    def unsubscribe(self, asset_id: int, queue: SubscriberQueue) -> None:
+        """
+        Unsubscribe the queue from the asset records.
+        Stop the asset feed once the last subscriber is gone
+        """
+        channel = self._channels.get(asset_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if channel.subscribers:
+            return
+        if channel.task and not channel.task.done():
+            channel.task.cancel()
+        del self._channels[asset_id]
+
+    def subscribers_count(self, asset_id: int) -> int:
+        """Get the number of the asset subscribers"""
+        channel = self._channels.get(asset_id)
+        return len(channel.subscribers) if channel else 0
+
+    async def warm_up(self, assets: List[Asset]) -> None:
+        """Load the history of the assets from the source"""
+        await self._history.warm_up(assets, self._source.find_points)
+
+    async def get_history_frame(self, asset: Asset) -> ExchangeRateAssetHistoryFrame | None:
+        """
+        Get the encoded `asset_history` frame of the asset from the in-memory history
+        :returns ExchangeRateAssetHistoryFrame | None: the frame; None if there are no points to return
+        """
+        channel = self._channels.get(asset.id)  # type: ignore
+        if channel is not None:
+            await channel.ready.wait()
+        else:
+            await self._history.backfill(asset, self._source.find_points)
+        return self._history.get_history_frame(asset)
+
+    async def get_points(self, asset: Asset, time_from: int) -> Tuple[List[int], List[float]]:
+        """
+        Get the asset points with time >= time_from from the in-memory history, the latest first
+        :returns Tuple[List[int], List[float]]: times and values
+        """
+        channel = self._channels.get(asset.id)  # type: ignore
+        if channel is not None:
+            await channel.ready.wait()
+        else:
+            await self._history.backfill(asset, self._source.find_points)
+        return self._history.get_buffer(asset).since(time_from)
+
+    async def close(self) -> None:
+        """Stop all the asset feeds and forget the subscribers"""
+        tasks = [channel.task for channel in self._channels.values() if channel.task]
+        self._channels.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def publish(self, channel: AssetChannel, exchange_rate: ExchangeRate) -> None:
+        """
+        Put the ExchangeRate record into the history and its `point` frame into every
+        subscriber queue of the channel. The frame is encoded once for all the subscribers.
+        The records older than the history or already in it, e.g., the latest record
+        re-yielded by a restarted feed, are not sent
+        """
+        if not self._history.append_exchange_rate(exchange_rate):
+            return
+        frame = ExchangeRatePointFrame.from_exchange_rate(exchange_rate)
+        for queue in list(channel.subscribers):
+            queue.put_nowait(frame)
+
+    async def _run_feed(self, channel: AssetChannel) -> None:
+        """Watch the source and fan the records out until cancelled"""
+        while True:
+            try:
+                # Catch up with the records missed while the feed was not running
+                await self._history.backfill(channel.asset, self._source.find_points)
+                channel.ready.set()
+                async for exchange_rate in self._source.watch(channel.asset):
+                    self.publish(channel, exchange_rate)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                _LOG.error(f"The {channel.asset.name} feed has failed: {exc}")
+                # Serve the history at hand instead of blocking the subscribers
+                # until a backfill succeeds
+                channel.ready.set()
+            await asyncio.sleep(self._restart_delay_seconds)
+
+
+exchange_rate_hub = ExchangeRateHub()
@@ -2,19 +2,145 @@
 Exchange rate transformation models
 """
 
-from typing import List
+import base64
+from typing import List, Literal
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 
+from db.models.candle import CandleInterval
 from db.models.exchange_rate import Asset, ExchangeRate
 
 
-class RPCSubscribeMessageModel(BaseModel):
+class RPCAssetIdsMessageModel(BaseModel):
+    """
+    Data model contained in the `message` field of RPCCommandModel
+    to handle the actions on either a single asset or a list of assets
+    """
+
+    asset_id: int | None = Field(default=None, alias="assetId", description="ID of the Asset")
+    asset_ids: List[int] | None = Field(
+        default=None, alias="assetIds", description="IDs of the Assets"
+    )
+
+    @model_validator(mode="after")
+    def validate_asset_ids(self) -> "RPCAssetIdsMessageModel":
+        """Either `assetId` or `assetIds` must be set"""
+        if (self.asset_id is None) == (self.asset_ids is None):
+            raise ValueError("Either assetId or assetIds must be set")
+        return self
+
+    def get_asset_ids(self) -> List[int]:
+        """Get the list of the asset IDs"""
+        if self.asset_ids is not None:
+            return self.asset_ids
+        return [self.asset_id]  # type: ignore
+
+
+class RPCSubscribeMessageModel(RPCAssetIdsMessageModel):
     """
     Data model contained in the `message` field of RPCCommandModel to handle `subscribe`
     """
 
-    asset_id: int = Field(alias="assetId", description="ID of the related Asset")
+    history_format: Literal["points", "compact"] = Field(
+        default="points",
+        alias="historyFormat",
+        description="Shape of the `asset_history` message: the list of points or the compact one",
+    )
+    max_rate_per_second: float | None = Field(
+        default=None,
+        alias="maxRatePerSecond",
+        gt=0,
+        description="The maximum number of points per second; the latest point is sent per window",
+    )
+    min_change: float | None = Field(
+        default=None,
+        alias="minChange",
+        ge=0,
+        description="The minimum value change since the latest point sent",
+    )
+
+
+class RPCCandlesMessageModel(BaseModel):
+    """
+    Data model contained in the `message` field of RPCCommandModel to handle `candles`
+    """
+
+    asset_id: int = Field(alias="assetId", description="ID of the Asset")
+    interval: CandleInterval = Field(default="1m", description="Candle interval")
+    time_from: int | None = Field(
+        default=None, alias="from", description="The minimum candle open time; the latest if None"
+    )
+    time_to: int | None = Field(
+        default=None,
+        alias="to",
+        description="The maximum candle open time; the open candle is streamed live if None",
+    )
+    limit: int = Field(default=500, gt=0, le=5000, description="The maximum number of candles")
+
+
+class RPCHistoryMessageModel(BaseModel):
+    """
+    Data model contained in the `message` field of RPCCommandModel to handle `history`:
+    either `assetId` with `from` or the `cursor` of the previous page must be set
+    """
+
+    asset_id: int | None = Field(default=None, alias="assetId", description="ID of the Asset")
+    time_from: int | None = Field(default=None, alias="from", description="The minimum point time")
+    time_to: int | None = Field(default=None, alias="to", description="The maximum point time")
+    limit: int = Field(
+        default=10_000, gt=0, le=1_000_000, description="The maximum number of points per page"
+    )
+    chunk_size: int = Field(
+        default=1000, alias="chunkSize", gt=0, le=10_000, description="Number of points per message"
+    )
+    cursor: str | None = Field(default=None, description="Resume token of the next page")
+
+    @model_validator(mode="after")
+    def validate_range(self) -> "RPCHistoryMessageModel":
+        """Either `assetId` with `from` or `cursor` must be set"""
+        if self.cursor is None and (self.asset_id is None or self.time_from is None):
+            raise ValueError("Either assetId with from or cursor must be set")
+        return self
+
+    def get_cursor(self) -> "HistoryCursorModel":
+        """
+        Get the position of the requested page
+        :raises ValueError: the resume token is not valid
+        """
+        if self.cursor is not None:
+            return HistoryCursorModel.decode(self.cursor)
+        return HistoryCursorModel(
+            assetId=self.asset_id, timeFrom=self.time_from, timeTo=self.time_to  # type: ignore
+        )
+
+
+class HistoryCursorModel(BaseModel):
+    """Position of the `history` pages encoded into the opaque resume token"""
+
+    asset_id: int = Field(alias="assetId", description="ID of the Asset")
+    time_from: int = Field(alias="timeFrom", description="The minimum time of the page points")
+    time_to: int | None = Field(default=None, alias="timeTo", description="The maximum point time")
+
+    def encode(self) -> str:
+        """Encode the resume token"""
+        return base64.urlsafe_b64encode(self.model_dump_json(by_alias=True).encode()).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> "HistoryCursorModel":
+        """
+        Decode the resume token
+        :raises ValueError: the token is not valid
+        """
+        try:
+            return cls.model_validate_json(base64.urlsafe_b64decode(token.encode()))
+        except (ValueError, ValidationError) as exc:
+            raise ValueError("Invalid history cursor") from exc
+
+
+class RPCUnsubscribeMessageModel(RPCAssetIdsMessageModel):
+    """
+    Data model contained in the `message` field of RPCCommandModel to handle `unsubscribe`
+    """
 
 
 class ExchangeRatePointModel(BaseModel):
@@ -0,0 +1,139 @@
+"""
+In-process registry of the assets resolving the asset IDs and names without querying the DB
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, List
+
+from loguru import logger as _LOG
+
+from db.models.exchange_rate import Asset
+from exchange_rate.models import AssetsMessageModel
+from rpc.frames import RPCFrame
+from settings import settings
+
+
+class AssetRegistry:
+    """
+    Registry of the assets by ID and name with the pre-encoded `assets` response frame.
+    The assets are loaded from the DB on startup and refreshed periodically by `run_refresh`
+    or on the next access after `invalidate`. An unknown ID or name reloads the assets,
+    at most once per `reload_interval_seconds`, so the assets added meanwhile are resolved too
+    """
+
+    def __init__(
+        self,
+        refresh_interval_seconds: float | None = None,
+        reload_interval_seconds: float = 5,
+    ):
+        """
+        :param float | None refresh_interval_seconds: interval between the periodic reloads;
+            `ASSET_REGISTRY_REFRESH_SECONDS` by default
+        :param float reload_interval_seconds: the minimum interval between the reloads on a miss
+        """
+        self._refresh_interval_seconds = refresh_interval_seconds
+        self._reload_interval_seconds = reload_interval_seconds
+        self._assets: Dict[int, Asset] = {}
+        self._assets_by_name: Dict[str, Asset] = {}
+        self._assets_frame: RPCFrame | None = None
+        self._loaded_at = float("-inf")
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    @property
+    def assets(self) -> List[Asset]:
+        """The loaded assets ordered by ID"""
+        return sorted(self._assets.values(), key=lambda asset: asset.id)  # type: ignore
+
+    async def load(self) -> None:
+        """Load all the assets from the DB and encode the `assets` response frame"""
+        assets = await Asset.find().sort(+Asset.id).to_list()  # type: ignore
+        self._assets = {asset.id: asset for asset in assets}  # type: ignore
+        self._assets_by_name = {asset.name: asset for asset in assets}
+        message = AssetsMessageModel(assets=assets).model_dump()
+        self._assets_frame = RPCFrame(action="assets", message=message)
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    def invalidate(self) -> None:
+        """Reload the assets on the next access, e.g., once an asset is created"""
+        self._stale = True
+
+    def clear(self) -> None:
+        """Forget the loaded assets"""
+        self._assets = {}
+        self._assets_by_name = {}
+        self._assets_frame = None
+        self._loaded_at = float("-inf")
+        self._stale = True
+
+    async def run_refresh(self) -> None:
+        """Reload the assets periodically until cancelled"""
+        interval = self._refresh_interval_seconds or settings.ASSET_REGISTRY_REFRESH_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load()
+            except Exception as exc:
+                _LOG.error(f"Could not refresh the assets: {exc}")
+
+    async def get_assets_frame(self) -> RPCFrame:
+        """Get the pre-encoded `assets` response frame"""
+        await self._reload_if_stale()
+        return self._assets_frame  # type: ignore
+
+    async def get(self, asset_id: int) -> Asset | None:
+        """
+        Get the asset by ID
+        :returns Asset | None: the asset; None if it does not exist
+        """
+        await self._reload_if_stale()
+        asset = self._assets.get(asset_id)
+        if asset is None:
+            await self._reload_on_miss()
+            asset = self._assets.get(asset_id)
+        return asset
+
+    async def get_by_name(self, name: str) -> Asset | None:
+        """
+        Get the asset by name
+        :returns Asset | None: the asset; None if it does not exist
+        """
+        await self._reload_if_stale()
+        asset = self._assets_by_name.get(name)
+        if asset is None:
+            await self._reload_on_miss()
+            asset = self._assets_by_name.get(name)
+        return asset
+
+    async def get_many(self, asset_ids: Iterable[int]) -> Dict[int, Asset]:
+        """
+        Get the existing assets by IDs
+        :returns Dict[int, Asset]: the assets by ID; the missing IDs are skipped
+        """
+        await self._reload_if_stale()
+        asset_ids = list(asset_ids)
+        if any(asset_id not in self._assets for asset_id in asset_ids):
+            await self._reload_on_miss()
+        return {
+            asset_id: self._assets[asset_id] for asset_id in asset_ids if asset_id in self._assets
+        }
+
+    async def _reload_if_stale(self) -> None:
+        """Reload the assets if they have not been loaded yet or have been invalidated"""
+        if not self._stale:
+            return
+        async with self._lock:
+            if self._stale:
+                await self.load()
+
+    async def _reload_on_miss(self) -> None:
+        """Reload the assets unless they have been loaded recently"""
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < self._reload_interval_seconds:
+                return
+            await self.load()
+
+
+asset_registry = AssetRegistry()
@@ -4,31 +4,50 @@ Exchange rate application router
 
 import asyncio
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 from pydantic import ValidationError
 
-from exchange_rate.client_service import AbstractExchangeRateClientService
-from exchange_rate.models import RPCSubscribeMessageModel
+from exchange_rate.client_service import (
+    AbstractExchangeRateClientService,
+    AssetSubscriptionOptions,
+)
+from exchange_rate.frames import CandleFrame, ExchangeRatePointFrame
+from exchange_rate.models import (
+    RPCCandlesMessageModel,
+    RPCHistoryMessageModel,
+    RPCSubscribeMessageModel,
+    RPCUnsubscribeMessageModel,
+)
 from exchange_rate.utils import single_error_rpc_response
 from exchange_rate.connection_service import (
     AbstractExchangeRateRPCConnectionService,
     ExchangeRateRPCConnectionService,
 )
-from rpc.models import RPCErrorMessageModel, RPCCommandModel
+from rpc.codecs import JSON_CODEC, get_codec
+from rpc.exceptions import RPCSendQueueClosedError
+from rpc.models import RPCErrorMessageModel, RPCCommandModel, RPCFormatMessageModel
 
 
 router = APIRouter()
 
 
 @router.websocket("/")
-async def exchange_rate(websocket: WebSocket):
+async def exchange_rate(
+    websocket: WebSocket,
+    frames_format: str = Query(default=JSON_CODEC.name, alias="format"),
+):
     """
     Subscribe to relevant, up-to-date exchange rates
+    :param str frames_format: format of the frames, e.g., `json` (default) or `msgpack`
     """
+    codec = get_codec(frames_format)
     connection_service: AbstractExchangeRateRPCConnectionService = ExchangeRateRPCConnectionService(
-        websocket
+        websocket, codec=codec
     )
     await connection_service.connect()
+    if codec is None:
+        error_rpc_response = single_error_rpc_response("format", "Unknown format")
+        await connection_service.send_message(error_rpc_response)
     try:
         while True:
             await wait_and_handle_rpc_message(connection_service)
@@ -58,6 +77,14 @@ async def wait_and_handle_rpc_message(
 
         case "subscribe":
             await handle_subscribe_action(connection_service, rpc_message)
+        case "unsubscribe":
+            await handle_unsubscribe_action(connection_service, rpc_message)
+        case "candles":
+            await handle_candles_action(connection_service, rpc_message)
+        case "history":
+            await handle_history_action(connection_service, rpc_message)
+        case "format":
+            await handle_format_action(connection_service, rpc_message)
         case _:
             error_rpc_response = single_error_rpc_response(rpc_message.action, "Unknown action")
             await connection_service.send_message(error_rpc_response)
@@ -69,6 +96,10 @@ async def handle_subscribe_action(
     connection_service: AbstractExchangeRateRPCConnectionService,
     rpc_message: RPCCommandModel,
 ) -> None:
+    """
+    Subscribe to the assets: `assetId` replaces the current subscriptions,
+    `assetIds` are added to them
+    """
     try:
         rpc_subscribe_message_model = RPCSubscribeMessageModel(**rpc_message.message)
     except ValidationError as exception:
@@ -80,23 +111,168 @@ async def handle_subscribe_action(
     client_service: AbstractExchangeRateClientService = (
         connection_service.get_exchange_rate_service()
     )
-    switch_asset_id_error_message = await client_service.rpc_switch_asset_id(
-        rpc_subscribe_message_model.asset_id
+    options = AssetSubscriptionOptions(
+        history_format=rpc_subscribe_message_model.history_format,
+        max_rate_per_second=rpc_subscribe_message_model.max_rate_per_second,
+        min_change=rpc_subscribe_message_model.min_change,
+    )
+    if rpc_subscribe_message_model.asset_ids is not None:
+        subscribe_error_message = await client_service.rpc_subscribe_asset_ids(
+            rpc_subscribe_message_model.asset_ids, options=options
+        )
+    else:
+        subscribe_error_message = await client_service.rpc_switch_asset_id(
+            rpc_subscribe_message_model.asset_id, options=options
+        )
+    if subscribe_error_message:
+        await connection_service.send_message(subscribe_error_message)
+        return
+    start_streaming(connection_service)
+
+
+async def handle_candles_action(
+    connection_service: AbstractExchangeRateRPCConnectionService,
+    rpc_message: RPCCommandModel,
+) -> None:
+    """
+    Send the asset candles range and stream the live updates of the open candle
+    unless the range end is set
+    """
+    try:
+        rpc_candles_message_model = RPCCandlesMessageModel(**rpc_message.message)
+    except ValidationError as exception:
+        error_message = RPCErrorMessageModel.from_validation_error(exception)
+        await connection_service.send_message(error_message)
+        return
+
+    client_service: AbstractExchangeRateClientService = (
+        connection_service.get_exchange_rate_service()
+    )
+    candles_error_message = await client_service.rpc_candles(
+        rpc_candles_message_model.asset_id,
+        rpc_candles_message_model.interval,
+        time_from=rpc_candles_message_model.time_from,
+        time_to=rpc_candles_message_model.time_to,
+        limit=rpc_candles_message_model.limit,
     )
-    if switch_asset_id_error_message:
-        await connection_service.send_message(switch_asset_id_error_message)
+    if candles_error_message:
+        await connection_service.send_message(candles_error_message)
         return
+    start_streaming(connection_service)
+
 
-    # Do not proceed if subscribed to another asset ID
-    last_rpc_command = connection_service.get_last_rpc_command()
-    if last_rpc_command and last_rpc_command.action == "subscribe":
+async def handle_history_action(
+    connection_service: AbstractExchangeRateRPCConnectionService,
+    rpc_message: RPCCommandModel,
+) -> None:
+    """
+    Stream the history page in the background not to block the other commands;
+    a new request cancels the page being streamed
+    """
+    try:
+        rpc_history_message_model = RPCHistoryMessageModel(**rpc_message.message)
+        cursor = rpc_history_message_model.get_cursor()
+    except ValidationError as exception:
+        error_message = RPCErrorMessageModel.from_validation_error(exception)
+        await connection_service.send_message(error_message)
+        return
+    except ValueError as exception:
+        error_rpc_response = single_error_rpc_response(rpc_message.action, str(exception))
+        await connection_service.send_message(error_rpc_response)
         return
 
-    # Wrap the async outputs into a single async function
+    client_service: AbstractExchangeRateClientService = (
+        connection_service.get_exchange_rate_service()
+    )
+
+    # The chunks are read from the DB as fast as the client receives them
+    async def yield_history_messages():
+        messages = client_service.rpc_history(
+            cursor,
+            limit=rpc_history_message_model.limit,
+            chunk_size=rpc_history_message_model.chunk_size,
+        )
+        try:
+            async for message in messages:  # type: ignore
+                await connection_service.put_message(message)
+        except RPCSendQueueClosedError:
+            # The connection is being closed
+            pass
+        finally:
+            await messages.aclose()  # type: ignore
+
+    task = asyncio.create_task(yield_history_messages())
+    connection_service.set_history_task(task)
+
+
+def start_streaming(connection_service: AbstractExchangeRateRPCConnectionService) -> None:
+    """
+    Start the task streaming the messages of all the subscribed assets unless it is running
+    """
+    if connection_service.has_pending_tasks():
+        return
+    client_service: AbstractExchangeRateClientService = (
+        connection_service.get_exchange_rate_service()
+    )
+
+    # Wrap the async outputs into a single async function;
+    # the messages are queued not to wait for a slow client,
+    # the points and the open candle updates are conflated per asset
     async def yield_exchange_rate_messages():
         async for message in client_service.rpc_subscribe():  # type: ignore
-            await connection_service.send_message(message)
+            key = None
+            if isinstance(message, ExchangeRatePointFrame):
+                key = message.asset_id
+            elif isinstance(message, CandleFrame):
+                key = (message.action, message.asset_id)
+            connection_service.enqueue_message(message, key=key)
 
     task = asyncio.create_task(yield_exchange_rate_messages())
     connection_service.add_task(task)
-    return
+
+
+async def handle_unsubscribe_action(
+    connection_service: AbstractExchangeRateRPCConnectionService,
+    rpc_message: RPCCommandModel,
+) -> None:
+    """
+    Unsubscribe from the assets
+    """
+    try:
+        rpc_unsubscribe_message_model = RPCUnsubscribeMessageModel(**rpc_message.message)
+    except ValidationError as exception:
+        error_message = RPCErrorMessageModel.from_validation_error(exception)
+        await connection_service.send_message(error_message)
+        return
+
+    client_service: AbstractExchangeRateClientService = (
+        connection_service.get_exchange_rate_service()
+    )
+    client_service.rpc_unsubscribe_asset_ids(rpc_unsubscribe_message_model.get_asset_ids())
+
+
+async def handle_format_action(
+    connection_service: AbstractExchangeRateRPCConnectionService,
+    rpc_message: RPCCommandModel,
+) -> None:
+    """
+    Switch the connection frames format; the reply is sent in the new format
+    """
+    try:
+        rpc_format_message_model = RPCFormatMessageModel(**rpc_message.message)
+    except ValidationError as exception:
+        error_message = RPCErrorMessageModel.from_validation_error(exception)
+        await connection_service.send_message(error_message)
+        return
+
+    codec = get_codec(rpc_format_message_model.format)
+    if codec is None:
+        error_rpc_response = single_error_rpc_response(rpc_message.action, "Unknown format")
+        await connection_service.send_message(error_rpc_response)
+        return
+
+    connection_service.set_codec(codec)
+    rpc_format_message = RPCCommandModel(
+        action=rpc_message.action, message=rpc_format_message_model.model_dump()
+    )
+    await connection_service.send_message(rpc_format_message)
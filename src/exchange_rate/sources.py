@@ -0,0 +1,382 @@
+"""
+Sources of the live ExchangeRate records feeding the exchange rate hub
+"""
+
+import abc
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Set
+
+from loguru import logger as _LOG
+from pymongo.errors import OperationFailure, PyMongoError
+
+from db.models.exchange_rate import Asset, ExchangeRate, ExchangeRatePoint
+from db.shared_rates import SharedRatesTable
+from relay.protocol import RelayProtocolError, encode_frame, open_connection, read_frame
+from settings import settings
+
+# Error codes of a deployment without the change streams support (no replica set)
+CHANGE_STREAMS_UNSUPPORTED_CODES = (
+    40573,  # The $changeStream stage is only supported on replica sets
+    40324,  # Unrecognized pipeline stage name: '$changeStream'
+    166,  # CommandNotSupportedOnView: the time-series collections are views over the buckets
+)
+
+
+class AbstractExchangeRateSource(abc.ABC):
+    """Abstract source of the new ExchangeRate records of a single asset"""
+
+    @abc.abstractmethod
+    def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:
+        """
+        Yield the new ExchangeRate records of the asset as soon as they are available.
+        The yielded records must have the `asset` field set to the Asset instance
+        :param Asset asset: the asset to watch
+        """
+
+    async def find_points(self, asset: Asset, time_from: int) -> List[ExchangeRatePoint]:
+        """
+        Find the asset points with time >= time_from in the ascending time order
+        to fill the in-memory history; read from the DB by default
+        """
+        return await ExchangeRate.find_points(asset.id, time_from=time_from).to_list()  # type: ignore
+
+
+class PollingExchangeRateSource(AbstractExchangeRateSource):
+    """
+    Source polling the DB for the latest ExchangeRate record of the asset
+    """
+
+    def __init__(self, idle_sleep_seconds: float = 0.2):
+        """
+        :param float idle_sleep_seconds: sleep time when the next record is already overdue
+        """
+        self._idle_sleep_seconds = idle_sleep_seconds
+
+    @staticmethod
+    async def find_latest(asset: Asset) -> ExchangeRate | None:
+        """
+        Find the latest ExchangeRate record of the asset.
+        Only the time and the value are fetched; the asset is assigned instead of fetching the link
+        """
+        point = await ExchangeRate.find_points(
+            asset.id, latest_first=True  # type: ignore
+        ).first_or_none()
+        if point is None:
+            return None
+        return ExchangeRate.from_point(asset, point)
+
+    async def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:  # type: ignore
+        """
+        Poll the DB for the new ExchangeRate records of the asset
+        """
+        last_er = await self.find_latest(asset)
+        while True:
+            exchange_rate = await self.find_latest(asset)
+
+            # The records are unique per (asset, time)
+            if exchange_rate and (last_er is None or last_er.time != exchange_rate.time):
+                last_er = exchange_rate
+                yield exchange_rate
+
+            sleep_timedelta = -1.0
+            if last_er:
+                sleep_timedelta = last_er.time + 1 - datetime.now().timestamp()
+            if sleep_timedelta > 0:
+                await asyncio.sleep(sleep_timedelta)
+            else:
+                await asyncio.sleep(self._idle_sleep_seconds)
+
+
+class ChangeStreamExchangeRateSource(AbstractExchangeRateSource):
+    """
+    Source pushing the new ExchangeRate records from the MongoDB change stream
+    as soon as the ingestion worker inserts them.
+    Falls back to the polling source if the deployment does not support change streams
+    """
+
+    def __init__(self, fallback: AbstractExchangeRateSource | None = None):
+        """
+        :param AbstractExchangeRateSource fallback: source to use without change streams
+        """
+        self._fallback: AbstractExchangeRateSource = fallback or PollingExchangeRateSource()
+        self._change_streams_supported: bool | None = None
+
+    @staticmethod
+    def get_pipeline(asset: Asset) -> List[Dict[str, Any]]:
+        """
+        Get the change stream pipeline matching the inserted records of the asset;
+        only the time and the value of the documents are sent
+        """
+        return [
+            {
+                "$match": {
+                    "operationType": "insert",
+                    "fullDocument.asset.$id": asset.id,
+                }
+            },
+            {"$project": {"fullDocument.time": 1, "fullDocument.value": 1}},
+        ]
+
+    async def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:  # type: ignore
+        """
+        Watch the inserted ExchangeRate records of the asset
+        """
+        if self._change_streams_supported is not False:
+            collection = ExchangeRate.get_motor_collection()
+            try:
+                async with collection.watch(self.get_pipeline(asset)) as change_stream:
+                    # The stream is opened lazily; make sure it is open before yielding anything
+                    change = await change_stream.try_next()
+                    self._change_streams_supported = True
+
+                    # Cover the records inserted before the stream was opened
+                    latest_er = await PollingExchangeRateSource.find_latest(asset)
+                    last_time = None
+                    if latest_er:
+                        last_time = latest_er.time
+                        yield latest_er
+
+                    while True:
+                        if change is not None:
+                            point = ExchangeRatePoint.model_validate(change["fullDocument"])
+                            # The first change may be older than the latest record yielded
+                            if last_time is None or point.time > last_time:
+                                last_time = point.time
+                                yield ExchangeRate.from_point(asset, point)
+                        change = await change_stream.next()
+            except OperationFailure as exc:
+                if exc.code not in CHANGE_STREAMS_UNSUPPORTED_CODES:
+                    raise
+                _LOG.warning(f"Change streams are not supported, falling back to polling: {exc}")
+                self._change_streams_supported = False
+
+        async for exchange_rate in self._fallback.watch(asset):
+            yield exchange_rate
+
+
+class SharedRatesExchangeRateSource(AbstractExchangeRateSource):
+    """
+    Source reading the latest points published by the ingestion process
+    into the shared-memory rates table, so neither the live points nor the history
+    are read from the DB. The table is attached once the ingestion process has created it
+    """
+
+    def __init__(
+        self,
+        table_name: str | None = None,
+        poll_interval_seconds: float | None = None,
+        reattach_after_seconds: float = 5,
+    ):
+        """
+        :param str table_name: the shared memory name; `SHARED_RATES_TABLE_NAME` by default
+        :param float poll_interval_seconds: interval between checking the asset slot for new points;
+            `SHARED_RATES_POLL_INTERVAL_SECONDS` by default
+        :param float reattach_after_seconds: time without new points to check the table
+            has been recreated after
+        """
+        self._table_name = table_name or settings.SHARED_RATES_TABLE_NAME
+        self._poll_interval_seconds = (
+            poll_interval_seconds or settings.SHARED_RATES_POLL_INTERVAL_SECONDS
+        )
+        self._reattach_after_seconds = reattach_after_seconds
+        self._table: SharedRatesTable | None = None
+
+    def get_table(self) -> SharedRatesTable | None:
+        """Get the attached table; None if the ingestion process has not created it yet"""
+        if self._table is None:
+            try:
+                self._table = SharedRatesTable.attach(self._table_name)
+            except FileNotFoundError:
+                return None
+        return self._table
+
+    def reattach(self) -> None:
+        """Attach to the table recreated by a restarted ingestion process, if any"""
+        try:
+            table = SharedRatesTable.attach(self._table_name)
+        except FileNotFoundError:
+            return
+        if self._table is not None and self._table.token == table.token:
+            table.close()
+            return
+        _LOG.info(f"Attached to the recreated shared rates table {self._table_name}")
+        if self._table is not None:
+            self._table.close()
+        self._table = table
+
+    async def find_points(self, asset: Asset, time_from: int) -> List[ExchangeRatePoint]:
+        """Find the asset points with time >= time_from in the table"""
+        table = self.get_table()
+        if table is None:
+            _LOG.warning(f"The shared rates table {self._table_name} has not been created yet")
+            return []
+        times, values = table.read(asset.id, time_from=time_from)  # type: ignore
+        return [
+            ExchangeRatePoint.model_construct(time=point_time, value=value)
+            for point_time, value in zip(times, values)
+        ]
+
+    async def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:  # type: ignore
+        """
+        Poll the asset slot for the points appended since the last check
+        """
+        last_time: int | None = None
+        count = 0
+        changed_at = time.monotonic()
+        while True:
+            table = self.get_table()
+            if time.monotonic() - changed_at > self._reattach_after_seconds:
+                # The ingestion process may have been restarted with a new table
+                changed_at = time.monotonic()
+                self.reattach()
+                table = self.get_table()
+            if table is not None and table.get_count(asset.id) != count:  # type: ignore
+                changed_at = time.monotonic()
+                count = table.get_count(asset.id)  # type: ignore
+                times, values = table.read(
+                    asset.id, time_from=None if last_time is None else last_time + 1  # type: ignore
+                )
+                if last_time is None:
+                    # Start with the latest point like the other sources
+                    times, values = times[-1:], values[-1:]
+                for point_time, value in zip(times, values):
+                    point = ExchangeRatePoint.model_construct(time=point_time, value=value)
+                    yield ExchangeRate.from_point(asset, point)
+                    last_time = point_time
+            await asyncio.sleep(self._poll_interval_seconds)
+
+
+class RelayExchangeRateSource(AbstractExchangeRateSource):
+    """
+    Source receiving the saved batches from the tick relay: the node keeps a single
+    subscription for all the watched assets instead of polling or watching the DB per asset.
+    The publisher numbers the batches, so a missed batch - dropped by the publisher,
+    lost with a connection or published by a restarted publisher - is detected
+    and the watched assets are backfilled from the DB, which saves the batches first.
+    The first batch of the source is a gap too: the points saved since the latest ones
+    of the DB read by `watch` are backfilled.
+    A failed backfill is retried on the next batch: the batches are not delivered meanwhile
+    not to skip the missed points
+    """
+
+    def __init__(self, address: str | None = None, reconnect_delay_seconds: float = 1):
+        """
+        :param str address: the relay address; `TICK_RELAY_ADDRESS` by default
+        :param float reconnect_delay_seconds: time to wait before reconnecting to the relay
+        """
+        self._address = address or settings.TICK_RELAY_ADDRESS
+        self._reconnect_delay_seconds = reconnect_delay_seconds
+        self._watchers: Dict[int, Set[asyncio.Queue[ExchangeRatePoint]]] = {}
+        # The latest time of every watched asset delivered to the watchers
+        self._last_times: Dict[int, int] = {}
+        self._subscription: asyncio.Task | None = None
+        self._epoch: int | None = None
+        self._seq = 0
+        # Whether the missed batches are to be backfilled, the ones before the first batch at start
+        self._gap = True
+        self.gaps = 0
+
+    async def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:  # type: ignore
+        """
+        Yield the relayed points of the asset starting with the latest one in the DB
+        """
+        asset_id: int = asset.id  # type: ignore
+        queue: asyncio.Queue[ExchangeRatePoint] = asyncio.Queue()
+        self._watchers.setdefault(asset_id, set()).add(queue)
+        if self._subscription is None or self._subscription.done():
+            self._subscription = asyncio.create_task(self._subscribe())
+        try:
+            latest_er = await PollingExchangeRateSource.find_latest(asset)
+            if latest_er and latest_er.time > self._last_times.get(asset_id, latest_er.time - 1):
+                self._last_times[asset_id] = latest_er.time
+                yield latest_er
+            # The asset without the stored points is backfilled from the start
+            self._last_times.setdefault(asset_id, 0)
+            while True:
+                yield ExchangeRate.from_point(asset, await queue.get())
+        finally:
+            watchers = self._watchers.get(asset_id, set())
+            watchers.discard(queue)
+            if not watchers:
+                self._watchers.pop(asset_id, None)
+                self._last_times.pop(asset_id, None)
+            if not self._watchers and self._subscription is not None:
+                self._subscription.cancel()
+                self._subscription = None
+
+    async def on_batch(self, message: Dict[str, Any]) -> None:
+        """Deliver the relayed batch backfilling the missed ones first"""
+        epoch, seq = message["epoch"], message["seq"]
+        if self._gap or epoch != self._epoch or seq != self._seq + 1:
+            if not self._gap:
+                self._gap = True
+                self.gaps += 1
+                _LOG.warning(
+                    f"Tick relay gap: {self._epoch}/{self._seq} -> {epoch}/{seq}, backfilling"
+                )
+            try:
+                await self.backfill()
+            except PyMongoError as exc:
+                # The gap is kept: the batch points are backfilled with the next batch
+                _LOG.error(f"Tick relay backfill has failed, retrying on the next batch: {exc!r}")
+                return
+            self._gap = False
+        self._epoch, self._seq = epoch, seq
+        for asset_id, point_time, value in message["points"]:
+            self._deliver(asset_id, point_time, value)
+
+    async def backfill(self) -> None:
+        """Deliver the points of the watched assets saved after the delivered ones"""
+        for asset_id, last_time in list(self._last_times.items()):
+            points = await ExchangeRate.find_points(asset_id, time_from=last_time + 1).to_list()
+            for point in points:
+                self._deliver(asset_id, point.time, point.value)
+
+    def _deliver(self, asset_id: int, point_time: int, value: float) -> None:
+        """Put the point to the asset watchers unless it has been delivered"""
+        watchers = self._watchers.get(asset_id)
+        if not watchers or point_time <= self._last_times.get(asset_id, point_time - 1):
+            return
+        self._last_times[asset_id] = point_time
+        point = ExchangeRatePoint.model_construct(time=point_time, value=value)
+        for queue in watchers:
+            queue.put_nowait(point)
+
+    async def _subscribe(self) -> None:
+        """Receive the relayed batches, reconnecting until cancelled"""
+        while True:
+            try:
+                reader, writer = await open_connection(self._address)
+            except OSError as exc:
+                _LOG.warning(f"Could not connect to the tick relay {self._address}: {exc}")
+                await asyncio.sleep(self._reconnect_delay_seconds)
+                continue
+            _LOG.info(f"Subscribed to the tick relay {self._address}")
+            try:
+                writer.write(encode_frame({"type": "hello", "role": "subscriber"}))
+                await writer.drain()
+                while True:
+                    message = await read_frame(reader)
+                    if message.get("type") == "batch":
+                        await self.on_batch(message)
+            except (asyncio.IncompleteReadError, ConnectionError, RelayProtocolError) as exc:
+                _LOG.warning(f"Tick relay subscription lost: {exc!r}")
+            except Exception as exc:
+                # Resubscribe instead of leaving the watchers waiting forever
+                _LOG.error(f"Tick relay subscription has failed: {exc!r}")
+            finally:
+                writer.close()
+            await asyncio.sleep(self._reconnect_delay_seconds)
+
+
+def get_exchange_rate_source() -> AbstractExchangeRateSource:
+    """Get the live ExchangeRate records source configured in the settings"""
+    if settings.EXCHANGE_RATE_SOURCE == "polling":
+        return PollingExchangeRateSource()
+    if settings.EXCHANGE_RATE_SOURCE == "shared_memory":
+        return SharedRatesExchangeRateSource()
+    if settings.EXCHANGE_RATE_SOURCE == "relay":
+        return RelayExchangeRateSource()
+    return ChangeStreamExchangeRateSource()
@@ -0,0 +1,23 @@
+"""
+Test sources of the live ExchangeRate records
+"""
+
+import asyncio
+from typing import AsyncGenerator, Dict
+
+from db.models.exchange_rate import Asset, ExchangeRate
+from exchange_rate.sources import AbstractExchangeRateSource
+
+
+class QueueExchangeRateSource(AbstractExchangeRateSource):
+    """Source yielding the records put into its per-asset queues"""
+
+    def __init__(self):
+        self.watch_calls: Dict[int, int] = {}
+        self.queues: Dict[int, asyncio.Queue] = {}
+
+    async def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:  # type: ignore
+        self.watch_calls[asset.id] = self.watch_calls.get(asset.id, 0) + 1  # type: ignore
+        queue = self.queues.setdefault(asset.id, asyncio.Queue())  # type: ignore
+        while True:
+            yield await queue.get()
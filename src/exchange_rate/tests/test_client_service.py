@@ -0,0 +1,271 @@
+"""
+Test the exchange rate client service
+"""
+
+import asyncio
+from datetime import datetime
+from typing import AsyncGenerator, List
+
+import pytest
+import pytest_asyncio
+
+from db.archive import ExchangeRateArchive
+from db.models.candle import Candle, get_candle_time
+from db.models.exchange_rate import Asset, ExchangeRate
+from exchange_rate.client_service import AssetSubscriptionOptions, ExchangeRateClientService
+from exchange_rate.frames import (
+    CandleFrame,
+    CandlesFrame,
+    ExchangeRateAssetHistoryFrame,
+    ExchangeRatePointFrame,
+)
+from exchange_rate.history import ExchangeRateHistoryStore
+from exchange_rate.hub import ExchangeRateHub
+from exchange_rate.models import HistoryCursorModel
+from exchange_rate.tests.sources import QueueExchangeRateSource
+
+
+class ClientServiceStream:
+    """The client service of a hub fed by the test source and its stream of frames"""
+
+    def __init__(self):
+        self.source = QueueExchangeRateSource()
+        self.history = ExchangeRateHistoryStore()
+        self.hub = ExchangeRateHub(source=self.source, history=self.history)
+        self.service = ExchangeRateClientService(hub=self.hub)
+        self._stream = None
+
+    async def receive(self):
+        """Receive the next frame, subscribing to the stream on the first call"""
+        if self._stream is None:
+            self._stream = self.service.rpc_subscribe()
+        return await asyncio.wait_for(self._stream.__anext__(), timeout=1)  # type: ignore
+
+    def push(self, asset: Asset, time: int, value: float) -> None:
+        """Put the exchange rate into the source feed of the asset"""
+        exchange_rate = ExchangeRate(asset=asset, time=time, value=value)
+        self.source.queues[asset.id].put_nowait(exchange_rate)  # type: ignore
+
+    async def close(self) -> None:
+        """Close the stream and the hub"""
+        if self._stream is not None:
+            await self._stream.aclose()  # type: ignore
+        self.service.rpc_unsubscribe_asset_ids(None)
+        await self.hub.close()
+
+
+@pytest_asyncio.fixture()
+async def client_stream() -> AsyncGenerator[ClientServiceStream, None]:
+    """Yield the client service of a hub fed by the test source"""
+    client_stream = ClientServiceStream()
+    yield client_stream
+    await client_stream.close()
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_client_service__multiple_assets(
+    assets: List[Asset], client_stream: ClientServiceStream
+):
+    """
+    Test the client service: the points of several assets are multiplexed into a single stream
+    """
+    service, hub, receive = client_stream.service, client_stream.hub, client_stream.receive
+    eurusd, usdjpy = assets[0], assets[1]
+    now_timestamp = int(datetime.now().timestamp())
+    for asset in (eurusd, usdjpy):
+        client_stream.history.append(asset, now_timestamp, 1.17)
+
+    # Unknown assets are reported and nothing is subscribed
+    error_message = await service.rpc_subscribe_asset_ids([eurusd.id, 1000])  # type: ignore
+    assert error_message is not None
+    assert error_message.errors == [{"msg": "Asset with id=1000 does not exist"}]
+    assert service.asset_ids == []
+
+    assert await service.rpc_subscribe_asset_ids([eurusd.id, usdjpy.id]) is None  # type: ignore
+
+    # The history of every asset comes first
+    history_frames = [await receive(), await receive()]
+    assert all(isinstance(frame, ExchangeRateAssetHistoryFrame) for frame in history_frames)
+    assert [frame.asset_id for frame in history_frames] == [eurusd.id, usdjpy.id]
+
+    # The live points are tagged by asset
+    for asset in (eurusd, usdjpy):
+        client_stream.push(asset, now_timestamp + 1, 1.18)
+    point_frames = [await receive(), await receive()]
+    assert all(isinstance(frame, ExchangeRatePointFrame) for frame in point_frames)
+    assert [frame.message["assetId"] for frame in point_frames] == [eurusd.id, usdjpy.id]
+
+    # Unsubscribe from a single asset
+    service.rpc_unsubscribe_asset_ids([eurusd.id])  # type: ignore
+    assert service.asset_ids == [usdjpy.id]
+    assert hub.subscribers_count(eurusd.id) == 0  # type: ignore
+
+    client_stream.push(usdjpy, now_timestamp + 2, 1.19)
+    point_frame = await receive()
+    assert point_frame.message["assetId"] == usdjpy.id
+
+    service.rpc_unsubscribe_asset_ids(None)
+    assert hub.subscribers_count(usdjpy.id) == 0  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_client_service__throttling(
+    assets: List[Asset], client_stream: ClientServiceStream
+):
+    """
+    Test the client service: the points are rate limited and filtered by the value change;
+    the latest point is sent once the rate limit window closes
+    """
+    service, receive = client_stream.service, client_stream.receive
+    eurusd = assets[0]
+    now_timestamp = int(datetime.now().timestamp())
+    client_stream.history.append(eurusd, now_timestamp, 1.17)
+
+    options = AssetSubscriptionOptions(max_rate_per_second=10, min_change=0.01)
+    assert await service.rpc_switch_asset_id(eurusd.id, options=options) is None  # type: ignore
+
+    history_frame = await receive()
+    assert isinstance(history_frame, ExchangeRateAssetHistoryFrame)
+
+    def push(time_offset: int, value: float) -> None:
+        client_stream.push(eurusd, now_timestamp + time_offset, value)
+
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    # Filtered by the value change, then conflated within the window
+    push(1, 1.175)
+    push(2, 1.19)
+    push(3, 1.2)
+    point_frame = await receive()
+    assert (point_frame.time, point_frame.value) == (now_timestamp + 3, 1.2)
+    assert loop.time() - started_at >= 0.05
+
+    push(4, 1.205)
+    push(5, 1.25)
+    point_frame = await receive()
+    assert (point_frame.time, point_frame.value) == (now_timestamp + 5, 1.25)
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_client_service__candles(
+    assets: List[Asset], client_stream: ClientServiceStream
+):
+    """
+    Test the client service candles: the stored candles are completed with the in-memory history
+    and the open candle is updated live
+    """
+    service, receive = client_stream.service, client_stream.receive
+    eurusd = assets[0]
+    candle_time = get_candle_time(int(datetime.now().timestamp()) - 180, "1m")
+    await Candle.merge_many([Candle.open_with(eurusd, "1m", candle_time + 10, 1.17)])
+    # The points not merged into the stored candle yet
+    for time_offset, value in ((10, 1.17), (20, 1.19), (60, 1.18)):
+        client_stream.history.append(eurusd, candle_time + time_offset, value)
+
+    assert await service.rpc_candles(eurusd.id, "1m") is None  # type: ignore
+
+    candles_frame = await receive()
+    assert isinstance(candles_frame, CandlesFrame)
+    assert candles_frame.message["candles"] == [
+        {"time": candle_time, "open": 1.17, "high": 1.19, "low": 1.17, "close": 1.19, "ticks": 2},
+        {
+            "time": candle_time + 60,
+            "open": 1.18,
+            "high": 1.18,
+            "low": 1.18,
+            "close": 1.18,
+            "ticks": 1,
+        },
+    ]
+
+    # The open candle is updated live; the next interval point opens a new candle
+    for time_offset, value in ((61, 1.16), (120, 1.2)):
+        client_stream.push(eurusd, candle_time + time_offset, value)
+    candle_frames = [await receive(), await receive()]
+    assert all(isinstance(frame, CandleFrame) for frame in candle_frames)
+    assert [frame.message["close"] for frame in candle_frames] == [1.16, 1.2]
+    assert candle_frames[0].message["low"] == 1.16
+    assert candle_frames[0].message["ticks"] == 2
+    assert candle_frames[1].message["time"] == candle_time + 120
+
+    # Unsubscribing from the asset stops the candle updates
+    service.rpc_unsubscribe_asset_ids([eurusd.id])  # type: ignore
+    assert client_stream.hub.subscribers_count(eurusd.id) == 0  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_client_service__history(assets: List[Asset]):
+    """
+    Test the client service history: the pages are streamed in chunks and resumed by the cursor
+    """
+    service = ExchangeRateClientService(hub=ExchangeRateHub(source=QueueExchangeRateSource()))
+    eurusd, usdjpy = assets[0], assets[1]
+    time_from = 1_700_000_000
+    await ExchangeRate.upsert_many(
+        [
+            ExchangeRate(asset=asset, time=time_from + idx, value=1 + idx / 100)
+            for idx in range(12)
+            for asset in (eurusd, usdjpy)
+        ]
+    )
+
+    async def get_page(cursor: HistoryCursorModel) -> List[dict]:
+        return [
+            frame.message
+            async for frame in service.rpc_history(cursor, limit=5, chunk_size=2)  # type: ignore
+        ]
+
+    cursor = HistoryCursorModel(assetId=eurusd.id, timeFrom=time_from + 1, timeTo=time_from + 10)
+    pages = []
+    while cursor is not None:
+        messages = await get_page(cursor)
+        assert [message["last"] for message in messages] == [False] * (len(messages) - 1) + [True]
+        assert all(message["cursor"] is None for message in messages[:-1])
+        pages.append([time for message in messages for time in message["times"]])
+        next_token = messages[-1]["cursor"]
+        cursor = HistoryCursorModel.decode(next_token) if next_token else None
+
+    assert pages == [
+        [time_from + idx for idx in range(1, 6)],
+        [time_from + idx for idx in range(6, 11)],
+    ]
+
+    # Unknown assets are reported
+    messages = [
+        message
+        async for message in service.rpc_history(
+            HistoryCursorModel(assetId=1000, timeFrom=time_from), limit=5, chunk_size=2
+        )
+    ]
+    assert messages[0].message == {"errors": [{"msg": "Asset with id=1000 does not exist"}]}
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_client_service__archived_history(assets: List[Asset], tmp_path):
+    """
+    Test the client service history reads the archived points followed by the DB ones
+    """
+    archive = ExchangeRateArchive(tmp_path)
+    service = ExchangeRateClientService(
+        hub=ExchangeRateHub(source=QueueExchangeRateSource()), archive=archive
+    )
+    eurusd = assets[0]
+    day_start = 1_699_920_000
+    archive.write_day(eurusd.id, day_start, [day_start, day_start + 1], [1.0, 1.01])  # type: ignore
+    # The archived point being purged is not repeated
+    await ExchangeRate.upsert_many(
+        [
+            ExchangeRate(asset=eurusd, time=day_start + idx, value=1 + idx / 100)
+            for idx in range(1, 4)
+        ]
+    )
+
+    cursor = HistoryCursorModel(assetId=eurusd.id, timeFrom=day_start)
+    messages = [
+        frame.message
+        async for frame in service.rpc_history(cursor, limit=3, chunk_size=10)  # type: ignore
+    ]
+    assert messages[-1]["times"] == [day_start, day_start + 1, day_start + 2]
+    assert messages[-1]["values"] == [1.0, 1.01, 1.02]
+    cursor = HistoryCursorModel.decode(messages[-1]["cursor"])
+    assert cursor.time_from == day_start + 3
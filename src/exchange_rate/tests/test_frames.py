@@ -0,0 +1,65 @@
+"""
+Test the exchange rate RPC frames
+"""
+
+from array import array
+
+import msgpack
+import pytest
+
+from db.models.exchange_rate import Asset
+from exchange_rate.frames import ExchangeRateAssetHistoryFrame
+from rpc.codecs import JSON_CODEC, MessagePackCodec
+from settings import settings
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_asset_history_frame__columnar(asset: Asset):
+    """
+    Test the `asset_history` frame: the binary codecs get the columnar message
+    """
+    times = [1455883487, 1455883485, 1455883484]
+    values = [1.110481, 1.110948, 1.11]
+    frame = ExchangeRateAssetHistoryFrame(asset, times, values)
+
+    data = msgpack.unpackb(frame.encode(MessagePackCodec()))
+    assert data["action"] == "asset_history"
+    message = data["message"]
+    assert message["assetName"] == asset.name
+    assert message["assetId"] == asset.id
+    assert message["baseTime"] == times[0]
+
+    time_deltas = array("i", message["timeDeltas"])
+    assert list(time_deltas) == [0, 2, 1]
+    restored_times = []
+    for time_delta in time_deltas:
+        restored_times.append((restored_times[-1] if restored_times else times[0]) - time_delta)
+    assert restored_times == times
+    assert list(array("d", message["values"])) == values
+
+    # The JSON clients still get the list of points
+    assert frame.encode(JSON_CODEC) == frame.to_text()
+    assert [point["time"] for point in frame.message["points"]] == times
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_asset_history_frame__compact(asset: Asset):
+    """
+    Test the compact `asset_history` frame: the asset is sent once, the times are delta-encoded
+    and the values are quantized
+    """
+    times = [1455883487, 1455883485, 1455883484]
+    values = [1.110481, 1.110948, 1.11]
+    frame = ExchangeRateAssetHistoryFrame(asset, times, values)
+
+    compact_frame = frame.compact_frame
+    assert frame.compact_frame is compact_frame
+    assert compact_frame.message == {
+        "assetName": asset.name,
+        "assetId": asset.id,
+        "baseTime": 1455883487,
+        "timeDeltas": [0, 2, 1],
+        "precision": settings.HISTORY_VALUE_PRECISION,
+        "values": [round(value * 10**settings.HISTORY_VALUE_PRECISION) for value in values],
+    }
+    assert len(compact_frame.to_text()) < len(frame.to_text())
@@ -0,0 +1,73 @@
+"""
+Test the in-memory exchange rate history
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from db.models.exchange_rate import Asset
+from exchange_rate.history import ExchangeRateHistoryBuffer, ExchangeRateHistoryStore
+
+
+def test_exchange_rate_history_buffer():
+    """
+    Test the ring buffer: appending, overwriting the oldest pairs and reading the latest ones
+    """
+    buffer = ExchangeRateHistoryBuffer(capacity=3)
+    assert buffer.last_time is None
+    assert buffer.since(0) == ([], [])
+
+    for time in range(1, 5):
+        assert buffer.append(time, time / 10)
+    # The older and duplicate pairs are skipped
+    assert not buffer.append(4, 1.0)
+    assert not buffer.append(2, 1.0)
+
+    assert len(buffer) == 3
+    assert buffer.last_time == 4
+    assert buffer.since(0) == ([4, 3, 2], [0.4, 0.3, 0.2])
+    assert buffer.since(3) == ([4, 3], [0.4, 0.3])
+
+    with pytest.raises(ValueError):
+        ExchangeRateHistoryBuffer(capacity=0)
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_history_store__history_frame(asset: Asset):
+    """
+    Test the history store: the encoded `asset_history` frame is cached until the next point
+    """
+    store = ExchangeRateHistoryStore(window_minutes=30)
+    assert store.get_history_frame(asset) is None
+
+    now_timestamp = int(datetime.now().timestamp())
+    store.append(asset, now_timestamp - 1, 1.17)
+    store.append(asset, now_timestamp, 1.18)
+
+    frame = store.get_history_frame(asset)
+    assert frame is not None
+    assert store.get_history_frame(asset) is frame
+    assert json.loads(frame.to_text()) == {
+        "action": "asset_history",
+        "message": {
+            "points": [
+                {
+                    "assetName": asset.name,
+                    "assetId": asset.id,
+                    "time": now_timestamp,
+                    "value": 1.18,
+                },
+                {
+                    "assetName": asset.name,
+                    "assetId": asset.id,
+                    "time": now_timestamp - 1,
+                    "value": 1.17,
+                },
+            ]
+        },
+    }
+
+    store.append(asset, now_timestamp + 1, 1.19)
+    assert store.get_history_frame(asset) is not frame
@@ -0,0 +1,81 @@
+"""
+Test the exchange rate hub
+"""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from db.models.exchange_rate import Asset, ExchangeRate, ExchangeRatePoint
+from exchange_rate.frames import ExchangeRatePointFrame
+from exchange_rate.hub import ExchangeRateHub
+from exchange_rate.models import ExchangeRatePointModel
+from exchange_rate.tests.sources import QueueExchangeRateSource
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_hub__fan_out(assets: List[Asset]):
+    """
+    Test the hub: a single source watcher per asset serves all the subscribers
+    """
+    source = QueueExchangeRateSource()
+    hub = ExchangeRateHub(source=source)
+    eurusd, usdjpy = assets[0], assets[1]
+
+    eurusd_queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(3)]
+    usdjpy_queue: asyncio.Queue = asyncio.Queue()
+    for queue in eurusd_queues:
+        hub.subscribe(eurusd, queue)
+    hub.subscribe(usdjpy, usdjpy_queue)
+    await asyncio.sleep(0)
+
+    assert source.watch_calls == {eurusd.id: 1, usdjpy.id: 1}
+    assert hub.subscribers_count(eurusd.id) == 3  # type: ignore
+
+    exchange_rate = ExchangeRate(asset=eurusd, time=1, value=1.17)
+    source.queues[eurusd.id].put_nowait(exchange_rate)  # type: ignore
+    await asyncio.sleep(0)
+
+    # The very same encoded frame is sent to every subscriber
+    frame = eurusd_queues[0].get_nowait()
+    assert isinstance(frame, ExchangeRatePointFrame)
+    assert frame.to_dict() == {
+        "action": "point",
+        "message": ExchangeRatePointModel.from_exchange_rate(exchange_rate).model_dump(),
+    }
+    for queue in eurusd_queues[1:]:
+        assert queue.get_nowait() is frame
+    assert usdjpy_queue.empty()
+
+    # The latest record re-yielded by a restarted feed is not sent again
+    source.queues[eurusd.id].put_nowait(exchange_rate)  # type: ignore
+    await asyncio.sleep(0)
+    assert all(queue.empty() for queue in eurusd_queues)
+
+    # The feed stops with the last subscriber
+    for queue in eurusd_queues:
+        hub.unsubscribe(eurusd.id, queue)  # type: ignore
+    assert hub.subscribers_count(eurusd.id) == 0  # type: ignore
+
+    await hub.close()
+    assert hub.subscribers_count(usdjpy.id) == 0  # type: ignore
+
+
+class FailingHistoryExchangeRateSource(QueueExchangeRateSource):
+    """Source failing to load the history"""
+
+    async def find_points(self, asset: Asset, time_from: int) -> List[ExchangeRatePoint]:
+        raise ConnectionError("The DB is not available")
+
+
+@pytest.mark.asyncio
+async def test_exchange_rate_hub__failed_backfill(asset: Asset):
+    """
+    Test the history is served from the buffer while the feed backfill keeps failing
+    """
+    hub = ExchangeRateHub(source=FailingHistoryExchangeRateSource(), restart_delay_seconds=60)
+    hub.subscribe(asset, asyncio.Queue())
+    assert await asyncio.wait_for(hub.get_history_frame(asset), 1) is None
+    assert await asyncio.wait_for(hub.get_points(asset, time_from=0), 1) == ([], [])
+    await hub.close()
@@ -0,0 +1,56 @@
+"""
+Test the assets registry
+"""
+
+from typing import List
+
+import pytest
+
+from db.models.exchange_rate import Asset
+from exchange_rate.registry import AssetRegistry
+
+
+@pytest.mark.asyncio
+async def test_asset_registry(assets: List[Asset]):
+    """
+    Test the assets registry: the assets are resolved from memory, a miss reloads them
+    """
+    registry = AssetRegistry(reload_interval_seconds=60)
+    eurusd = await registry.get(assets[0].id)  # type: ignore
+    assert eurusd is not None
+    assert eurusd.name == assets[0].name
+    assert [asset.id for asset in registry.assets] == [asset.id for asset in assets]
+
+    # Resolved without querying the DB
+    await Asset.find(Asset.id == eurusd.id).delete()
+    assert await registry.get(eurusd.id) is eurusd  # type: ignore
+
+    new_asset = Asset(id=1000, name="NEWPAIR")
+    await new_asset.create()
+    # The recent reload is not repeated on a miss
+    assert await registry.get(1000) is None
+
+    registry.clear()
+    assets_by_id = await registry.get_many([1000, 1001])
+    assert list(assets_by_id) == [1000]
+
+
+@pytest.mark.asyncio
+async def test_asset_registry__assets_frame(assets: List[Asset]):
+    """
+    Test the pre-encoded `assets` frame is shared until the registry is invalidated
+    """
+    registry = AssetRegistry(reload_interval_seconds=60)
+    frame = await registry.get_assets_frame()
+    assert frame.action == "assets"
+    assert frame.message["assets"] == [asset.model_dump() for asset in assets]
+    assert await registry.get_assets_frame() is frame
+    assert (await registry.get_by_name(assets[1].name)).id == assets[1].id  # type: ignore
+
+    await Asset(id=1000, name="NEWPAIR").create()
+    assert await registry.get_assets_frame() is frame
+    registry.invalidate()
+    reloaded_frame = await registry.get_assets_frame()
+    assert reloaded_frame is not frame
+    assert reloaded_frame.message["assets"][-1]["name"] == "NEWPAIR"
+    assert (await registry.get_by_name("NEWPAIR")).id == 1000  # type: ignore
@@ -0,0 +1,186 @@
+"""
+Test the live ExchangeRate records sources
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncGenerator, Dict, List
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from db.models.exchange_rate import Asset, ExchangeRate
+from db.shared_rates import SharedRatesTable
+from exchange_rate.sources import (
+    AbstractExchangeRateSource,
+    ChangeStreamExchangeRateSource,
+    SharedRatesExchangeRateSource,
+)
+
+
+class StaticExchangeRateSource(AbstractExchangeRateSource):
+    """Source yielding the predefined records"""
+
+    def __init__(self, exchange_rates: List[ExchangeRate]):
+        self.exchange_rates = exchange_rates
+
+    async def watch(self, asset: Asset) -> AsyncGenerator[ExchangeRate, None]:  # type: ignore
+        for exchange_rate in self.exchange_rates:
+            yield exchange_rate
+
+
+class StandaloneChangeStream:
+    """Change stream of a MongoDB deployment without a replica set"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def try_next(self):
+        raise OperationFailure(
+            "The $changeStream stage is only supported on replica sets", code=40573
+        )
+
+
+class StandaloneCollection:
+    """Collection of a MongoDB deployment without a replica set"""
+
+    def watch(self, pipeline):
+        return StandaloneChangeStream()
+
+
+class StaticChangeStream:
+    """Change stream returning the predefined inserted points, then waiting forever"""
+
+    def __init__(self, points: List[Dict[str, Any]]):
+        self.changes = [{"fullDocument": point} for point in points]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def try_next(self):
+        return self.changes.pop(0) if self.changes else None
+
+    async def next(self):
+        if not self.changes:
+            await asyncio.Event().wait()
+        return self.changes.pop(0)
+
+
+class StaticChangeStreamCollection:
+    """Collection of a replica set watched for the predefined changes"""
+
+    def __init__(self, collection, points: List[Dict[str, Any]]):
+        self.collection = collection
+        self.points = points
+
+    def __getattr__(self, name: str):
+        return getattr(self.collection, name)
+
+    def watch(self, pipeline):
+        return StaticChangeStream(self.points)
+
+
+async def is_replica_set() -> bool:
+    """Whether the DB server is a replica set member supporting the change streams"""
+    client = ExchangeRate.get_motor_collection().database.client
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        return False
+    return "setName" in hello
+
+
+@pytest.mark.asyncio
+async def test_change_stream_source__fallback(monkeypatch, exchange_rate: ExchangeRate):
+    """
+    Test the change stream source falling back to the fallback source without a replica set
+    """
+    monkeypatch.setattr(ExchangeRate, "get_motor_collection", lambda: StandaloneCollection())
+    fallback = StaticExchangeRateSource([exchange_rate])
+    source = ChangeStreamExchangeRateSource(fallback=fallback)
+
+    asset = exchange_rate.asset
+    assert isinstance(asset, Asset)
+    assert [er async for er in source.watch(asset)] == [exchange_rate]
+    # The fallback is used right away from now on
+    assert [er async for er in source.watch(asset)] == [exchange_rate]
+
+
+@pytest.mark.asyncio
+async def test_change_stream_source(asset: Asset):
+    """
+    Test the change stream source receives a record inserted after the stream has been opened
+    """
+    if not await is_replica_set():
+        pytest.skip("Change streams require a replica set")
+    source = ChangeStreamExchangeRateSource()
+    exchange_rates = source.watch(asset)
+    try:
+        next_er = asyncio.create_task(anext(exchange_rates))
+        await asyncio.sleep(0.5)
+        await ExchangeRate(asset=asset, time=100, value=1.17).create()  # type: ignore
+        exchange_rate = await asyncio.wait_for(next_er, 5)
+        assert (exchange_rate.time, exchange_rate.value, exchange_rate.asset) == (100, 1.17, asset)
+    finally:
+        await exchange_rates.aclose()
+
+
+@pytest.mark.asyncio
+async def test_change_stream_source__order(monkeypatch, exchange_rate: ExchangeRate):
+    """
+    Test the change stream source skips the changes older than the latest record yielded
+    """
+    points = [
+        {"time": exchange_rate.time - 1, "value": 1.0},
+        {"time": exchange_rate.time, "value": 1.0},
+        {"time": exchange_rate.time + 1, "value": 1.18},
+    ]
+    collection = StaticChangeStreamCollection(ExchangeRate.get_motor_collection(), points)
+    monkeypatch.setattr(ExchangeRate, "get_motor_collection", lambda: collection)
+    source = ChangeStreamExchangeRateSource()
+    asset = exchange_rate.asset
+    assert isinstance(asset, Asset)
+    exchange_rates = source.watch(asset)
+    try:
+        received = [await asyncio.wait_for(anext(exchange_rates), 1) for _ in range(2)]
+    finally:
+        await exchange_rates.aclose()
+    assert [(er.time, er.value) for er in received] == [
+        (exchange_rate.time, exchange_rate.value),
+        (exchange_rate.time + 1, 1.18),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_shared_rates_source(asset: Asset):
+    """
+    Test the shared rates source reads the history and the live points from the table
+    """
+    table_name = f"test_source_rates_{os.getpid()}"
+    source = SharedRatesExchangeRateSource(table_name=table_name, poll_interval_seconds=0.01)
+    # The table has not been created yet
+    assert await source.find_points(asset, time_from=0) == []
+
+    table = SharedRatesTable.create(table_name, max_assets=2, window=10)
+    try:
+        table.publish(asset.id, [100, 101], [1.0, 1.01])  # type: ignore
+        points = await source.find_points(asset, time_from=101)
+        assert [(point.time, point.value) for point in points] == [(101, 1.01)]
+
+        exchange_rates = source.watch(asset)
+        # The latest point first, then the new ones
+        assert (await anext(exchange_rates)).time == 101
+        table.publish(asset.id, [102, 103], [1.02, 1.03])  # type: ignore
+        exchange_rate = await asyncio.wait_for(anext(exchange_rates), 1)
+        assert (exchange_rate.time, exchange_rate.value, exchange_rate.asset) == (102, 1.02, asset)
+        assert (await asyncio.wait_for(anext(exchange_rates), 1)).time == 103
+        await exchange_rates.aclose()
+    finally:
+        table.close()
+        source.get_table().close()  # type: ignore
@@ -2,6 +2,7 @@
 Test views
 """
 
+import msgpack
 import pytest
 from fastapi import WebSocket
 from fastapi.testclient import TestClient
@@ -67,3 +68,38 @@ async def test_socket__assets(assets, test_client: TestClient) -> None:
     assets = message["assets"]
     db_assets = await Asset.find_assets_from_settings().to_list()
     assert assets == [db_asset.model_dump() for db_asset in db_assets]
+
+
+@pytest.mark.asyncio
+async def test_socket__assets_msgpack(assets, test_client: TestClient) -> None:
+    """
+    Test the websocket: "assets" action over MessagePack frames negotiated by the query parameter
+    """
+
+    with test_client.websocket_connect("/?format=msgpack") as ws:
+        ws.send_bytes(msgpack.packb({"action": "assets", "message": {}}))
+        response = msgpack.unpackb(ws.receive_bytes())
+
+    assert response["action"] == "assets"
+    db_assets = await Asset.find_assets_from_settings().to_list()
+    assert response["message"]["assets"] == [db_asset.model_dump() for db_asset in db_assets]
+
+
+@pytest.mark.asyncio
+async def test_socket__format(test_client: TestClient) -> None:
+    """
+    Test the websocket: "format" action switching the frames format
+    """
+
+    with test_client.websocket_connect("/") as ws:
+        ws.send_json({"action": "format", "message": {"format": "unknown"}})
+        response = ws.receive_json()
+        assert response["message"] == {"errors": [{"msg": "Unknown format"}]}
+
+        ws.send_json({"action": "format", "message": {"format": "msgpack"}})
+        response = msgpack.unpackb(ws.receive_bytes())
+        assert response == {"action": "format", "message": {"format": "msgpack"}}
+
+        ws.send_bytes(msgpack.packb({"action": "unknown", "message": {}}))
+        response = msgpack.unpackb(ws.receive_bytes())
+        assert response["message"] == {"errors": [{"msg": "Unknown action"}]}
@@ -0,0 +1,94 @@
+"""
+Tick relay protocol: the length-prefixed JSON frames over TCP or a Unix socket
+"""
+
+import asyncio
+import json
+import struct
+from typing import Any, Awaitable, Callable, Dict
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+# The big-endian payload length preceding every frame payload
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+ConnectionHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]
+
+
+class RelayProtocolError(Exception):
+    """The frame or the address is not valid"""
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """Encode the message into a frame"""
+    payload = orjson.dumps(message) if orjson else json.dumps(message).encode()
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def decode_frame(frame: bytes) -> Dict[str, Any]:
+    """
+    Decode the frame read by `read_frame_bytes`
+    :raises RelayProtocolError: the payload is not a JSON object
+    """
+    payload = frame[FRAME_HEADER.size :]
+    try:
+        message = orjson.loads(payload) if orjson else json.loads(payload)
+    except ValueError as exc:
+        raise RelayProtocolError(f"Invalid frame payload: {exc}") from exc
+    if not isinstance(message, dict):
+        raise RelayProtocolError("The frame payload is not an object")
+    return message
+
+
+async def read_frame_bytes(reader: asyncio.StreamReader) -> bytes:
+    """
+    Read a whole frame including its header, so it may be forwarded as is
+    :raises asyncio.IncompleteReadError: the connection is closed
+    :raises RelayProtocolError: the frame is too large
+    """
+    header = await reader.readexactly(FRAME_HEADER.size)
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise RelayProtocolError(f"The frame of {size} bytes is too large")
+    return header + await reader.readexactly(size)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    """
+    Read and decode a frame
+    :raises asyncio.IncompleteReadError: the connection is closed
+    :raises RelayProtocolError: the frame is not valid
+    """
+    return decode_frame(await read_frame_bytes(reader))
+
+
+async def open_connection(address: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Connect to the relay address: `tcp://<host>:<port>` or `unix://<path>`
+    :raises RelayProtocolError: the address is not valid
+    :raises OSError: the connection has failed
+    """
+    url = urlsplit(address)
+    if url.scheme == "tcp" and url.hostname and url.port:
+        return await asyncio.open_connection(url.hostname, url.port)
+    if url.scheme == "unix" and url.path:
+        return await asyncio.open_unix_connection(url.path)
+    raise RelayProtocolError(f"Invalid relay address: {address}")
+
+
+async def start_server(handler: ConnectionHandler, address: str) -> asyncio.AbstractServer:
+    """
+    Listen to the relay address: `tcp://<host>:<port>` or `unix://<path>`
+    :raises RelayProtocolError: the address is not valid
+    """
+    url = urlsplit(address)
+    if url.scheme == "tcp" and url.hostname and url.port is not None:
+        return await asyncio.start_server(handler, url.hostname, url.port)
+    if url.scheme == "unix" and url.path:
+        return await asyncio.start_unix_server(handler, url.path)
+    raise RelayProtocolError(f"Invalid relay address: {address}")
@@ -0,0 +1,80 @@
+"""
+Publisher of the saved exchange rates to the tick relay
+"""
+
+import asyncio
+import time
+from typing import List
+
+from loguru import logger as _LOG
+
+from db.models.exchange_rate import Asset, ExchangeRate
+from relay.protocol import encode_frame, open_connection
+
+
+class TickRelayPublisher:
+    """
+    Publisher of the saved ExchangeRate batches to the tick relay.
+    Every batch gets the next sequence number of the publisher `epoch`, even if it is dropped
+    on the full queue or lost with the connection: the subscribers detect the gap
+    and backfill the missed ticks from the DB, which already holds them
+    """
+
+    def __init__(self, address: str, queue_size: int = 64, reconnect_delay_seconds: float = 1):
+        """
+        :param str address: the relay address, `tcp://<host>:<port>` or `unix://<path>`
+        :param int queue_size: the maximum number of the batches waiting to be sent
+        :param float reconnect_delay_seconds: time to wait before reconnecting to the relay
+        """
+        self._address = address
+        self._reconnect_delay_seconds = reconnect_delay_seconds
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=queue_size)
+        # Tells the restarted publisher sequence apart
+        self.epoch = time.time_ns()
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def publish_exchange_rates(self, exchange_rates: List[ExchangeRate]) -> None:
+        """Queue the ExchangeRate records with the Asset assigned; never waits"""
+        self.seq += 1
+        points = []
+        for exchange_rate in sorted(exchange_rates, key=lambda exchange_rate: exchange_rate.time):
+            asset: Asset = exchange_rate.asset  # type: ignore
+            points.append([asset.id, exchange_rate.time, exchange_rate.value])
+        if self._queue.full():
+            # The fresh batch is more valuable; the subscribers backfill the dropped one
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(
+            encode_frame({"type": "batch", "epoch": self.epoch, "seq": self.seq, "points": points})
+        )
+
+    async def run(self) -> None:
+        """Send the queued batches to the relay, reconnecting until cancelled"""
+        while True:
+            try:
+                _, writer = await open_connection(self._address)
+            except OSError as exc:
+                _LOG.warning(f"Could not connect to the tick relay {self._address}: {exc}")
+                await asyncio.sleep(self._reconnect_delay_seconds)
+                continue
+            _LOG.info(f"Publishing the exchange rates to the tick relay {self._address}")
+            try:
+                writer.write(encode_frame({"type": "hello", "role": "publisher"}))
+                while True:
+                    writer.write(await self._queue.get())
+                    await writer.drain()
+                    self.sent += 1
+            except ConnectionError as exc:
+                _LOG.warning(f"Tick relay connection lost: {exc}")
+            finally:
+                writer.close()
+            await asyncio.sleep(self._reconnect_delay_seconds)
+
+    def report(self) -> None:
+        """Log the publisher counters"""
+        _LOG.info(
+            f"Tick relay publisher: seq={self.seq} sent={self.sent} dropped={self.dropped} "
+            f"queued={self._queue.qsize()}"
+        )
@@ -0,0 +1,139 @@
+"""
+Tick relay: the ingestion publishes every saved batch once and the relay fans it out
+to the subscribed application nodes.
+Usage: python -m relay.server [--address tcp://0.0.0.0:9100]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Dict
+
+from loguru import logger as _LOG
+
+# The application root dir is the parent dir
+sys.path.insert(1, os.getcwd())
+from relay.protocol import RelayProtocolError, decode_frame, read_frame_bytes, start_server
+from settings import settings
+
+
+class TickRelay:
+    """
+    Relay of the publisher frames to every subscriber. The frames are forwarded as is;
+    a subscriber not keeping up with `queue_size` frames is disconnected
+    and backfills the missed ticks on reconnecting
+    """
+
+    def __init__(self, queue_size: int | None = None):
+        """
+        :param int queue_size: the maximum number of the frames waiting per subscriber;
+            `TICK_RELAY_QUEUE_SIZE` by default
+        """
+        self._queue_size = queue_size or settings.TICK_RELAY_QUEUE_SIZE
+        self._subscribers: Dict[asyncio.StreamWriter, asyncio.Queue[bytes]] = {}
+        # The handler task of every connection
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.published = 0
+        self.disconnected = 0
+
+    @property
+    def subscribers_count(self) -> int:
+        """The number of the connected subscribers"""
+        return len(self._subscribers)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve the connection according to the role of its `hello` frame"""
+        peer = writer.get_extra_info("peername") or "unix socket"
+        self._connections[writer] = asyncio.current_task()  # type: ignore
+        try:
+            hello = decode_frame(await read_frame_bytes(reader))
+            if hello.get("type") != "hello":
+                raise RelayProtocolError(f"Expected a hello frame, got {hello.get('type')}")
+            match hello.get("role"):
+                case "publisher":
+                    _LOG.info(f"Tick relay publisher connected: {peer}")
+                    await self._serve_publisher(reader)
+                case "subscriber":
+                    _LOG.info(f"Tick relay subscriber connected: {peer}")
+                    await self._serve_subscriber(reader, writer)
+                case role:
+                    raise RelayProtocolError(f"Unknown role {role}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except RelayProtocolError as exc:
+            _LOG.warning(f"Tick relay connection {peer} failed: {exc}")
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+        _LOG.info(f"Tick relay connection closed: {peer}")
+
+    def publish(self, frame: bytes) -> None:
+        """Queue the frame to every subscriber"""
+        self.published += 1
+        for writer, queue in list(self._subscribers.items()):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                _LOG.warning("Tick relay subscriber is too slow, disconnecting")
+                self._subscribers.pop(writer, None)
+                self.disconnected += 1
+                writer.close()
+
+    async def run(self, address: str | None = None) -> None:
+        """
+        Listen to the address until cancelled
+        :param str address: `tcp://<host>:<port>` or `unix://<path>`; `TICK_RELAY_ADDRESS` by default
+        """
+        address = address or settings.TICK_RELAY_ADDRESS
+        server = await start_server(self.handle_connection, address)
+        _LOG.info(f"Tick relay is listening to {address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # Let the connection handlers finish on the closed connections
+            handlers = list(self._connections.values())
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def _serve_publisher(self, reader: asyncio.StreamReader) -> None:
+        """Relay the publisher frames until it disconnects"""
+        while True:
+            self.publish(await read_frame_bytes(reader))
+
+    async def _serve_subscriber(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Forward the published frames until the subscriber disconnects"""
+        queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers[writer] = queue
+
+        async def forward() -> None:
+            while True:
+                writer.write(await queue.get())
+                await writer.drain()
+
+        # The subscriber sends nothing else: wait for it to disconnect
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(reader.read())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._subscribers.pop(writer, None)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--address", default=settings.TICK_RELAY_ADDRESS)
+    args = parser.parse_args()
+    asyncio.run(TickRelay().run(args.address))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Test the tick relay, its publisher and the relay exchange rate source
+"""
+
+import asyncio
+from pathlib import Path
+from typing import List
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from db.models.exchange_rate import Asset, ExchangeRate
+from exchange_rate.sources import RelayExchangeRateSource
+from relay.protocol import (
+    RelayProtocolError,
+    decode_frame,
+    encode_frame,
+    open_connection,
+    read_frame,
+)
+from relay.publisher import TickRelayPublisher
+from relay.server import TickRelay
+
+
+async def subscribe(address: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Subscribe to the relay; the subscription is closed with the writer"""
+    reader, writer = await open_connection(address)
+    writer.write(encode_frame({"type": "hello", "role": "subscriber"}))
+    await writer.drain()
+    return reader, writer
+
+
+def test_frame():
+    """
+    Test encoding and decoding a frame
+    """
+    message = {"type": "batch", "epoch": 1, "seq": 2, "points": [[1, 100, 1.17]]}
+    assert decode_frame(encode_frame(message)) == message
+    with pytest.raises(RelayProtocolError):
+        decode_frame(encode_frame([1]))  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_tick_relay(tmp_path: Path, asset: Asset):
+    """
+    Test the relay fans the published batches out to every subscriber with the sequence numbers
+    """
+    address = f"unix://{tmp_path / 'relay.sock'}"
+    relay = TickRelay(queue_size=8)
+    server = asyncio.create_task(relay.run(address))
+    publisher = TickRelayPublisher(address, reconnect_delay_seconds=0.01)
+    publisher_task = asyncio.create_task(publisher.run())
+    try:
+        while not (tmp_path / "relay.sock").exists():
+            await asyncio.sleep(0.01)
+        subscriptions = [await subscribe(address), await subscribe(address)]
+        while relay.subscribers_count < 2:
+            await asyncio.sleep(0.01)
+
+        exchange_rates = [
+            ExchangeRate(asset=asset, time=101, value=1.01),  # type: ignore
+            ExchangeRate(asset=asset, time=100, value=1.0),  # type: ignore
+        ]
+        publisher.publish_exchange_rates(exchange_rates)
+        publisher.publish_exchange_rates(exchange_rates[:1])
+        for reader, _ in subscriptions:
+            first = await asyncio.wait_for(read_frame(reader), 1)
+            second = await asyncio.wait_for(read_frame(reader), 1)
+            assert first["points"] == [[asset.id, 100, 1.0], [asset.id, 101, 1.01]]
+            assert (first["epoch"], first["seq"]) == (publisher.epoch, 1)
+            assert (second["epoch"], second["seq"]) == (publisher.epoch, 2)
+        assert publisher.sent == relay.published == 2
+    finally:
+        publisher_task.cancel()
+        server.cancel()
+        await asyncio.gather(publisher_task, server, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_relay_source__gap(asset: Asset):
+    """
+    Test the relay source delivers the batches and backfills the missed ones from the DB
+    """
+    await ExchangeRate(asset=asset, time=100, value=1.0).create()  # type: ignore
+    source = RelayExchangeRateSource(address="tcp://127.0.0.1:1", reconnect_delay_seconds=60)
+    exchange_rates = source.watch(asset)
+    try:
+        # The latest point of the DB first
+        assert (await anext(exchange_rates)).time == 100
+
+        await source.on_batch(
+            {"type": "batch", "epoch": 1, "seq": 1, "points": [[asset.id, 101, 1.01]]}
+        )
+        # A duplicate is skipped
+        await source.on_batch(
+            {"type": "batch", "epoch": 1, "seq": 2, "points": [[asset.id, 101, 1.01]]}
+        )
+        exchange_rate = await anext(exchange_rates)
+        assert (exchange_rate.time, exchange_rate.value, exchange_rate.asset) == (101, 1.01, asset)
+
+        # The batch of seq 3 is lost: its points are saved before publishing
+        for time in (102, 103):
+            await ExchangeRate(asset=asset, time=time, value=1.0).create()  # type: ignore
+        await source.on_batch(
+            {"type": "batch", "epoch": 1, "seq": 4, "points": [[asset.id, 103, 1.0]]}
+        )
+        assert source.gaps == 1
+        assert [(await anext(exchange_rates)).time for _ in range(2)] == [102, 103]
+    finally:
+        await exchange_rates.aclose()
+
+
+@pytest.mark.asyncio
+async def test_relay_source__first_batch(tmp_path: Path, assets: List[Asset]):
+    """
+    Test the relay source backfills the points published before its first subscription,
+    including the ones of the asset without the stored points
+    """
+    eurusd, usdjpy = assets[0], assets[1]
+    await ExchangeRate(asset=eurusd, time=100, value=1.0).create()  # type: ignore
+    address = f"unix://{tmp_path / 'relay.sock'}"
+    # The relay is down: the source retries connecting after the delay
+    source = RelayExchangeRateSource(address=address, reconnect_delay_seconds=0.5)
+    eurusd_rates, usdjpy_rates = source.watch(eurusd), source.watch(usdjpy)
+    relay = TickRelay(queue_size=8)
+    publisher = TickRelayPublisher(address, reconnect_delay_seconds=0.01)
+    tasks = []
+    try:
+        assert (await anext(eurusd_rates)).time == 100
+        usdjpy_rate = asyncio.create_task(anext(usdjpy_rates))
+        await asyncio.sleep(0.01)
+
+        tasks = [usdjpy_rate, asyncio.create_task(relay.run(address))]
+        tasks.append(asyncio.create_task(publisher.run()))
+        # The batch is published before the source has subscribed
+        exchange_rates = [
+            ExchangeRate(asset=eurusd, time=101, value=1.01),  # type: ignore
+            ExchangeRate(asset=usdjpy, time=101, value=150.0),  # type: ignore
+        ]
+        await ExchangeRate.upsert_many(exchange_rates)
+        publisher.publish_exchange_rates(exchange_rates)
+        while relay.published < 1:
+            await asyncio.sleep(0.01)
+        assert relay.subscribers_count == 0
+
+        while relay.subscribers_count < 1:
+            await asyncio.sleep(0.01)
+        exchange_rate = ExchangeRate(asset=eurusd, time=102, value=1.02)  # type: ignore
+        await ExchangeRate.upsert_many([exchange_rate])
+        publisher.publish_exchange_rates([exchange_rate])
+
+        eurusd_times = [
+            (await asyncio.wait_for(anext(eurusd_rates), timeout=1)).time for _ in range(2)
+        ]
+        assert eurusd_times == [101, 102]
+        assert (await asyncio.wait_for(usdjpy_rate, timeout=1)).value == 150.0
+        assert source.gaps == 0
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await eurusd_rates.aclose()
+        await usdjpy_rates.aclose()
+
+
+@pytest.mark.asyncio
+async def test_relay_source__failed_backfill(monkeypatch, asset: Asset):
+    """
+    Test the relay source retries the failed backfill on the next batch
+    without skipping the missed points
+    """
+    await ExchangeRate(asset=asset, time=101, value=1.0).create()  # type: ignore
+    source = RelayExchangeRateSource(address="tcp://127.0.0.1:1", reconnect_delay_seconds=60)
+    exchange_rates = source.watch(asset)
+    try:
+        assert (await anext(exchange_rates)).time == 101
+        await source.on_batch(
+            {"type": "batch", "epoch": 1, "seq": 1, "points": [[asset.id, 101, 1.0]]}
+        )
+
+        # The batch of seq 2 is lost and the DB is unavailable
+        find_points = ExchangeRate.find_points
+
+        def fail_find_points(*args, **kwargs):
+            raise AutoReconnect("The DB is unavailable")
+
+        for time in (102, 103):
+            await ExchangeRate(asset=asset, time=time, value=1.0).create()  # type: ignore
+        monkeypatch.setattr(ExchangeRate, "find_points", fail_find_points)
+        await source.on_batch(
+            {"type": "batch", "epoch": 1, "seq": 3, "points": [[asset.id, 103, 1.0]]}
+        )
+        next_exchange_rate = asyncio.create_task(anext(exchange_rates))
+        await asyncio.sleep(0.01)
+        assert not next_exchange_rate.done()
+
+        # The gap is backfilled with the next batch
+        await ExchangeRate(asset=asset, time=104, value=1.0).create()  # type: ignore
+        monkeypatch.setattr(ExchangeRate, "find_points", find_points)
+        await source.on_batch(
+            {"type": "batch", "epoch": 1, "seq": 4, "points": [[asset.id, 104, 1.0]]}
+        )
+        assert source.gaps == 1
+        assert (await asyncio.wait_for(next_exchange_rate, timeout=1)).time == 102
+        exchange_rates_times = [
+            (await asyncio.wait_for(anext(exchange_rates), timeout=1)).time for _ in range(2)
+        ]
+        assert exchange_rates_times == [103, 104]
+    finally:
+        await exchange_rates.aclose()
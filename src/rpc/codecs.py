@@ -0,0 +1,156 @@
+"""
+RPC codecs encoding the outgoing messages and decoding the incoming commands
+"""
+
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+
+from pydantic import ValidationError
+
+from rpc.exceptions import RPCCommandTypeError, RPCDecodeError
+from rpc.models import RPCCommandModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+
+class AbstractRPCCodec(ABC):
+    """Abstract RPC codec of the websocket frames"""
+
+    # Unique codec name
+    name: str = ""
+    # Whether the codec yields binary frames
+    binary: bool = False
+
+    @abstractmethod
+    def encode(self, data: Any) -> str | bytes:
+        """
+        Encode the data into a frame
+        :raises TypeError: the data can not be encoded
+        """
+
+    def encode_error(self, data: Any) -> str | bytes:
+        """Encode the error reply data into a frame"""
+        return self.encode(data)
+
+    @abstractmethod
+    def decode(self, frame: str | bytes) -> Any:
+        """
+        Decode the frame
+        :raises RPCDecodeError: the frame can not be decoded
+        """
+
+    def decode_command(self, frame: str | bytes) -> RPCCommandModel:
+        """
+        Decode the frame and validate it as an RPC command
+        :raises RPCDecodeError: the frame can not be decoded
+        :raises RPCCommandTypeError: the decoded frame is not a mapping
+        :raises ValidationError: the decoded frame is not a valid RPC command
+        """
+        command = self.decode(frame)
+        if not isinstance(command, dict):
+            raise RPCCommandTypeError.from_command(command)
+        return RPCCommandModel.model_validate(command)
+
+
+class StdlibJSONCodec(AbstractRPCCodec):
+    """JSON codec based on the standard `json` module; the same encoding as of Starlette"""
+
+    name = "json"
+
+    def encode(self, data: Any) -> str:
+        """Encode the data into a JSON text frame"""
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, frame: str | bytes) -> Any:
+        """Decode the JSON frame"""
+        try:
+            return json.loads(frame)
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise RPCDecodeError() from exc
+
+
+class ORJSONCodec(StdlibJSONCodec):
+    """
+    JSON codec based on `orjson`.
+    The valid commands are parsed by pydantic straight from the raw frame;
+    the invalid ones go through the generic path to reply with the same errors
+    """
+
+    def encode(self, data: Any) -> str:
+        """Encode the data into a JSON text frame"""
+        try:
+            return orjson.dumps(data).decode()
+        except TypeError:
+            # E.g., integers exceeding 64 bits
+            return super().encode(data)
+
+    def encode_error(self, data: Any) -> str:
+        """
+        Encode the error reply data with the standard `json` module.
+        The replies echo the client input and must not depend on the encoder, e.g., on floats
+        """
+        return StdlibJSONCodec.encode(self, data)
+
+    def decode(self, frame: str | bytes) -> Any:
+        """Decode the JSON frame"""
+        try:
+            return orjson.loads(frame)
+        except orjson.JSONDecodeError as exc:
+            raise RPCDecodeError() from exc
+
+    def decode_command(self, frame: str | bytes) -> RPCCommandModel:
+        """Validate the raw frame as an RPC command"""
+        try:
+            return RPCCommandModel.model_validate_json(frame)
+        except ValidationError:
+            pass
+        return super().decode_command(frame)
+
+
+class MessagePackCodec(AbstractRPCCodec):
+    """MessagePack codec of the binary frames"""
+
+    name = "msgpack"
+    binary = True
+
+    def encode(self, data: Any) -> bytes:
+        """Encode the data into a MessagePack binary frame"""
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, frame: str | bytes) -> Any:
+        """Decode the MessagePack frame"""
+        if isinstance(frame, str):
+            raise RPCDecodeError(message="MessagePack command must be a binary frame")
+        try:
+            return msgpack.unpackb(frame, raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise RPCDecodeError(message="Could not parse the MessagePack command") from exc
+
+
+def get_json_codec() -> AbstractRPCCodec:
+    """Get the fastest JSON codec available"""
+    if orjson is not None:
+        return ORJSONCodec()
+    return StdlibJSONCodec()
+
+
+JSON_CODEC = get_json_codec()
+
+# Codecs available for negotiation by name
+CODECS: Dict[str, AbstractRPCCodec] = {JSON_CODEC.name: JSON_CODEC}
+if msgpack is not None:
+    CODECS[MessagePackCodec.name] = MessagePackCodec()
+
+
+def get_codec(name: str) -> AbstractRPCCodec | None:
+    """Get the codec by name; None if it is not available"""
+    return CODECS.get(name)
@@ -1,15 +1,31 @@
 import asyncio
 from abc import ABC, abstractmethod
-from json.decoder import JSONDecodeError
-from typing import Any, Dict, List
+from typing import Any, Dict, Hashable, List
 
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect, status
+from loguru import logger as _LOG
 from pydantic import BaseModel, ValidationError
 from starlette.websockets import WebSocketState
 
+from rpc.codecs import JSON_CODEC, AbstractRPCCodec
+from rpc.exceptions import (
+    RPCException,
+    RPCSendQueueClosedError,
+    RPCSendQueueOverflowError,
+)
+from rpc.frames import RPCFrame
 from rpc.models import RPCErrorMessageModel, RPCCommandModel, RPCClientState
+from rpc.send_queue import RPCSendQueue, RPCSendQueueStats
 
-SendMessageType = str | Dict[Any, Any] | List[Any] | BaseModel
+# Default maximum number of the pending outbound messages per connection
+DEFAULT_SEND_QUEUE_SIZE = 256
+
+# Raised by the websocket send once the client has gone:
+# `WebSocketDisconnect` or `ClientDisconnected` (an `OSError`) by the server,
+# `RuntimeError` if the websocket has already been closed
+SEND_DISCONNECT_ERRORS = (WebSocketDisconnect, OSError, RuntimeError)
+
+SendMessageType = str | Dict[Any, Any] | List[Any] | BaseModel | RPCFrame
 
 
 class AbstractRPCConnectionService(ABC):
@@ -37,6 +53,14 @@ class AbstractRPCConnectionService(ABC):
     def add_task(self, task: asyncio.Task) -> None:
         """Put a new task into the list of tasks to save its reference"""
 
+    @abstractmethod
+    def get_codec(self) -> AbstractRPCCodec:
+        """Get the codec of the connection frames"""
+
+    @abstractmethod
+    def set_codec(self, codec: AbstractRPCCodec) -> None:
+        """Set the codec of the connection frames"""
+
     @abstractmethod
     async def receive_command(self) -> RPCCommandModel:
         """Read the incoming RPC commands until a valid command is received"""
@@ -48,13 +72,40 @@ class AbstractRPCConnectionService(ABC):
     ) -> None:
         """Send message"""
 
+    @abstractmethod
+    def enqueue_message(self, message: SendMessageType, key: Hashable | None = None) -> None:
+        """Put the message into the outbound queue to be sent by the writer task"""
+
+    @abstractmethod
+    async def put_message(self, message: SendMessageType, max_depth: int = 2) -> None:
+        """Put the message into the outbound queue once fewer than `max_depth` messages are pending"""
+
+    @abstractmethod
+    def get_send_queue_stats(self) -> RPCSendQueueStats:
+        """Get the outbound queue counters"""
+
 
 class BaseRPCConnectionService:
     """RPC per-connection service to handle websocket connections"""
 
-    def __init__(self, websocket: WebSocket) -> None:
-        """Initialize"""
+    def __init__(
+        self,
+        websocket: WebSocket,
+        codec: AbstractRPCCodec | None = None,
+        send_queue: RPCSendQueue | None = None,
+    ) -> None:
+        """
+        Initialize
+        :param WebSocket websocket: the client websocket
+        :param AbstractRPCCodec codec: codec of the frames; the fastest JSON one by default
+        :param RPCSendQueue send_queue: the bounded outbound queue drained by the writer task
+        """
         self._websocket: WebSocket = websocket
+        self._codec: AbstractRPCCodec = codec or JSON_CODEC
+        if send_queue is None:
+            send_queue = RPCSendQueue(DEFAULT_SEND_QUEUE_SIZE)
+        self._send_queue: RPCSendQueue = send_queue
+        self._writer_task: asyncio.Task | None = None
 
     async def connect(self) -> None:
         """Start accepting messages from the client"""
@@ -62,30 +113,54 @@ class BaseRPCConnectionService:
 
     async def disconnect(self) -> None:
         """Stop accepting messages from the client and deallocate the resources"""
-        if self._websocket.client_state != WebSocketState.DISCONNECTED:
+        self._send_queue.close()
+        if self._writer_task is not None and not self._writer_task.done():
+            self._writer_task.cancel()
+        if (
+            self._websocket.client_state != WebSocketState.DISCONNECTED
+            and self._websocket.application_state != WebSocketState.DISCONNECTED
+        ):
             await self._websocket.close()
 
+    def get_codec(self) -> AbstractRPCCodec:
+        """Get the codec of the connection frames"""
+        return self._codec
+
+    def set_codec(self, codec: AbstractRPCCodec) -> None:
+        """Set the codec of the connection frames"""
+        self._codec = codec
+
+    async def receive_frame(self) -> str | bytes:
+        """
+        Read the incoming text or binary frame
+        :raises WebSocketDisconnect: the client has disconnected
+        """
+        message = await self._websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message["code"], message.get("reason"))
+        text = message.get("text")
+        if text is not None:
+            return text
+        return message["bytes"]
+
     async def receive_command(self) -> RPCCommandModel:
-        """Read the incoming JSON RPC command until a valid command is received"""
+        """Read the incoming RPC command until a valid command is received"""
         while True:
+            frame = await self.receive_frame()
             try:
-                json_command = await self._websocket.receive_json()
-            except JSONDecodeError:
-                await self.send_message("Could not parse the JSON command")
-                continue
-            if not isinstance(json_command, dict):
-                await self.send_message(
-                    f"Invalid type of the message: {type(json_command)}. "
-                    "Command must be a valid JSON mapping",
-                )
-                continue
-            try:
-                rpc_command = RPCCommandModel(**json_command)
+                return self._codec.decode_command(frame)
+            except RPCException as exception:
+                await self.send_message(exception.message)
             except ValidationError as exception:
                 error_message = RPCErrorMessageModel.from_validation_error(exception)
                 await self.send_message(error_message)
-                continue
-            return rpc_command
+
+    async def send_frame(self, frame: str | bytes) -> None:
+        """Send the encoded frame"""
+        if isinstance(frame, str):
+            await self._websocket.send_text(frame)
+        else:
+            await self._websocket.send_bytes(frame)
 
     async def send_message(
         self,
@@ -93,13 +168,81 @@ class BaseRPCConnectionService:
     ) -> None:
         """Send message"""
         if isinstance(message, str):
-            await self._websocket.send_text(message)
+            if self._codec.binary:
+                await self.send_frame(self._codec.encode(message))
+            else:
+                await self._websocket.send_text(message)
+        elif isinstance(message, RPCFrame):
+            await self.send_frame(message.encode(self._codec))
+        elif isinstance(message, RPCErrorMessageModel):
+            await self.send_frame(self._codec.encode_error(message.model_dump()))
         elif isinstance(message, BaseModel):
-            await self._websocket.send_json(message.model_dump())
+            await self.send_frame(self._codec.encode(message.model_dump()))
         elif isinstance(message, (dict, list)):
             try:
-                await self._websocket.send_json(message)
+                frame = self._codec.encode(message)
             except TypeError:
                 return
+            await self.send_frame(frame)
         else:
             raise TypeError("Unsupported message type")
+
+    def enqueue_message(self, message: SendMessageType, key: Hashable | None = None) -> None:
+        """
+        Put the message into the outbound queue without waiting for the client.
+        The messages are sent in order by the writer task started on demand
+        :param SendMessageType message: the message to send
+        :param Hashable | None key: the conflation key, e.g., the asset ID of a point
+        """
+        send_queue = self._send_queue
+        if send_queue.closed:
+            # The connection is being closed
+            return
+        send_queue.put_nowait(message, key=key)
+        if send_queue.overflowed:
+            # The writer is likely stuck on the slow client
+            if self._writer_task is not None:
+                self._writer_task.cancel()
+            self._writer_task = asyncio.create_task(self._close_slow_client())
+            return
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._run_writer())
+
+    async def put_message(self, message: SendMessageType, max_depth: int = 2) -> None:
+        """
+        Put the message into the outbound queue once fewer than `max_depth` messages are pending,
+        so a bulk producer holds a few messages in memory at most and the live ones are not dropped
+        :raises RPCSendQueueClosedError: the connection is being closed
+        """
+        await self._send_queue.wait_for_depth(max_depth)
+        self.enqueue_message(message)
+
+    def get_send_queue_stats(self) -> RPCSendQueueStats:
+        """Get the outbound queue counters"""
+        return self._send_queue.stats
+
+    async def _run_writer(self) -> None:
+        """
+        Send the queued messages until the queue is empty.
+        Once the client has gone, the queue is closed so no writer is started on the dead socket
+        """
+        send_queue = self._send_queue
+        try:
+            while len(send_queue):
+                message = await send_queue.get()
+                await self.send_message(message)
+        except RPCSendQueueClosedError:
+            pass
+        except SEND_DISCONNECT_ERRORS as exc:
+            _LOG.info(f"The client has disconnected, closing the send queue: {exc!r}")
+            send_queue.close()
+
+    async def _close_slow_client(self) -> None:
+        """Close the connection of the client not keeping up with the outbound messages"""
+        _LOG.warning(f"Closing the slow client connection: {self.get_send_queue_stats()}")
+        try:
+            await self._websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION, reason=RPCSendQueueOverflowError().message
+            )
+        except SEND_DISCONNECT_ERRORS as exc:
+            _LOG.info(f"The slow client has already disconnected: {exc!r}")
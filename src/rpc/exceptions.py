@@ -0,0 +1,50 @@
+"""
+RPC exceptions
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass
+class RPCException(Exception):
+    """Custom application-level RPC exception"""
+
+    message: str = "General RPC exception"
+
+
+@dataclass
+class RPCDecodeError(RPCException):
+    """The incoming frame could not be decoded"""
+
+    message: str = "Could not parse the JSON command"
+
+
+@dataclass
+class RPCCommandTypeError(RPCException):
+    """The decoded command is not a mapping"""
+
+    message: str = "Command must be a valid JSON mapping"
+
+    @classmethod
+    def from_command(cls, command: object) -> "RPCCommandTypeError":
+        """Create the exception for the decoded command of invalid type"""
+        return cls(
+            message=(
+                f"Invalid type of the message: {type(command)}. "
+                "Command must be a valid JSON mapping"
+            )
+        )
+
+
+@dataclass
+class RPCSendQueueClosedError(RPCException):
+    """The connection is closed and no more messages can be sent"""
+
+    message: str = "The connection is closed"
+
+
+@dataclass
+class RPCSendQueueOverflowError(RPCSendQueueClosedError):
+    """The client does not keep up with the outbound messages"""
+
+    message: str = "The client is too slow to consume the messages"
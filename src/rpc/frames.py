@@ -0,0 +1,60 @@
+"""
+Pre-encoded RPC frames shared by any number of connections
+"""
+
+from typing import Any, Callable, Dict
+
+from rpc.codecs import JSON_CODEC, AbstractRPCCodec
+
+MessageFactory = Callable[[], Dict[str, Any]]
+
+
+class RPCFrame:
+    """
+    RPC (output) message encoded at most once and sent as is to every client.
+    The `message` content may be passed as a factory to build it only if the frame is encoded
+    """
+
+    __slots__ = ("action", "_message", "_message_factory", "_encoded")
+
+    def __init__(self, action: str, message: Dict[str, Any] | MessageFactory):
+        """
+        :param str action: action name
+        :param Dict[str, Any] | MessageFactory message: the message content or its factory
+        """
+        self.action = action
+        self._message: Dict[str, Any] | None = None
+        self._message_factory: MessageFactory | None = None
+        if callable(message):
+            self._message_factory = message
+        else:
+            self._message = message
+        # Encoded frames by codec name
+        self._encoded: Dict[str, str | bytes] = {}
+
+    @property
+    def message(self) -> Dict[str, Any]:
+        """The message content"""
+        if self._message is None:
+            self._message = self._message_factory()  # type: ignore
+        return self._message
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the frame in the RPCCommandModel dump format"""
+        return {"action": self.action, "message": self.message}
+
+    def get_message(self, codec: AbstractRPCCodec) -> Dict[str, Any]:
+        """Get the message content in the codec-specific shape; the generic one by default"""
+        return self.message
+
+    def encode(self, codec: AbstractRPCCodec) -> str | bytes:
+        """Get the frame encoded by the codec; encoded on the first call per codec only"""
+        encoded = self._encoded.get(codec.name)
+        if encoded is None:
+            data = {"action": self.action, "message": self.get_message(codec)}
+            encoded = self._encoded[codec.name] = codec.encode(data)
+        return encoded
+
+    def to_text(self) -> str:
+        """Get the frame JSON text"""
+        return self.encode(JSON_CODEC)  # type: ignore
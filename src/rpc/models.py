@@ -17,6 +17,14 @@ class RPCCommandModel(BaseModel):
     )
 
 
+class RPCFormatMessageModel(BaseModel):
+    """
+    Data model contained in the `message` field of RPCCommandModel to handle `format`
+    """
+
+    format: str = Field(description="Name of the frames format, e.g., `json` or `msgpack`")
+
+
 class RPCErrorMessageModel(BaseModel):
     """RPC error nested inside the `message` field"""
 
@@ -56,5 +64,9 @@ class RPCClientState(BaseModel):
         default_factory=list,
         description="The list of async task",
     )
+    history_task: asyncio.Task | None = Field(
+        default=None,
+        description="The task streaming the requested history page",
+    )
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
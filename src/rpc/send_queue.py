@@ -0,0 +1,197 @@
+"""
+Bounded per-connection outbound queue of the RPC messages
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Hashable, Literal
+
+from rpc.exceptions import RPCSendQueueClosedError, RPCSendQueueOverflowError
+
+# What to do once the queue is full:
+#   `conflate` - keep only the latest pending message per key, e.g., the latest point per asset;
+#   `drop_oldest` - drop the oldest pending message;
+#   `disconnect` - give up on the client
+SendQueuePolicy = Literal["conflate", "drop_oldest", "disconnect"]
+
+
+@dataclass
+class RPCSendQueueStats:
+    """Outbound queue counters"""
+
+    # Number of the pending messages
+    depth: int = 0
+    # The highest number of the pending messages
+    max_depth: int = 0
+    # Number of the messages put into the queue
+    enqueued: int = 0
+    # Number of the pending messages replaced by the later ones with the same key
+    conflated: int = 0
+    # Number of the pending messages dropped
+    dropped: int = 0
+    # Whether the queue has overflowed with the `disconnect` policy
+    overflowed: bool = False
+    # Whether the queue has been closed, e.g., once the client has disconnected
+    closed: bool = False
+
+
+class _Entry:
+    """A pending message with its conflation key"""
+
+    __slots__ = ("key", "message")
+
+    def __init__(self, key: Hashable | None, message: Any):
+        self.key = key
+        self.message = message
+
+
+class RPCSendQueue:
+    """
+    Bounded FIFO queue of the messages to send to a single client.
+    The producers never wait: once the queue is full, the policy applies.
+    With the `conflate` policy, the messages put with a key are conflated or dropped first,
+    the ones without a key (e.g., histories) are dropped as the last resort only
+    """
+
+    def __init__(self, maxsize: int, policy: SendQueuePolicy = "conflate"):
+        """
+        :param int maxsize: the maximum number of the pending messages
+        :param SendQueuePolicy policy: what to do once the queue is full
+        """
+        if maxsize < 1:
+            raise ValueError("The send queue size must be positive")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._entries: Deque[_Entry] = deque()
+        # The latest pending entry per key
+        self._keyed_entries: Dict[Hashable, _Entry] = {}
+        self._not_empty = asyncio.Event()
+        self._dequeued = asyncio.Event()
+        self._stats = RPCSendQueueStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def overflowed(self) -> bool:
+        """Whether the queue has overflowed with the `disconnect` policy"""
+        return self._stats.overflowed
+
+    @property
+    def closed(self) -> bool:
+        """Whether no more messages can be sent: the queue has overflowed or has been closed"""
+        return self._stats.overflowed or self._stats.closed
+
+    @property
+    def stats(self) -> RPCSendQueueStats:
+        """The queue counters"""
+        self._stats.depth = len(self._entries)
+        return self._stats
+
+    def put_nowait(self, message: Any, key: Hashable | None = None) -> None:
+        """
+        Put the message into the queue applying the policy if the queue is full
+        :param Any message: the message to send
+        :param Hashable | None key: the conflation key, e.g., the asset ID of a point;
+            None if the message must not be conflated
+        """
+        stats = self._stats
+        if self.closed:
+            stats.dropped += 1
+            return
+        stats.enqueued += 1
+        if len(self._entries) >= self.maxsize:
+            if self.policy == "disconnect":
+                stats.overflowed = True
+                stats.dropped += 1
+                self._clear()
+                return
+            if self.policy == "conflate" and key is not None:
+                pending_entry = self._keyed_entries.get(key)
+                if pending_entry is not None:
+                    # Keep the position of the pending message not to starve the key
+                    pending_entry.message = message
+                    stats.conflated += 1
+                    return
+            self._drop_one(keyed_first=self.policy == "conflate")
+
+        entry = _Entry(key, message)
+        self._entries.append(entry)
+        if key is not None:
+            self._keyed_entries[key] = entry
+        stats.max_depth = max(stats.max_depth, len(self._entries))
+        self._not_empty.set()
+
+    async def get(self) -> Any:
+        """
+        Wait for the oldest pending message and remove it from the queue
+        :raises RPCSendQueueOverflowError: the queue has overflowed with the `disconnect` policy
+        :raises RPCSendQueueClosedError: the queue has been closed
+        """
+        while not self._entries:
+            self._raise_if_closed()
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        entry = self._entries.popleft()
+        if entry.key is not None and self._keyed_entries.get(entry.key) is entry:
+            del self._keyed_entries[entry.key]
+        self._dequeued.set()
+        return entry.message
+
+    async def wait_for_depth(self, max_depth: int) -> None:
+        """
+        Wait until fewer than `max_depth` messages are pending.
+        Paces the bulk producers, e.g., the history chunks, by the client instead of dropping
+        :raises RPCSendQueueOverflowError: the queue has overflowed with the `disconnect` policy
+        :raises RPCSendQueueClosedError: the queue has been closed
+        """
+        while len(self._entries) >= max_depth:
+            self._raise_if_closed()
+            self._dequeued.clear()
+            await self._dequeued.wait()
+        self._raise_if_closed()
+
+    def close(self) -> None:
+        """
+        Drop the pending messages and the later ones, e.g., once the client has disconnected.
+        Wakes the waiting consumer and producers up
+        """
+        if self.closed:
+            return
+        self._stats.closed = True
+        self._clear()
+
+    def _raise_if_closed(self) -> None:
+        """
+        :raises RPCSendQueueOverflowError: the queue has overflowed with the `disconnect` policy
+        :raises RPCSendQueueClosedError: the queue has been closed
+        """
+        if self._stats.overflowed:
+            raise RPCSendQueueOverflowError()
+        if self._stats.closed:
+            raise RPCSendQueueClosedError()
+
+    def _clear(self) -> None:
+        """Drop all the pending messages and wake the waiters up"""
+        self._stats.dropped += len(self._entries)
+        self._entries.clear()
+        self._keyed_entries.clear()
+        self._not_empty.set()
+        self._dequeued.set()
+
+    def _drop_one(self, keyed_first: bool) -> None:
+        """
+        Drop the oldest pending message
+        :param bool keyed_first: drop the oldest keyed message if there is any
+        """
+        entries = self._entries
+        dropped_entry = entries[0]
+        if keyed_first:
+            dropped_entry = next(
+                (entry for entry in entries if entry.key is not None), dropped_entry
+            )
+        entries.remove(dropped_entry)
+        if self._keyed_entries.get(dropped_entry.key) is dropped_entry:
+            del self._keyed_entries[dropped_entry.key]
+        self._stats.dropped += 1
@@ -0,0 +1,93 @@
+"""
+Test RPC codecs
+"""
+
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from rpc.codecs import MessagePackCodec, ORJSONCodec, StdlibJSONCodec
+from rpc.exceptions import RPCCommandTypeError, RPCDecodeError
+from rpc.models import RPCCommandModel, RPCErrorMessageModel
+
+JSON_FRAMES = [
+    '{"action": "subscribe", "message": {"assetId": 1}}',
+    '{"action": "assets", "message": {}, "extra": 1e16}',
+    "{}",
+    '{"action": 1, "message": ""}',
+    '{"action": "subscribe", "message": {"assetId": 1.0000000000000002e-7}}',
+    '{"action": "assets"}',
+    "[1, 2]",
+    '"assets"',
+    "{invalid",
+]
+
+
+def generic_reply(frame: str) -> str | None:
+    """The reply of the generic `receive_json` / `send_json` path; None for a valid command"""
+    try:
+        json_command = json.loads(frame)
+    except json.JSONDecodeError:
+        return "Could not parse the JSON command"
+    if not isinstance(json_command, dict):
+        return (
+            f"Invalid type of the message: {type(json_command)}. "
+            "Command must be a valid JSON mapping"
+        )
+    try:
+        RPCCommandModel(**json_command)
+    except ValidationError as exception:
+        error_message = RPCErrorMessageModel.from_validation_error(exception)
+        return json.dumps(error_message.model_dump(), separators=(",", ":"), ensure_ascii=False)
+    return None
+
+
+@pytest.mark.parametrize("codec", [StdlibJSONCodec(), ORJSONCodec()])
+@pytest.mark.parametrize("frame", JSON_FRAMES)
+def test_json_codec__decode_command(codec, frame: str):
+    """
+    Test the JSON codecs: the commands and the error replies are the same as of the generic path
+    """
+    expected_reply = generic_reply(frame)
+    for raw_frame in (frame, frame.encode()):
+        try:
+            rpc_command = codec.decode_command(raw_frame)
+        except (RPCDecodeError, RPCCommandTypeError) as exception:
+            assert exception.message == expected_reply
+        except ValidationError as exception:
+            error_message = RPCErrorMessageModel.from_validation_error(exception)
+            assert codec.encode_error(error_message.model_dump()) == expected_reply
+        else:
+            assert expected_reply is None
+            assert rpc_command == RPCCommandModel(**json.loads(frame))
+
+
+@pytest.mark.parametrize("codec", [StdlibJSONCodec(), ORJSONCodec()])
+def test_json_codec__encode(codec):
+    """
+    Test the JSON codecs encoding the messages the same way as `WebSocket.send_json`
+    """
+    data = {"action": "point", "message": {"assetName": "EURUSD", "time": 1, "value": 1.1}}
+    assert codec.encode(data) == json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    # Integers exceeding 64 bits
+    assert codec.encode({"value": 2**70}) == '{"value":1180591620717411303424}'
+
+
+def test_msgpack_codec():
+    """
+    Test the MessagePack codec
+    """
+    codec = MessagePackCodec()
+    data = {"action": "subscribe", "message": {"assetId": 1}}
+
+    frame = codec.encode(data)
+    assert isinstance(frame, bytes)
+    assert codec.decode_command(frame) == RPCCommandModel(**data)
+
+    with pytest.raises(RPCDecodeError):
+        codec.decode_command(b"\xc1")
+    with pytest.raises(RPCDecodeError):
+        codec.decode_command('{"action": "assets", "message": {}}')
+    with pytest.raises(RPCCommandTypeError):
+        codec.decode_command(codec.encode([1, 2]))
@@ -0,0 +1,55 @@
+"""
+Test the RPC per-connection service
+"""
+
+import asyncio
+from typing import List
+
+import pytest
+from starlette.websockets import WebSocketState
+from uvicorn.protocols.utils import ClientDisconnected
+
+from rpc.connection_service import BaseRPCConnectionService
+
+
+class DisconnectingWebSocket:
+    """Websocket of the client disconnecting after the given number of the messages"""
+
+    def __init__(self, messages_count: int):
+        self.messages_count = messages_count
+        self.sent: List[str] = []
+        self.client_state = WebSocketState.CONNECTED
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send_text(self, data: str) -> None:
+        await asyncio.sleep(0)
+        if len(self.sent) >= self.messages_count:
+            self.client_state = WebSocketState.DISCONNECTED
+            raise ClientDisconnected()
+        self.sent.append(data)
+
+
+@pytest.mark.asyncio
+async def test_connection_service__client_disconnected():
+    """
+    Test the connection service: the writer stops on the disconnected client
+    and no more messages are queued
+    """
+    websocket = DisconnectingWebSocket(messages_count=1)
+    connection_service = BaseRPCConnectionService(websocket)  # type: ignore
+    connection_service.enqueue_message("EURUSD 1", key=1)
+    connection_service.enqueue_message("EURUSD 2", key=1)
+    writer_task = connection_service._writer_task
+    assert writer_task is not None
+    await asyncio.wait_for(writer_task, timeout=1)
+
+    # The failure is handled by the writer instead of being left in the task
+    assert writer_task.exception() is None
+    assert websocket.sent == ["EURUSD 1"]
+    connection_service.enqueue_message("EURUSD 3", key=1)
+    assert connection_service._writer_task is writer_task
+    stats = connection_service.get_send_queue_stats()
+    assert stats.closed
+    assert (stats.depth, stats.enqueued) == (0, 2)
+
+    await connection_service.disconnect()
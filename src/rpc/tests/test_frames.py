@@ -0,0 +1,30 @@
+"""
+Test RPC frames
+"""
+
+import json
+
+from rpc.frames import RPCFrame
+from rpc.models import RPCCommandModel
+
+
+def test_rpc_frame():
+    """
+    Test RPCFrame: the message factory is called and the frame is encoded only once
+    """
+    calls = []
+
+    def build_message():
+        calls.append(1)
+        return {"assetName": "EURUSD", "value": 1.17}
+
+    frame = RPCFrame(action="point", message=build_message)
+    assert not calls
+
+    text = frame.to_text()
+    assert frame.to_text() is text
+    assert len(calls) == 1
+
+    # The same encoding as of `WebSocket.send_json` of the RPCCommandModel dump
+    rpc_command = RPCCommandModel(action="point", message=build_message())
+    assert text == json.dumps(rpc_command.model_dump(), separators=(",", ":"), ensure_ascii=False)
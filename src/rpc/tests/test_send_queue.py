@@ -0,0 +1,129 @@
+"""
+Test the RPC outbound queue
+"""
+
+import asyncio
+
+import pytest
+
+from rpc.exceptions import RPCSendQueueClosedError, RPCSendQueueOverflowError
+from rpc.send_queue import RPCSendQueue
+
+
+async def drain(send_queue: RPCSendQueue) -> list:
+    """Get all the pending messages"""
+    return [await send_queue.get() for _ in range(len(send_queue))]
+
+
+@pytest.mark.asyncio
+async def test_send_queue__conflate():
+    """
+    Test the outbound queue: the latest point per key replaces the pending one in place
+    """
+    send_queue = RPCSendQueue(3, policy="conflate")
+    send_queue.put_nowait("history")
+    send_queue.put_nowait("EURUSD 1", key=1)
+    send_queue.put_nowait("USDJPY 1", key=2)
+    send_queue.put_nowait("EURUSD 2", key=1)
+    # No pending message with the key: the oldest keyed message is dropped
+    send_queue.put_nowait("GBPUSD 1", key=3)
+
+    stats = send_queue.stats
+    assert (stats.depth, stats.max_depth, stats.enqueued) == (3, 3, 5)
+    assert (stats.conflated, stats.dropped) == (1, 1)
+    assert await drain(send_queue) == ["history", "USDJPY 1", "GBPUSD 1"]
+
+    # Below the size limit, nothing is conflated
+    send_queue.put_nowait("EURUSD 3", key=1)
+    send_queue.put_nowait("EURUSD 4", key=1)
+    assert await drain(send_queue) == ["EURUSD 3", "EURUSD 4"]
+
+
+@pytest.mark.asyncio
+async def test_send_queue__drop_oldest():
+    """
+    Test the outbound queue: the oldest message is dropped
+    """
+    send_queue = RPCSendQueue(2, policy="drop_oldest")
+    for message in ("history", "EURUSD 1", "EURUSD 2"):
+        send_queue.put_nowait(message, key=1 if message != "history" else None)
+
+    assert send_queue.stats.dropped == 1
+    assert await drain(send_queue) == ["EURUSD 1", "EURUSD 2"]
+
+
+@pytest.mark.asyncio
+async def test_send_queue__disconnect():
+    """
+    Test the outbound queue: the overflow is reported to the consumer
+    """
+    send_queue = RPCSendQueue(1, policy="disconnect")
+    send_queue.put_nowait("EURUSD 1", key=1)
+    send_queue.put_nowait("EURUSD 2", key=1)
+    send_queue.put_nowait("EURUSD 3", key=1)
+
+    stats = send_queue.stats
+    assert stats.overflowed
+    assert (stats.depth, stats.dropped) == (0, 3)
+    with pytest.raises(RPCSendQueueOverflowError):
+        await send_queue.get()
+
+
+@pytest.mark.asyncio
+async def test_send_queue__wait():
+    """
+    Test the outbound queue: the consumer waits for the messages
+    """
+    send_queue = RPCSendQueue(1)
+    get_task = asyncio.create_task(send_queue.get())
+    await asyncio.sleep(0)
+    assert not get_task.done()
+
+    send_queue.put_nowait("EURUSD 1", key=1)
+    assert await asyncio.wait_for(get_task, timeout=1) == "EURUSD 1"
+
+
+@pytest.mark.asyncio
+async def test_send_queue__wait_for_depth():
+    """
+    Test the outbound queue: the bulk producer waits for the consumer
+    """
+    send_queue = RPCSendQueue(10, policy="disconnect")
+    send_queue.put_nowait("chunk 1")
+    send_queue.put_nowait("chunk 2")
+    await asyncio.wait_for(send_queue.wait_for_depth(3), timeout=1)
+
+    waiter = asyncio.create_task(send_queue.wait_for_depth(2))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    assert await send_queue.get() == "chunk 1"
+    await asyncio.wait_for(waiter, timeout=1)
+
+    # The overflow wakes the waiting producer up
+    waiter = asyncio.create_task(send_queue.wait_for_depth(1))
+    for idx in range(10):
+        send_queue.put_nowait(f"point {idx}")
+    with pytest.raises(RPCSendQueueOverflowError):
+        await asyncio.wait_for(waiter, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_send_queue__close():
+    """
+    Test the outbound queue: the closed queue drops the messages and wakes the waiters up
+    """
+    send_queue = RPCSendQueue(10)
+    send_queue.put_nowait("chunk 1")
+    waiter = asyncio.create_task(send_queue.wait_for_depth(1))
+    await asyncio.sleep(0)
+
+    send_queue.close()
+    with pytest.raises(RPCSendQueueClosedError):
+        await asyncio.wait_for(waiter, timeout=1)
+    send_queue.put_nowait("EURUSD 1", key=1)
+
+    stats = send_queue.stats
+    assert send_queue.closed and stats.closed and not stats.overflowed
+    assert (stats.depth, stats.enqueued, stats.dropped) == (0, 1, 2)
+    with pytest.raises(RPCSendQueueClosedError):
+        await send_queue.get()
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""
+Production script to launch the application workers:
+`SERVER_WORKERS` processes sharing the listening socket, each with its own event loop.
+uvloop and httptools are used if installed
+"""
+
+import uvicorn
+
+from settings import settings
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "app:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVER_WORKERS,
+        loop="auto",
+        http="auto",
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        access_log=False,
+    )
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -10,12 +10,67 @@ class Settings(BaseSettings):
     """
 
     EMCONT_EXCHANGE_RATES_URL: str = Field()
+    # Emcont-compatible mirror endpoints requested if the primary one is slow or fails
+    EXCHANGE_RATE_PROVIDER_URLS: List[str] = Field(default=[])
+    # Where to parse the fetched exchange rates: in the event loop, a thread or a process
+    INGESTION_PARSE_EXECUTOR: Literal["inline", "thread", "process"] = Field(default="inline")
+    # Interval between saving the OHLC candle rollups
+    CANDLE_FLUSH_INTERVAL_SECONDS: float = Field(default=5)
 
     SERVER_HOST: str = Field(default="0.0.0.0")
     SERVER_PORT: int = Field(default=8000)
+    # Number of the application worker processes of the production launcher `serve.py`
+    SERVER_WORKERS: int = Field(default=1)
 
     ASSET_LIST: List[str] = Field(default=[])
+    # Interval between reloading the in-process asset registry and its `assets` frame
+    ASSET_REGISTRY_REFRESH_SECONDS: float = Field(default=300)
+
+    # Source of the live exchange rates: MongoDB change streams (falling back to polling
+    # without a replica set), polling, the shared-memory table of the ingestion process
+    # or the tick relay
+    EXCHANGE_RATE_SOURCE: Literal["change_stream", "polling", "shared_memory", "relay"] = Field(
+        default="change_stream"
+    )
+    # Name of the shared-memory table the ingestion process publishes the latest exchange rates
+    # and the history window to; not published if empty
+    SHARED_RATES_TABLE_NAME: str = Field(default="")
+    # Maximum number of the assets of the shared-memory table
+    SHARED_RATES_MAX_ASSETS: int = Field(default=256)
+    # Interval between checking the shared-memory table for the new exchange rates
+    SHARED_RATES_POLL_INTERVAL_SECONDS: float = Field(default=0.05)
+    # Address of the tick relay the ingestion process publishes the saved exchange rates to
+    # and the application nodes subscribe to: `tcp://<host>:<port>` or `unix://<path>`;
+    # not published if empty
+    TICK_RELAY_ADDRESS: str = Field(default="")
+    # Maximum number of the batches waiting per relay subscriber before it is disconnected
+    TICK_RELAY_QUEUE_SIZE: int = Field(default=1024)
+    # Exchange rates history window served on subscription and kept in memory
+    HISTORY_WINDOW_MINUTES: int = Field(default=30)
+    # Number of the value decimal places kept in the compact exchange rates history
+    HISTORY_VALUE_PRECISION: int = Field(default=6)
+    # Number of the records fetched per round trip by the `history` action cursor
+    HISTORY_QUERY_BATCH_SIZE: int = Field(default=2000)
+
+    # Websocket permessage-deflate compression
+    WS_PER_MESSAGE_DEFLATE: bool = Field(default=True)
+    # Maximum number of the pending outbound messages per connection
+    WS_SEND_QUEUE_SIZE: int = Field(default=256)
+    # What to do once the outbound queue is full: keep only the latest point per asset,
+    # drop the oldest message or disconnect the client
+    WS_SEND_QUEUE_POLICY: Literal["conflate", "drop_oldest", "disconnect"] = Field(
+        default="conflate"
+    )
 
     # Mongo DB
     MONGO_DB_NAME: str = Field(alias="MONGO_INITDB_DATABASE")
     DATABASE_URI: str = Field(alias="MONGO_CONNECTION_URI")
+    # Store the exchange rates in a time-series collection; see `db.migrations`
+    EXCHANGE_RATE_TIME_SERIES: bool = Field(default=False)
+    # Number of the whole UTC days of the exchange rates kept in the DB; the older ones are moved
+    # into the on-disk archive by the periodic purge. The records are kept forever if 0
+    EXCHANGE_RATE_RETENTION_DAYS: int = Field(default=0)
+    # Interval between the exchange rates purges
+    EXCHANGE_RATE_PURGE_INTERVAL_SECONDS: float = Field(default=3600)
+    # Directory of the per-asset per-day exchange rates archives
+    EXCHANGE_RATE_ARCHIVE_DIR: str = Field(default="archive")